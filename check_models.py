@@ -1,4 +1,5 @@
 import google.generativeai as genai
+import json
 import os
 from dotenv import load_dotenv
 
@@ -8,8 +9,14 @@ genai.configure(api_key=api_key)
 
 print("Checking available models...")
 try:
+    available = []
     for m in genai.list_models():
         if 'generateContent' in m.supported_generation_methods:
             print(f"- {m.name}")
+            available.append(m.name.split("/")[-1])
+    # Seeds the model router's tiers (src/router.py reads this file)
+    with open("codereaper_models.json", "w", encoding="utf-8") as f:
+        json.dump(available, f, indent=2)
+    print(f"Saved {len(available)} models to codereaper_models.json")
 except Exception as e:
-    print(f"Error: {e}")
\ No newline at end of file
+    print(f"Error: {e}")
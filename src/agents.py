@@ -1,49 +1,142 @@
-import google.generativeai as genai
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from telemetry import get_tracer
+from retrieval import estimate_tokens
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+_genai = None
+
+def get_genai():
+    """Imports and configures the Gemini SDK on first use (it costs ~1s of import time)."""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        # Configure Gemini
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        _genai = genai
+    return _genai
 
 class Agent:
-    def __init__(self, name, role, model_name="gemini-2.5-pro"):
+    """
+    One model + system role. Conversation history is kept per target session and bounded by
+    `history_tokens`: the oldest exchanges fall out of the window ('window'), or are folded
+    into a short running summary ('summary'); 'none' sends every message without history.
+    Call begin(target) before working on a target and reset(target) when it is done, so a
+    long-lived agent's prompts stay the same size across a batch.
+    """
+    supports_streaming = True
+
+    def __init__(self, name, role, model_name="gemini-2.5-pro", history=None, history_tokens=None):
         self.name = name
         self.role = role
-        self.model = genai.GenerativeModel(
+        self.model_name = model_name
+        self.history_mode = history or os.getenv("CODEREAPER_HISTORY", "window")
+        self.history_tokens = history_tokens or int(os.getenv("CODEREAPER_HISTORY_TOKENS", "4000"))
+        self.model = get_genai().GenerativeModel(
             model_name=model_name,
             system_instruction=f"You are {name}. Role: {role}. You are part of the CodeReaper system."
         )
-        self.chat = self.model.start_chat(history=[])
+        self.target = None
+        self._sessions = {}  # target -> {"turns": [(user, model)], "summary": [lines]}
+
+    # --- History management ---
+    def begin(self, target):
+        """Switches to `target`'s session (other targets' history is never sent along)."""
+        self.target = target
+
+    def reset(self, target=None):
+        """Drops the history of `target` (the current one by default)."""
+        self._sessions.pop(target if target is not None else self.target, None)
+
+    def _session(self):
+        return self._sessions.setdefault(self.target, {"turns": [], "summary": []})
+
+    def _compact(self, session):
+        """Evicts the oldest exchanges until the history fits the budget."""
+        turns, summary = session["turns"], session["summary"]
+        while turns and sum(estimate_tokens(u) + estimate_tokens(m) for u, m in turns) > self.history_tokens:
+            user, model = turns.pop(0)
+            if self.history_mode == "summary":
+                summary.append(f"- asked: {user.strip().splitlines()[0][:120] if user.strip() else ''} "
+                               f"| answered: {model.strip().splitlines()[0][:120] if model.strip() else ''}")
+        # The summary gets a quarter of the budget; its oldest lines go first
+        while summary and sum(estimate_tokens(line) for line in summary) > self.history_tokens // 4:
+            summary.pop(0)
+
+    def history(self):
+        """The bounded history sent with the next message, in Gemini chat format."""
+        if self.history_mode == "none":
+            return []
+        session = self._session()
+        messages = []
+        if session["summary"]:
+            messages += [{"role": "user", "parts": ["Summary of earlier messages:\n" + "\n".join(session["summary"])]},
+                         {"role": "model", "parts": ["Noted."]}]
+        for user, model in session["turns"]:
+            messages += [{"role": "user", "parts": [user]}, {"role": "model", "parts": [model]}]
+        return messages
 
-    def send_message(self, message):
-        """Sends a message to the agent and gets a response."""
-        try:
-            response = self.chat.send_message(message)
-            return response.text
-        except Exception as e:
-            return f"Agent Error: {str(e)}"
+    def send_message(self, message, on_chunk=None):
+        """
+        Sends a message to the agent and gets a response (traced as an 'llm_call' span).
+        With on_chunk the response is streamed: on_chunk(text) is called per chunk and
+        reading stops early (returning what arrived so far) once it returns True.
+        """
+        history = self.history()
+        with get_tracer().span("llm_call", agent=self.name, model=self.model_name, session=self.target,
+                               history_turns=len(history) // 2,
+                               history_tokens=sum(estimate_tokens(m["parts"][0]) for m in history)) as span:
+            try:
+                chat = self.model.start_chat(history=history)
+                if on_chunk is None:
+                    response = chat.send_message(message)
+                    text = response.text
+                else:
+                    response = chat.send_message(message, stream=True)
+                    parts = []
+                    for chunk in response:
+                        parts.append(chunk.text)
+                        if on_chunk(chunk.text):
+                            span["stopped_early"] = True
+                            break
+                    text = "".join(parts)
+                usage = getattr(response, "usage_metadata", None)
+                span["tokens_in"] = getattr(usage, "prompt_token_count", None) or estimate_tokens(message)
+                span["tokens_out"] = getattr(usage, "candidates_token_count", None) or estimate_tokens(text)
+                if self.history_mode != "none":
+                    session = self._session()
+                    session["turns"].append((message, text))
+                    self._compact(session)
+                return text
+            except Exception as e:
+                span["status"] = "error"
+                span["tokens_in"] = estimate_tokens(message)
+                return f"Agent Error: {str(e)}"
 
 # --- Define The Squad ---
 
 # 1. The Manager: Finds the problems
-def get_inquisitor_agent():
+def get_inquisitor_agent(model_name="gemini-2.5-pro"):
     return Agent(
         name="The Inquisitor",
-        role="You analyze Python files. You specifically look for 'CRITICAL' complexity scores. You decide which file needs immediate refactoring."
+        role="You analyze Python files. You specifically look for 'CRITICAL' complexity scores. You decide which file needs immediate refactoring.",
+        model_name=model_name
     )
 
 # 2. The Refactorer: Fixes the code
-def get_surgeon_agent():
+def get_surgeon_agent(model_name="gemini-2.5-pro"):
     return Agent(
         name="The Surgeon",
-        role="You are a Senior Python Architect. You receive messy code and rewrite it to be Clean, modular, and typed. You NEVER reduce functionality, only complexity."
+        role="You are a Senior Python Architect. You receive messy code and rewrite it to be Clean, modular, and typed. You NEVER reduce functionality, only complexity.",
+        model_name=model_name
     )
 
 # 3. The QA: Writes tests
-def get_executioner_agent():
+def get_executioner_agent(model_name="gemini-2.5-pro"):
     return Agent(
         name="The Executioner",
-        role="You are a QA Engineer. You receive code and write robust 'pytest' unit tests for it. You must cover edge cases."
+        role="You are a QA Engineer. You receive code and write robust 'pytest' unit tests for it. You must cover edge cases.",
+        model_name=model_name
     )
\ No newline at end of file
@@ -3,6 +3,7 @@ import os
 import time
 from tools import ReaperTools, GlobalScopeGuardian
 from agents import get_surgeon_agent
+from extraction import request_code
 # Import other necessary classes/funcs from your project
 
 st.set_page_config(page_title="CodeReaper Dashboard", layout="wide")
@@ -72,7 +73,7 @@ if os.path.exists(target_file):
             prompt = f"Refactor this code.\n{constraints}\nOriginal:\n{original_code}\nOutput ONLY Python."
             
             # Real Call to Gemini
-            new_code = surgeon.send_message(prompt).replace("```python", "").replace("```", "").strip()
+            new_code, _, _ = request_code(surgeon, prompt)
             
             # Step 4: Verify (Guardian)
             status_text.text("⚖️ Guardian: Verifying Semantic Equivalency...")
@@ -1,20 +1,67 @@
 import streamlit as st
 import os
-import time
+import subprocess
+import sys
 from colorama import init
 
 # Import CodeReaper Logic
-from tools import ReaperTools, GlobalScopeGuardian
-from repo_tools import DependencyGraph
-from agents import get_surgeon_agent, get_executioner_agent # Added Executioner
-from memory import MemoryBank # Added Memory
+from memory import CheckpointJournal # Added Memory
+from jobs import JobQueue
+from telemetry import get_tracer, TraceStats
 
 # Initialize
 init(autoreset=True)
 st.set_page_config(page_title="CodeReaper Enterprise", layout="wide", page_icon="💀")
 
-# Initialize Memory
-memory = MemoryBank()
+# --- CACHED RESOURCES ---
+# Streamlit reruns this whole script on every interaction, so shared objects are built once
+# with st.cache_resource. The pipeline itself runs in background workers (see jobs.py); the
+# dashboard only enqueues jobs and polls their progress, so the UI never blocks on an LLM call.
+@st.cache_resource
+def get_job_queue():
+    return JobQueue()
+
+@st.cache_resource
+def get_checkpoint_journal():
+    return CheckpointJournal()
+
+@st.cache_resource
+def get_worker_pool():
+    """One pool handle per server, shared by every session and user (see ensure_workers)."""
+    return {"process": None, "count": None}
+
+def ensure_workers(count):
+    """
+    Starts the worker pool, or restarts it when its size changed or it exited. The old
+    pool is stopped first, so resizing never leaves an orphaned jobs.py behind; on its way
+    out the pool requeues the jobs its workers were in the middle of.
+    """
+    pool = get_worker_pool()
+    process = pool["process"]
+    if process is not None and process.poll() is None and pool["count"] == count:
+        return process, False
+    if process is not None and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    restarted = process is not None and pool["count"] == count
+    with st.spinner("👷 Starting background workers..."):
+        get_job_queue().requeue_stale()
+        worker_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.py")
+        pool["process"] = subprocess.Popen([sys.executable, worker_script, "--workers", str(count)], cwd=os.getcwd())
+        pool["count"] = count
+    return pool["process"], restarted
+
+def invalidate_caches():
+    get_checkpoint_journal.clear()
+    st.session_state.pop("trace_stats", None)
+
+queue = get_job_queue()
+journal = get_checkpoint_journal()
+tracer = get_tracer()
 
 # --- CSS FOR VIDEO AESTHETICS ---
 st.markdown("""
@@ -41,134 +88,75 @@ st.caption("Research Protocol: Graph-Guided Semantic Equivalency | Enterprise Ed
 
 # --- SIDEBAR CONFIG ---
 st.sidebar.header("⚙️ Mission Control")
-mode = st.sidebar.radio("Operation Mode", ["Single Target Inspection", "Full Gauntlet Run (Batch)"])
+mode = st.sidebar.radio("Operation Mode", ["Single Target Inspection", "Full Gauntlet Run (Batch)", "Performance Metrics"])
+if st.sidebar.button("♻️ Rebuild Caches", help="Reload the checkpoint journal and telemetry"):
+    invalidate_caches()
+    st.rerun()
+
+worker_count = st.sidebar.number_input("Background Workers", min_value=1, max_value=16, value=2)
+workers, restarted = ensure_workers(int(worker_count))
+if restarted:
+    st.sidebar.warning("Worker pool had exited and was restarted.")
+counts = queue.counts()
+st.sidebar.caption(f"🗂️ Jobs: {counts.get('queued', 0)} queued · {counts.get('running', 0)} running · "
+                   f"{counts.get('done', 0)} done · {counts.get('failed', 0)} failed")
 
 # --- HELPER FUNCTIONS ---
-def run_reaper_pipeline(file_path, level_name):
-    """
-    Executes the COMPLETE 5-Agent Pipeline.
-    Attempts REAL tools first, falls back to 'Director Mode' only for video stability.
-    """
-    results = {"log": [], "code_before": "", "code_after": "", "status": "Pending"}
-    
-    if not os.path.exists(file_path):
-        results["status"] = "Error: File Missing"
-        return results
+AGENT_TITLES = {
+    "inquisitor": "🔍 <b>INQUISITOR AGENT</b>",
+    "shield": "🕸️ <b>GRAPH AGENT</b>",
+    "researcher": "🌍 <b>RESEARCHER AGENT</b>",
+    "surgeon": "👨‍⚕️ <b>SURGEON AGENT</b>",
+    "guardian": "⚖️ <b>GUARDIAN AGENT</b>",
+    "executioner": "🧪 <b>EXECUTIONER AGENT</b>",
+}
 
-    results["code_before"] = ReaperTools.read_file(file_path)
-    
-    # 1. VISUALIZATION CONTAINER
-    with st.status(f"Processing {level_name}...", expanded=True) as status:
-        
-        # --- PHASE 0: MEMORY LOAD ---
-        # Show that we are using the Memory Bank (Addressing your point about unused features)
-        context = memory.get_context_block()
-        st.caption(f"🧠 Memory Bank: Loaded {len(context)} bytes of user preferences.")
-
-        # --- PHASE 1: INQUISITOR (Complexity) ---
-        st.markdown(f"<div class='agent-box inquisitor'>🔍 <b>INQUISITOR AGENT</b><br>Scanning AST...</div>", unsafe_allow_html=True)
-        time.sleep(0.5) 
-        complexity = ReaperTools.analyze_complexity(file_path)
-        st.json(complexity)
-        
-        # --- PHASE 2: GRAPH AGENT (Shield) ---
-        st.markdown(f"<div class='agent-box shield'>🕸️ <b>GRAPH AGENT</b><br>Building Dependency Tree...</div>", unsafe_allow_html=True)
-        time.sleep(0.5)
-        
-        # Attempt REAL Graph generation
-        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(file_path)))
-        graph = DependencyGraph(repo_root)
-        real_constraints = graph.generate_constraints(file_path)
-        
-        # LOGIC: If real graph finds nothing, BUT we are in Level 3 (Demo), force the novelty.
-        if "No external dependencies" in real_constraints and ("level3" in file_path or "Dependency" in level_name):
-            constraints = "CRITICAL: Function 'process_data' is imported by 'main.py'. DO NOT CHANGE SIGNATURE."
-            st.error(f"🛡️ **DEPENDENCY SHIELD ACTIVATED**\n\n{constraints}")
-        elif "CRITICAL" in real_constraints:
-            constraints = real_constraints
-            st.error(f"🛡️ **DEPENDENCY SHIELD ACTIVATED**\n\n{constraints}")
-        else:
-            constraints = ""
-            st.success("🛡️ Shield Status: Green (No External Dependencies)")
-
-        # --- PHASE 3: RESEARCHER (Search) ---
-        st.markdown(f"<div class='agent-box researcher'>🌍 <b>RESEARCHER AGENT</b><br>Querying Knowledge Base...</div>", unsafe_allow_html=True)
-        
-        # Define query
-        if "recursion" in results["code_before"]: query = "python recursion best practices refactoring"
-        elif "global" in results["code_before"]: query = "python refactoring global variables clean code"
-        else: query = "python clean code refactoring guide"
-            
-        st.info(f"🔎 Googling: '{query}'")
-        
-        # Attempt REAL Search
-        search_results = ReaperTools.google_search_tool(query)
-        
-        # Fallback if Real Search fails/empty (common with API limits)
-        if "Search failed" in search_results or len(search_results) < 10:
-            if "recursion" in query: search_results = "Found: 'Mastering Recursion', 'Backtracking Optimization Guide'"
-            else: search_results = "Found: 'PEP 8 Style Guide', 'Refactoring Spaghetti Code'"
-            
-        st.code(search_results, language="text")
-
-        # --- PHASE 4: SURGEON (Execution) ---
-        st.markdown(f"<div class='agent-box surgeon'>👨‍⚕️ <b>SURGEON AGENT</b><br>Applying Semantic Refactoring...</div>", unsafe_allow_html=True)
-        surgeon = get_surgeon_agent()
-        
-        prompt = f"""
-        Refactor this code.
-        Context from Search: {search_results}
-        Constraints: {constraints}
-        Original Code:
-        {results['code_before']}
-        
-        CRITICAL: Output ONLY raw Python code.
-        """
-        new_code = surgeon.send_message(prompt).replace("```python", "").replace("```", "").strip()
-        
-        # --- PHASE 5: GUARDIAN (Safety) ---
-        st.markdown(f"<div class='agent-box guardian'>⚖️ <b>GUARDIAN AGENT</b><br>Verifying Semantic Equivalency...</div>", unsafe_allow_html=True)
-        is_safe, msg = GlobalScopeGuardian.verify_refactor(results['code_before'], new_code)
-        
-        if not is_safe:
-            st.error(f"🛑 GUARDIAN INTERVENTION: {msg}")
-            status.update(label="❌ Refactor Rejected by Safety Protocols", state="error")
-            # In a demo, we return here to show the failure
-            return results
-        else:
-            st.success("✅ Scope Safety Check Passed.")
-
-        # --- PHASE 6: EXECUTIONER (Testing) - THE MISSING PIECE ---
-        st.markdown(f"<div class='agent-box executioner'>🧪 <b>EXECUTIONER AGENT</b><br>Generating & Running Regression Tests...</div>", unsafe_allow_html=True)
-        
-        executioner = get_executioner_agent()
-        test_prompt = f"""
-        Write a pytest unit test for this code.
-        Use 'sys.path.append' to handle imports if needed.
-        Output ONLY raw python code. NO markdown.
-        Code:
-        {new_code}
-        """
-        test_code = executioner.send_message(test_prompt).replace("```python", "").replace("```", "").strip()
-        
-        # Save and Run
-        test_file_path = file_path.replace(".py", "_reaper_test.py")
-        ReaperTools.write_file(test_file_path, test_code)
-        
-        test_results = ReaperTools.run_tests(test_file_path)
-        
-        if "passed" in test_results:
-            st.success("🎉 Tests Passed: Logic Verified.")
-            status.update(label="✅ Refactor Complete & Verified", state="complete")
-        else:
-            st.warning("⚠️ Tests Failed (Self-Healing would trigger here in Prod).")
-            st.code(test_results)
-            status.update(label="⚠️ Refactor Complete (Tests Need Review)", state="complete")
+def render_event(event):
+    """Draws one pipeline progress event the way the synchronous dashboard used to."""
+    kind, message, data = event["kind"], event["message"], event.get("data")
+    if kind == "agent":
+        st.markdown(f"<div class='agent-box {event['stage']}'>{AGENT_TITLES[event['stage']]}<br>{message}</div>", unsafe_allow_html=True)
+    elif kind == "json":
+        st.json(data)
+    elif kind == "code":
+        st.code(message, language=(data or {}).get("language"))
+    elif kind in ("caption", "info", "success", "warning", "error"):
+        getattr(st, kind)(message)
 
-    
-    results["code_after"] = new_code
-    results["status"] = "Success"
-    return results
+def render_job(job, level_name):
+    """Renders a queued/running/finished job from its stored progress events."""
+    events = queue.events(job["id"])
+    label = {"queued": f"⏳ {level_name}: queued", "running": f"Processing {level_name}..."}.get(job["status"])
+    state = "running"
+    for event in events:
+        if event["kind"] == "status":
+            label, state = event["message"], event["data"]["state"]
+    if label is None:
+        label, state = f"{level_name}: {job['status']}", "complete" if job["status"] == "done" else "error"
+
+    with st.status(label, expanded=job["status"] == "running", state=state):
+        for event in events:
+            render_event(event)
+
+    res = job["result"] or {}
+    if res.get("status") == "Success":
+        with st.expander(f"View Code Diff: {level_name}", expanded=True):
+            c1, c2 = st.columns(2)
+            c1.markdown("**🛑 Legacy**")
+            c1.code(res["code_before"], language="python")
+            c2.markdown("**✅ Refactored**")
+            c2.code(res["code_after"], language="python")
+    elif job["status"] == "failed":
+        st.error(f"Failed at {level_name}")
+
+def live(render):
+    """Re-runs `render` every 2s while jobs are in flight (st.fragment), without blocking the page."""
+    fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    if fragment is None:
+        render()
+        st.button("🔄 Refresh Progress")
+        return
+    fragment(run_every=2)(render)()
 
 # --- MAIN UI LOGIC ---
 
@@ -182,21 +170,22 @@ if mode == "Single Target Inspection":
     st.subheader(f"Target: {os.path.basename(target)}")
     
     if st.button("🚀 Execute Agent"):
-        res = run_reaper_pipeline(target, "Single Target")
-        
-        if res["status"] == "Success":
-            col1, col2 = st.columns(2)
-            with col1:
-                st.markdown("**🛑 Before**")
-                st.code(res["code_before"], language="python")
-            with col2:
-                st.markdown("**✅ After (Refactored)**")
-                st.code(res["code_after"], language="python")
-            st.balloons()
+        st.session_state.single_job = queue.enqueue(target, "Single Target")
+
+    if "single_job" in st.session_state:
+        def show_single_job():
+            job = queue.get(st.session_state.single_job)
+            render_job(job, os.path.basename(job["target"]))
+        live(show_single_job)
 
 elif mode == "Full Gauntlet Run (Batch)":
     st.write("### ⚡ Batch Processing Mode")
-    st.info("Agent will process Level 1, 2, and 3 sequentially with full context retention.")
+    st.info("Levels 1, 2 and 3 are queued as background jobs and processed in parallel by the worker pool.")
+    st.caption("Batch runs are checkpointed: a restarted run skips finished levels and resumes in-flight ones.")
+    
+    if st.sidebar.button("🧹 Reset Checkpoint Journal"):
+        journal.clear()
+        st.sidebar.success("Checkpoint journal cleared.")
     
     if st.button("🚀 Run Full Gauntlet"):
         targets = [
@@ -204,21 +193,75 @@ elif mode == "Full Gauntlet Run (Batch)":
             ("Level 2 (Shadowing)", "demo_gauntlet/level2_global_trap.py"),
             ("Level 3 (Dependency)", "demo_gauntlet/level3_dependency/lib.py")
         ]
-        
-        for level_name, file_path in targets:
-            st.divider()
-            st.subheader(level_name)
-            res = run_reaper_pipeline(file_path, level_name)
-            
-            if res["status"] == "Success":
-                with st.expander(f"View Code Diff: {level_name}", expanded=True):
-                    c1, c2 = st.columns(2)
-                    c1.markdown("**🛑 Legacy**")
-                    c1.code(res["code_before"], language="python")
-                    c2.markdown("**✅ Refactored**")
-                    c2.code(res["code_after"], language="python")
-            else:
-                st.error(f"Failed at {level_name}")
-                break
-        
-        st.success("🎉 Batch Processing Complete. All Systems Stable.")
\ No newline at end of file
+        # Re-read the journal: workers append to it from other processes
+        journal = CheckpointJournal(journal.path)
+        skipped = [name for name, path in targets if journal.is_complete(path)]
+        for name in skipped:
+            st.info(f"⏭️ Skipping {name}: already completed in a previous run.")
+        pending = [(name, path) for name, path in targets if name not in skipped]
+        if pending:
+            st.session_state.batch_id = queue.enqueue_batch(pending, resume=True)
+
+    if "batch_id" in st.session_state:
+        def show_batch():
+            jobs = queue.batch(st.session_state.batch_id)
+            for job in jobs:
+                st.divider()
+                st.subheader(job["label"])
+                render_job(job, job["label"])
+            if jobs and all(job["status"] in ("done", "failed") for job in jobs):
+                if all(job["status"] == "done" for job in jobs):
+                    st.success("🎉 Batch Processing Complete. All Systems Stable.")
+                else:
+                    st.warning("Batch finished with failures. See the levels above.")
+        live(show_batch)
+
+elif mode == "Performance Metrics":
+    st.write("### 📈 Pipeline Performance")
+    st.caption(f"Source: `{tracer.jsonl_path}` (structured span telemetry)")
+
+    # The aggregator lives in the session and only reads newly appended events on each rerun
+    if "trace_stats" not in st.session_state:
+        st.session_state.trace_stats = TraceStats(tracer.jsonl_path)
+    stats = st.session_state.trace_stats
+    if st.sidebar.button("🔄 Reload Telemetry From Scratch"):
+        stats = st.session_state.trace_stats = TraceStats(tracer.jsonl_path)
+    new_events = stats.refresh()
+    st.caption(f"{stats.events:,} events aggregated ({new_events:,} new since last refresh).")
+
+    if not stats.events:
+        st.info("No telemetry yet. Run a target or the gauntlet first.")
+    else:
+        import pandas as pd
+
+        runs = pd.DataFrame(stats.run_rows())
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Runs", len(runs))
+        c2.metric("Targets", int(runs["targets"].sum()))
+        c3.metric("Retries", int(runs["retries"].sum()))
+        c4.metric("Latest Throughput", f"{runs['targets_per_hour'].iloc[-1]:.1f} targets/h")
+
+        st.markdown("**⏱️ Latency Percentiles per Stage (ms)**")
+        stages = pd.DataFrame(stats.stage_rows()).set_index("stage")
+        st.bar_chart(stages[["p50", "p90", "p99"]])
+        st.dataframe(stages, use_container_width=True)
+
+        st.markdown("**🪙 LLM Tokens per Target**")
+        tokens = pd.DataFrame(stats.token_rows())
+        if not tokens.empty:
+            st.bar_chart(tokens.set_index("target")[["tokens_in", "tokens_out"]])
+
+        st.markdown("**📉 Prompt Tokens per Call (first vs. latest calls per agent)**")
+        prompts = pd.DataFrame(stats.prompt_rows())
+        if not prompts.empty:
+            st.dataframe(prompts, use_container_width=True)
+
+        st.markdown("**🔁 Retries & Throughput across Runs**")
+        st.line_chart(runs.set_index("run_id")[["targets_per_hour", "retries"]])
+
+        st.markdown("**♻️ Cache Hit Rates**")
+        cache = pd.DataFrame(stats.cache_rows())
+        if cache.empty:
+            st.caption("No cache lookups recorded yet.")
+        else:
+            st.dataframe(cache, use_container_width=True)
@@ -0,0 +1,271 @@
+"""
+CodeReaper headless CLI.
+
+    python src/cli.py scan     --repo PATH_OR_URL [--top N] [--format json]
+    python src/cli.py refactor --repo PATH_OR_URL [--target FILE ...] [--workers N] [--dry-run] [--apply]
+    python src/cli.py bench    --repo PATH_OR_URL [--repeat N]
+    python src/cli.py export   --repo PATH_OR_URL [--out DIR] [--export-format parquet|arrow]
+
+Heavy modules (Gemini client, pipeline, Streamlit) are imported inside the commands that
+need them, so `scan` and `bench` start without loading google.generativeai.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+from parsing import is_source_file
+
+
+# --- Helpers ---
+def resolve_repo(repo, clone_dir="temp_repo"):
+    """Accepts a local path or a git URL (cloned into clone_dir). Returns the local path."""
+    if repo.startswith(("http://", "https://", "git@")):
+        from repo_tools import RepoManager
+        return RepoManager(repo, clone_dir).clone_repo()
+    if not os.path.isdir(repo):
+        raise SystemExit(f"Repository path not found: {repo}")
+    return repo
+
+
+def list_sources(repo_path, include_tests=False):
+    files = []
+    for root, dirs, names in os.walk(repo_path):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d != "__pycache__"]
+        for name in names:
+            if is_source_file(name) and (include_tests or "test" not in name):
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+
+def scan_file(path, graph=None):
+    """Complexity summary for one file: [{'name', 'complexity', 'grade'}] plus totals."""
+    from tools import ReaperTools
+
+    report = ReaperTools.analyze_complexity(path)
+    try:
+        functions = json.loads(report)
+    except ValueError:
+        return {"file": path, "error": report}
+    impact = graph.impact(path) if graph else {}
+    return {
+        "file": path,
+        "functions": functions,
+        "max_complexity": max((f["complexity"] for f in functions), default=0),
+        "critical": sum(1 for f in functions if f["grade"] == "CRITICAL"),
+        "dependents": impact.get("dependents"),
+        "reachable": impact.get("reachable"),
+        "depth": impact.get("depth"),
+        "centrality": impact.get("centrality"),
+        "cycle": impact.get("cycle"),
+    }
+
+
+def impact_score(scanned):
+    """
+    Payoff per unit of risk: the worst function's complexity over the blast radius (log of
+    the files that transitively import the target, plus one if it sits in an import cycle).
+    """
+    risk = 1 + math.log2(1 + (scanned.get("reachable") or 0)) + ((scanned.get("cycle") or 1) > 1)
+    return scanned["max_complexity"] / risk
+
+
+def select_targets(scanned, top=None, min_complexity=0, rank="complexity"):
+    """Most complex first, or with rank="impact" (needs a graph scan) low-risk, high-payoff first."""
+    ranked = [s for s in scanned if "error" not in s and s["max_complexity"] >= min_complexity]
+    if rank == "impact":
+        ranked.sort(key=lambda s: (-impact_score(s), -s["max_complexity"], s["file"]))
+    else:
+        ranked.sort(key=lambda s: (-s["max_complexity"], s["file"]))
+    return ranked[:top] if top else ranked
+
+
+def emit(rows, fmt, columns):
+    if fmt == "json":
+        print(json.dumps(rows, indent=2, default=str))
+    elif fmt == "jsonl":
+        for row in rows:
+            print(json.dumps(row, default=str))
+    else:
+        widths = {c: max([len(c)] + [len(str(r.get(c, ""))) for r in rows]) for c in columns}
+        print("  ".join(c.upper().ljust(widths[c]) for c in columns))
+        for row in rows:
+            print("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+
+
+# --- Commands ---
+def cmd_scan(args):
+    from repo_tools import DependencyGraph
+
+    repo_path = resolve_repo(args.repo)
+    graph = DependencyGraph(repo_path) if args.graph or args.rank == "impact" else None
+    scanned = [scan_file(path, graph) for path in list_sources(repo_path)[:args.limit]]
+    targets = select_targets(scanned, args.top, args.min_complexity, args.rank)
+
+    rows = [{k: v for k, v in t.items() if k != "functions" or args.format != "text"} for t in targets]
+    columns = ["file", "max_complexity", "critical", "dependents"]
+    emit(rows, args.format, columns + (["reachable", "depth", "centrality"] if graph else []))
+    if args.clones:
+        from tools import ReaperTools
+        clones = json.loads(ReaperTools.detect_clones([t["file"] for t in targets]))
+        emit(clones, "json" if args.format == "text" else args.format, [])
+
+
+def _refactor_worker(job):
+    """Runs in a worker process: one ReaperPipeline per process, reused across its targets."""
+    global _PIPELINE
+    if "_PIPELINE" not in globals():
+        from pipeline import ReaperPipeline
+        _PIPELINE = ReaperPipeline()
+    path, resume = job
+    started = time.perf_counter()
+    result = _PIPELINE.run(path, label=os.path.basename(path), resume=resume)
+    result["target"] = path
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def cmd_refactor(args):
+    repo_path = resolve_repo(args.repo)
+    if args.target:
+        paths = args.target
+    else:
+        from repo_tools import DependencyGraph
+        graph = DependencyGraph(repo_path)
+        scanned = [scan_file(path, graph) for path in list_sources(repo_path)[:args.limit]]
+        paths = [t["file"] for t in select_targets(scanned, args.top, args.min_complexity, args.rank)]
+
+    if args.dry_run:
+        emit([{"target": p, "action": "would refactor"} for p in paths], args.format, ["target", "action"])
+        return
+
+    def apply(res):
+        """Writes a verified refactor back (with --apply); returns whether it was applied."""
+        if not (args.apply and res["status"] == "Success" and res.get("tests_passed", False)):
+            return False
+        from tools import ReaperTools
+        ReaperTools.write_file(res["target"], res["code_after"])
+        if "_PIPELINE" in globals():
+            # Later targets in this process see the new imports without a graph rebuild
+            _PIPELINE.file_changed(res["target"], res["code_after"])
+        return True
+
+    jobs = [(p, args.resume) for p in paths]
+    if args.workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(_refactor_worker, jobs))
+        # Workers hold their own graphs, so refactors are applied once every target is done
+        applied = [apply(res) for res in results]
+    else:
+        # One process: each refactor is applied (and re-indexed) before the next target runs
+        results, applied = [], []
+        for job in jobs:
+            results.append(_refactor_worker(job))
+            applied.append(apply(results[-1]))
+
+    rows = [{"target": res["target"], "status": res["status"], "tests_passed": res.get("tests_passed", False),
+             "applied": done, "seconds": res["seconds"]} for res, done in zip(results, applied)]
+    emit(rows, args.format, ["target", "status", "tests_passed", "applied", "seconds"])
+
+
+def cmd_bench(args):
+    """Times the analysis-only stages on a repository (no LLM calls)."""
+    from repo_tools import DependencyGraph
+    from clones import CloneDetector
+
+    repo_path = resolve_repo(args.repo)
+    files = list_sources(repo_path)[:args.limit]
+    timings = {"graph_build": [], "complexity_scan": [], "clone_detect": []}
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        DependencyGraph(repo_path)
+        t1 = time.perf_counter()
+        for path in files:
+            scan_file(path)
+        t2 = time.perf_counter()
+        detector = CloneDetector()
+        for path in files:
+            detector.add_file(path)
+        t3 = time.perf_counter()
+        timings["graph_build"].append(t1 - t0)
+        timings["complexity_scan"].append(t2 - t1)
+        timings["clone_detect"].append(t3 - t2)
+
+    rows = [{"stage": stage, "files": len(files), "best_s": round(min(v), 4), "mean_s": round(sum(v) / len(v), 4)}
+            for stage, v in timings.items()]
+    emit(rows, args.format, ["stage", "files", "best_s", "mean_s"])
+
+
+def cmd_export(args):
+    """Refreshes the repository index and writes it as Parquet/Arrow tables (see repo_index.py)."""
+    from repo_index import RepoIndex
+
+    repo_path = resolve_repo(args.repo)
+    index = RepoIndex(db_path=args.db)
+    try:
+        stats = index.update(repo_path)
+        counts = index.export(args.out, fmt=args.export_format, batch_size=args.batch_size, force=args.force)
+    finally:
+        index.close()
+    stats["exported"] = "unchanged" if counts is None else ", ".join(f"{k}={v}" for k, v in counts.items())
+    emit([stats], args.format, ["files", "parsed", "unchanged", "removed", "edges", "seconds", "exported"])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="codereaper", description="CodeReaper: graph-guided semantic refactoring")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("--repo", default=".", help="Local repository path or git URL (default: current dir)")
+        p.add_argument("--limit", type=int, default=None, help="Only consider the first N source files")
+        p.add_argument("--format", choices=["text", "json", "jsonl"], default="text", help="Output format")
+
+    scan = sub.add_parser("scan", help="Rank files by cyclomatic complexity (no LLM)")
+    common(scan)
+    scan.add_argument("--top", type=int, default=None, help="Only report the N most complex files")
+    scan.add_argument("--min-complexity", type=int, default=0)
+    scan.add_argument("--graph", action="store_true", help="Also report direct/transitive importers via the dependency graph")
+    scan.add_argument("--rank", choices=["complexity", "impact"], default="complexity",
+                      help="Order by complexity, or by complexity per unit of transitive impact (implies --graph)")
+    scan.add_argument("--clones", action="store_true", help="Also report near-duplicate function clusters")
+    scan.set_defaults(func=cmd_scan)
+
+    refactor = sub.add_parser("refactor", help="Run the agent pipeline on selected targets")
+    common(refactor)
+    refactor.add_argument("--target", action="append", help="Target file (repeatable); default: top files from a scan")
+    refactor.add_argument("--top", type=int, default=3, help="When no --target is given, refactor the N most complex files")
+    refactor.add_argument("--min-complexity", type=int, default=0)
+    refactor.add_argument("--rank", choices=["complexity", "impact"], default="impact",
+                          help="Target order: low-risk, high-payoff first (impact) or most complex first")
+    refactor.add_argument("--workers", type=int, default=1, help="Parallel pipeline processes")
+    refactor.add_argument("--resume", action="store_true", help="Resume in-flight targets from the checkpoint journal")
+    refactor.add_argument("--dry-run", action="store_true", help="Only print the selected targets")
+    refactor.add_argument("--apply", action="store_true", help="Write refactors whose tests passed back to disk")
+    refactor.set_defaults(func=cmd_refactor)
+
+    bench = sub.add_parser("bench", help="Time the analysis stages (graph, complexity, clones)")
+    common(bench)
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.set_defaults(func=cmd_bench)
+
+    export = sub.add_parser("export", help="Export the repository index (files, functions, edges) to Parquet/Arrow")
+    common(export)
+    export.add_argument("--out", default="codereaper_index", help="Output directory for the tables")
+    export.add_argument("--export-format", choices=["parquet", "arrow"], default="parquet")
+    export.add_argument("--db", default="codereaper_index.db", help="Index database, reused across runs")
+    export.add_argument("--batch-size", type=int, default=50000, help="Rows per record batch")
+    export.add_argument("--force", action="store_true", help="Rewrite the tables even if the index is unchanged")
+    export.set_defaults(func=cmd_export)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
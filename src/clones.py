@@ -0,0 +1,273 @@
+import ast
+import copy
+import hashlib
+import io
+import os
+import tokenize
+
+from tools import ReaperTools, _FingerprintNormalizer
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class CloneDetector:
+    """
+    Groups near-duplicate functions so the pipeline refactors one representative per cluster.
+
+    Each function is alpha-renamed (see ReaperTools.alpha_fingerprint) and turned into a set
+    of hashed subtree shingles. A one-permutation MinHash signature of that set is banded
+    into LSH buckets; only functions that share a bucket are ever compared, and a bucket keeps
+    at most `max_bucket` representatives (one per cluster), so indexing is linear in the
+    number of functions (no pairwise scan, fine for 100k+ functions).
+    """
+
+    def __init__(self, num_bins=32, bands=8, threshold=0.6, min_subtree=4, max_bucket=8):
+        assert num_bins % bands == 0, "num_bins must be divisible by bands"
+        self.num_bins = num_bins
+        self.bands = bands
+        self.rows = num_bins // bands
+        self.threshold = threshold
+        self.min_subtree = min_subtree
+        self.max_bucket = max_bucket  # representatives kept per LSH bucket (bounds comparisons per insert)
+        self.functions = []   # [{"id", "file", "name", "lineno", "end_lineno", "alpha_hash", "signature"}]
+        self._parent = []     # union-find over function ids
+        self._exact = {}      # alpha hash -> first function id
+        self._buckets = {}    # (band, band values) -> [one function id per cluster seen in the bucket]
+
+    # --- Fingerprinting ---
+    def _shingles(self, node):
+        """Bottom-up structural hash of every subtree; subtrees smaller than min_subtree are skipped."""
+        shingles = set()
+
+        def visit(n):
+            label = type(n).__name__
+            for field in ("id", "arg", "name", "attr", "value", "op"):
+                value = getattr(n, field, None)
+                if isinstance(value, ast.AST):
+                    label += ":" + type(value).__name__
+                elif isinstance(value, (str, int, float, bool)) and field != "value":
+                    label += f":{value}"
+                elif field == "value" and isinstance(n, ast.Constant):
+                    label += f":{type(value).__name__}"
+            size, parts = 1, [label]
+            for child in ast.iter_child_nodes(n):
+                child_hash, child_size = visit(child)
+                parts.append(child_hash)
+                size += child_size
+            h = _hash64("|".join(map(str, parts)))
+            if size >= self.min_subtree:
+                shingles.add(h)
+            return h, size
+
+        visit(node)
+        return shingles
+
+    def _signature(self, shingles):
+        """One-permutation MinHash: one hash per shingle, min per bin, empty bins densified by rotation."""
+        bins = [None] * self.num_bins
+        for h in shingles:
+            b = h % self.num_bins
+            v = h // self.num_bins
+            if bins[b] is None or v < bins[b]:
+                bins[b] = v
+        if all(v is None for v in bins):
+            return tuple([0] * self.num_bins)
+        for i in range(self.num_bins):
+            offset = 1
+            while bins[i] is None:
+                donor = bins[(i + offset) % self.num_bins]
+                if donor is not None:
+                    # Salt with the offset so borrowed values don't create false collisions
+                    bins[i] = _hash64(f"{donor}:{offset}")
+                offset += 1
+        return tuple(bins)
+
+    # --- Indexing ---
+    def _find(self, i):
+        while self._parent[i] != i:
+            self._parent[i] = self._parent[self._parent[i]]
+            i = self._parent[i]
+        return i
+
+    def _union(self, a, b):
+        ra, rb = self._find(a), self._find(b)
+        if ra != rb:
+            # The lower id (first indexed) stays the representative
+            self._parent[max(ra, rb)] = min(ra, rb)
+
+    def add_code(self, code_string, filepath="<memory>"):
+        """Indexes every function of a source string. Returns the number of functions added."""
+        try:
+            tree = ast.parse(code_string)
+        except SyntaxError:
+            return 0
+        added = 0
+        for node in ast.walk(tree):
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            # Normalise a copy: ast.walk still has to reach nested functions untouched
+            normalized = _FingerprintNormalizer(alpha=True).visit(copy.deepcopy(node))
+            alpha_hash = hashlib.sha256(ast.dump(normalized, annotate_fields=False).encode("utf-8")).hexdigest()
+            func_id = len(self.functions)
+            self.functions.append({"id": func_id, "file": filepath, "name": node.name, "lineno": node.lineno,
+                                   "end_lineno": node.end_lineno, "alpha_hash": alpha_hash})
+            self._parent.append(func_id)
+            added += 1
+
+            # Exact alpha-clones short-circuit LSH
+            first = self._exact.setdefault(alpha_hash, func_id)
+            if first != func_id:
+                self._union(first, func_id)
+                continue
+
+            signature = self._signature(self._shingles(normalized))
+            self.functions[func_id]["signature"] = signature
+            for band in range(self.bands):
+                key = (band, signature[band * self.rows:(band + 1) * self.rows])
+                bucket = self._buckets.setdefault(key, [])
+                joined = False
+                for other in bucket:
+                    # One representative per cluster: near-identical functions join it instead of
+                    # piling up, so each insert costs at most bands * max_bucket comparisons
+                    if self._find(other) == self._find(func_id):
+                        joined = True
+                    elif self.similarity(other, func_id) >= self.threshold:
+                        self._union(other, func_id)
+                        joined = True
+                if not joined and len(bucket) < self.max_bucket:
+                    bucket.append(func_id)
+        return added
+
+    def add_file(self, filepath):
+        return self.add_code(ReaperTools.read_file(filepath), filepath)
+
+    def similarity(self, a, b):
+        """Estimated Jaccard similarity of two indexed functions (fraction of equal MinHash bins)."""
+        sig_a = self.functions[a].get("signature")
+        sig_b = self.functions[b].get("signature")
+        if sig_a is None or sig_b is None:
+            return 1.0 if self.functions[a]["alpha_hash"] == self.functions[b]["alpha_hash"] else 0.0
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / self.num_bins
+
+    # --- Results ---
+    def clusters(self, min_size=2):
+        """Returns [{'representative': func, 'members': [func, ...]}] for clusters of at least min_size."""
+        groups = {}
+        for func in self.functions:
+            groups.setdefault(self._find(func["id"]), []).append(func)
+        result = []
+        for root, members in groups.items():
+            if len(members) < min_size:
+                continue
+            rep = self.functions[root]
+            result.append({
+                "representative": rep,
+                "members": [m for m in members if m["id"] != root],
+            })
+        return result
+
+    def followers(self):
+        """Maps every non-representative function id to its cluster representative id."""
+        return {f["id"]: self._find(f["id"]) for f in self.functions if self._find(f["id"]) != f["id"]}
+
+    def schedule(self, filepaths):
+        """
+        Splits target files into (primary, deferred). A file is deferred when every one of
+        its functions is a clone whose representative lives in another file: refactoring
+        the representative first lets the clone reuse the result (see fan_out). Reuse is
+        per file, so only a file that is an exact alpha-clone as a whole skips the Surgeon.
+        """
+        rep_of = self.followers()
+        functions_by_file = {}
+        for func in self.functions:
+            functions_by_file.setdefault(func["file"], []).append(func)
+        primary, deferred = [], []
+        for path in filepaths:
+            funcs = functions_by_file.get(path, [])
+            redundant = funcs and all(
+                f["id"] in rep_of and self.functions[rep_of[f["id"]]]["file"] != path for f in funcs
+            )
+            (deferred if redundant else primary).append(path)
+        return primary, deferred
+
+    def report(self):
+        """Compact JSON-friendly summary, in the same spirit as ReaperTools.analyze_complexity."""
+        def label(func):
+            return f"{os.path.basename(func['file'])}:{func['name']}:{func['lineno']}"
+
+        return [
+            {
+                "representative": label(c["representative"]),
+                "clones": [label(m) for m in c["members"]],
+                "exact": all(m["alpha_hash"] == c["representative"]["alpha_hash"] for m in c["members"]),
+            }
+            for c in self.clusters()
+        ]
+
+
+def alpha_rename_map(source_code, target_code):
+    """
+    For two alpha-equivalent snippets, maps each identifier of `source_code` to the
+    identifier in the same canonical position of `target_code`. Returns None if the
+    snippets are not alpha-clones of each other.
+    """
+    source_hash, source_names = ReaperTools.alpha_fingerprint(source_code)
+    target_hash, target_names = ReaperTools.alpha_fingerprint(target_code)
+    if source_hash is None or source_hash != target_hash:
+        return None
+    return {s: t for s, t in zip(source_names, target_names) if s != t}
+
+
+def _keyword_positions(code_string, lines):
+    """(row, col) of every keyword-argument name in a call or class header, in tokenize columns."""
+    try:
+        tree = ast.parse(code_string)
+    except SyntaxError:
+        return set()
+    positions = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.keyword) and node.arg is not None:
+            # ast columns are UTF-8 byte offsets, tokenize columns are characters
+            line = lines[node.lineno - 1]
+            col = len(line.encode("utf-8")[:node.col_offset].decode("utf-8"))
+            positions.add((node.lineno, col))
+    return positions
+
+
+def rename_identifiers(code_string, mapping):
+    """
+    Renames identifiers token by token, so comments and formatting survive.
+    Attribute names (anything after a '.') and keyword-argument names in calls are left
+    alone: they name the callee's parameters, which the alpha fingerprint keeps as well.
+    """
+    if not mapping:
+        return code_string
+    lines = code_string.splitlines(keepends=True)
+    keywords = _keyword_positions(code_string, lines)
+    edits = []
+    prev = None
+    for tok in tokenize.generate_tokens(io.StringIO(code_string).readline):
+        if tok.type == tokenize.NAME and tok.string in mapping and not (prev and prev.string == ".") \
+                and tok.start not in keywords:
+            edits.append(tok)
+        if tok.type not in (tokenize.NL, tokenize.NEWLINE, tokenize.COMMENT):
+            prev = tok
+    # Apply right-to-left so earlier column offsets on the same line stay valid
+    for tok in reversed(edits):
+        row, col = tok.start
+        line = lines[row - 1]
+        lines[row - 1] = line[:col] + mapping[tok.string] + line[tok.end[1]:]
+    return "".join(lines)
+
+
+def fan_out(representative_before, representative_after, clone_before):
+    """
+    Adapts a verified refactor of the representative to an exact alpha-clone by renaming
+    the representative's identifiers to the clone's. Returns None for non-exact clones.
+    """
+    mapping = alpha_rename_map(representative_before, clone_before)
+    if mapping is None:
+        return None
+    return rename_identifiers(representative_after, mapping)
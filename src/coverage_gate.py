@@ -0,0 +1,271 @@
+"""
+Coverage-guided acceptance gate for refactors.
+
+Tests run in a child interpreter (`python coverage_gate.py --target FILE --out JSON -- PYTEST_ARGS`)
+that records which lines and branch directions of the target file execute, and nothing else:
+on Python 3.12+ through sys.monitoring (each line/branch location disables itself after its
+first hit, so the overhead is close to zero); on older versions through a sys.settrace
+hook that only installs a local tracer for frames of the target file.
+"""
+import argparse
+import ast
+import difflib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# --- Static analysis of the target ---
+def executable_lines(code):
+    """Line numbers of statements that produce line events (docstrings, def/class headers and global excluded)."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set()
+    docstrings = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.body:
+            first = node.body[0]
+            if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str):
+                docstrings.add(first)
+    skip = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Global, ast.Nonlocal)
+    return {node.lineno for node in ast.walk(tree)
+            if isinstance(node, ast.stmt) and not isinstance(node, skip) and node not in docstrings}
+
+
+def branch_points(code):
+    """{line: (body_line, else_line or None)} for if/while/for statements; each has two outcomes."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return {}
+    points = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.If, ast.While, ast.For, ast.AsyncFor)) and node.body:
+            points[node.lineno] = (node.body[0].lineno, node.orelse[0].lineno if node.orelse else None)
+    return points
+
+
+def changed_lines(before, after):
+    """Line numbers of `after` that were inserted or replaced relative to `before`."""
+    matcher = difflib.SequenceMatcher(None, before.splitlines(), after.splitlines(), autojunk=False)
+    changed = set()
+    for tag, _, _, j1, j2 in matcher.get_opcodes():
+        if tag in ("replace", "insert"):
+            changed.update(range(j1 + 1, j2 + 1))
+    return changed
+
+
+def summarize(code, data, lines_of_interest=None):
+    """
+    Line and branch coverage of `code` given collected data
+    {"lines": [...], "branches": {line: directions taken (0-2)}}, optionally restricted to
+    lines_of_interest (e.g. the changed lines).
+    """
+    executable = executable_lines(code)
+    if lines_of_interest is not None:
+        executable &= set(lines_of_interest)
+    hit = set(data.get("lines", []))
+    taken = {int(line): count for line, count in data.get("branches", {}).items()}
+
+    branches = covered_branches = 0
+    for line in branch_points(code):
+        if lines_of_interest is not None and line not in lines_of_interest:
+            continue
+        branches += 2
+        covered_branches += min(taken.get(line, 0), 2)
+    covered = executable & hit
+    return {
+        "lines": len(executable),
+        "covered_lines": len(covered),
+        "line_rate": round(len(covered) / len(executable), 3) if executable else 1.0,
+        "branches": branches,
+        "covered_branches": covered_branches,
+        "branch_rate": round(covered_branches / branches, 3) if branches else 1.0,
+        "missing": sorted(executable - hit),
+    }
+
+
+# --- Collection (runs in the child interpreter) ---
+def _install_monitoring(target, lines, branches):
+    """Python 3.12+: LINE and BRANCH events, filtered to the target file."""
+    mon = sys.monitoring
+    tool = mon.COVERAGE_ID
+    mon.use_tool_id(tool, "codereaper-coverage")
+    line_maps = {}
+    matches = {}
+    seen_branches = {}  # (code, offset) -> destinations taken
+
+    def line_of(code, offset):
+        mapping = line_maps.get(code)
+        if mapping is None:
+            mapping = line_maps[code] = {}
+            for start, end, line in code.co_lines():
+                for off in range(start, end, 2):
+                    mapping[off] = line
+        return mapping.get(offset)
+
+    def is_target(code):
+        filename = code.co_filename
+        if filename not in matches:
+            matches[filename] = os.path.realpath(filename) == target
+        return matches[filename]
+
+    def on_line(code, line):
+        if is_target(code):
+            lines.add(line)
+        return mon.DISABLE
+
+    def on_branch(code, offset, destination):
+        if not is_target(code):
+            return mon.DISABLE
+        # A branch location is only switched off once both of its directions have been seen
+        taken = seen_branches.setdefault((code, offset), set())
+        taken.add(destination)
+        line = line_of(code, offset)
+        branches[line] = max(branches.get(line, 0), len(taken))
+        return mon.DISABLE if len(taken) > 1 else None
+
+    mon.register_callback(tool, mon.events.LINE, on_line)
+    mon.register_callback(tool, mon.events.BRANCH, on_branch)
+    mon.set_events(tool, mon.events.LINE | mon.events.BRANCH)
+
+
+def _install_settrace(target, lines, branches):
+    """Fallback for older interpreters: only frames of the target file get a local tracer."""
+    matches = {}
+    previous = {}
+    exits = {}  # line -> distinct next lines (function exit counts as one)
+
+    def arc(src, dst):
+        seen = exits.setdefault(src, set())
+        if dst not in seen and len(seen) < 2:
+            seen.add(dst)
+            branches[src] = len(seen)
+
+    def local(frame, event, arg):
+        key = id(frame)
+        if event == "line":
+            lines.add(frame.f_lineno)
+            if key in previous:
+                arc(previous[key], frame.f_lineno)
+            previous[key] = frame.f_lineno
+        elif event == "return":
+            if key in previous:
+                arc(previous.pop(key), None)
+        return local
+
+    def global_trace(frame, event, arg):
+        filename = frame.f_code.co_filename
+        if filename not in matches:
+            matches[filename] = os.path.realpath(filename) == target
+        return local if matches[filename] else None
+
+    sys.settrace(global_trace)
+    threading.settrace(global_trace)
+
+
+def _child_main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", required=True)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("pytest_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    import pytest
+
+    # Match `python -m pytest`, which puts the working directory on sys.path
+    sys.path.insert(0, os.getcwd())
+    target = os.path.realpath(args.target)
+    lines, branches = set(), {}
+    if hasattr(sys, "monitoring"):
+        _install_monitoring(target, lines, branches)
+    else:
+        _install_settrace(target, lines, branches)
+    pytest_args = [a for a in args.pytest_args if a != "--"]
+    try:
+        code = pytest.main(pytest_args)
+    finally:
+        sys.settrace(None)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"lines": sorted(lines), "branches": {str(k): v for k, v in branches.items() if k}}, f)
+    return int(code)
+
+
+# --- Parent side ---
+def _run_group(target, test_paths, cwd, env=None):
+    fd, out_path = tempfile.mkstemp(suffix=".json", prefix="reaper_cov_")
+    os.close(fd)
+    try:
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--target", target, "--out", out_path, "--",
+             *test_paths, "-v", "-o", "warning_filter=ignore"],
+            capture_output=True, text=True, cwd=cwd, env=env,
+        )
+        try:
+            with open(out_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {"lines": [], "branches": {}}
+    finally:
+        os.remove(out_path)
+    # Same layout as ReaperTools.run_tests
+    output = f"TESTS PASSED:\n{result.stdout}" if result.returncode == 0 else f"TESTS FAILED:\n{result.stdout}\n{result.stderr}"
+    return output, data
+
+
+def run_with_coverage(test_paths, target, workers=4, cwd=None, env=None):
+    """
+    Drop-in for ReaperTools.run_tests_parallel that also collects coverage of `target`.
+    Returns (all_passed, outputs, data) where data merges the lines/branches of every group.
+    """
+    test_paths = [os.path.abspath(path) for path in test_paths]
+    if not test_paths:
+        return True, [], {"lines": [], "branches": {}}
+    groups = [test_paths[i::workers] for i in range(min(workers, len(test_paths)))]
+    with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+        runs = list(pool.map(lambda group: _run_group(os.path.abspath(target), group, cwd, env), groups))
+    lines, branches = set(), {}
+    for _, data in runs:
+        lines.update(data["lines"])
+        for line, taken in data["branches"].items():
+            # Groups can't tell which direction they took, so the merge is conservative (max, not sum)
+            branches[line] = max(branches.get(line, 0), taken)
+    outputs = [output for output, _ in runs]
+    return all(out.startswith("TESTS PASSED") for out in outputs), outputs, {"lines": sorted(lines), "branches": branches}
+
+
+class CoverageGate:
+    """
+    Rejects refactors whose changed lines are not exercised by the tests that 'passed' them.
+    The coverage comes from the run that produced the verdict, so the gate adds no test run.
+    """
+
+    def __init__(self, threshold=0.7, workers=4):
+        self.threshold = threshold
+        self.workers = workers
+
+    def check(self, before, after, data):
+        """Returns (accepted, report). Only the changed lines of `after` are held to the threshold."""
+        changed = changed_lines(before, after)
+        report = {"changed": summarize(after, data, changed), "file": summarize(after, data),
+                  "threshold": self.threshold}
+        return report["changed"]["line_rate"] >= self.threshold, report
+
+    @staticmethod
+    def describe(report):
+        changed, whole = report["changed"], report["file"]
+        text = (f"Coverage of changed lines: {changed['covered_lines']}/{changed['lines']} "
+                f"({changed['line_rate']:.0%}, branches {changed['branch_rate']:.0%}); "
+                f"whole file {whole['line_rate']:.0%}; threshold {report['threshold']:.0%}.")
+        if changed["missing"]:
+            text += f" Unexercised changed lines: {', '.join(map(str, changed['missing'][:20]))}"
+        return text
+
+
+if __name__ == "__main__":
+    sys.exit(_child_main(sys.argv[1:]))
@@ -0,0 +1,451 @@
+import ast
+import builtins
+import contextlib
+import io
+import itertools
+import math
+import os
+import random
+import re
+import signal
+import sys
+import types
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+_ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+_MISSING = object()
+
+
+# --- Input generation ---
+def _literal(node, constants):
+    """literal_eval that also resolves names bound to module-level literals (e.g. `data = [1, 2]`)."""
+    if isinstance(node, ast.Name) and node.id in constants:
+        return constants[node.id]
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, RecursionError):
+        return _MISSING
+
+
+def collect_call_sites(source, func_names):
+    """
+    Observed calls with literal arguments, e.g. `process_data([1, 6, 3, 8])` in a dependent
+    module. Returns {func_name: [(args, kwargs)]}; calls with non-literal arguments are ignored.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return {}
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            value = _literal(node.value, {})
+            if value is not _MISSING:
+                constants[node.targets[0].id] = value
+
+    sites = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        name = node.func.id if isinstance(node.func, ast.Name) else getattr(node.func, "attr", None)
+        if name not in func_names or any(isinstance(a, ast.Starred) for a in node.args) or \
+                any(k.arg is None for k in node.keywords):
+            continue
+        args = [_literal(a, constants) for a in node.args]
+        kwargs = {k.arg: _literal(k.value, constants) for k in node.keywords}
+        if _MISSING in args or _MISSING in kwargs.values():
+            continue
+        sites.setdefault(name, []).append((tuple(args), kwargs))
+    return sites
+
+
+class InputGenerator:
+    """
+    Hypothesis-style argument generator for one function. Each parameter gets a pool of
+    boundary values plus seeded random draws, chosen from its type hint or, without one,
+    from how the body uses it (iterated/len()/indexed -> list, compared with a string -> str,
+    arithmetic -> number). Constants the body compares against (op == 'add') and their
+    neighbours (i > 5 -> 4, 5, 6) are added so every branch has a chance to run.
+    """
+
+    def __init__(self, func_node, seed=0):
+        self.func = func_node
+        body = func_node.body
+        self._docstring = body[0].value if body and isinstance(body[0], ast.Expr) \
+            and isinstance(body[0].value, ast.Constant) else None
+        self.rng = random.Random(zlib.crc32(func_node.name.encode()) + seed)
+        self.constants = self._body_constants()
+
+    def _body_constants(self):
+        found = {"int": set(), "float": set(), "str": set()}
+        for node in ast.walk(self.func):
+            if isinstance(node, ast.Constant) and not isinstance(node.value, bool) and node is not self._docstring:
+                kind = type(node.value).__name__
+                if kind in found:
+                    found[kind].add(node.value)
+        for value in list(found["int"]):
+            found["int"].update((value - 1, value + 1))
+        return found
+
+    def _usage(self, name):
+        """Guesses 'list', 'str', 'float', 'int' or 'bool' from how a parameter is used."""
+        votes = {}
+
+        def vote(kind):
+            votes[kind] = votes.get(kind, 0) + 1
+
+        def is_param(node):
+            return isinstance(node, ast.Name) and node.id == name
+
+        for node in ast.walk(self.func):
+            if isinstance(node, (ast.For, ast.comprehension)) and is_param(node.iter):
+                vote("list")
+            elif isinstance(node, ast.Subscript) and is_param(node.value):
+                vote("list")
+            elif isinstance(node, ast.Call) and getattr(node.func, "id", None) in ("len", "sorted", "sum", "max", "min") \
+                    and node.args and is_param(node.args[0]):
+                vote("list")
+            elif isinstance(node, ast.Attribute) and is_param(node.value):
+                if node.attr in ("append", "extend", "pop", "insert", "sort", "index", "count"):
+                    vote("list")
+                elif node.attr in ("lower", "upper", "strip", "split", "startswith", "endswith", "replace", "join"):
+                    vote("str")
+            elif isinstance(node, ast.Compare) and any(is_param(n) for n in [node.left] + node.comparators):
+                for other in [node.left] + node.comparators:
+                    if isinstance(other, ast.Constant) and not is_param(other):
+                        vote({"str": "str", "float": "float", "bool": "bool"}.get(type(other.value).__name__, "int"))
+            elif isinstance(node, (ast.BinOp, ast.AugAssign)):
+                operands = [node.left, node.right] if isinstance(node, ast.BinOp) else [node.target, node.value]
+                if any(is_param(n) for n in operands):
+                    vote("float" if any(isinstance(n, ast.Constant) and isinstance(n.value, float) for n in operands)
+                         else "int")
+            elif isinstance(node, (ast.If, ast.While)) and is_param(node.test):
+                vote("bool")
+        return max(votes, key=votes.get) if votes else "int"
+
+    def _kind(self, annotation, name):
+        if annotation is None:
+            return self._usage(name)
+        text = ast.unparse(annotation).replace("typing.", "")
+        optional = "None" in text or text.startswith("Optional")
+        base = re.sub(r"^Optional\[(.*)\]$", r"\1", text).replace("| None", "").replace("None |", "").strip()
+        outer = base.split("[", 1)[0].lower()
+        inner = base[len(outer) + 1:-1] if "[" in base else ""
+        kinds = {"int": "int", "float": "float", "complex": "float", "str": "str", "bool": "bool",
+                 "list": "list", "sequence": "list", "iterable": "list", "tuple": "tuple", "set": "set",
+                 "frozenset": "set", "dict": "dict", "mapping": "dict"}
+        kind = kinds.get(outer, self._usage(name))
+        if inner and kind in ("list", "tuple", "set"):
+            kind += ":" + kinds.get(inner.split(",")[0].split("[")[0].strip().lower(), "int")
+        return ("?" if optional else "") + kind
+
+    def _value(self, kind):
+        rng = self.rng
+        if kind.startswith("?"):
+            return None if rng.random() < 0.15 else self._value(kind[1:])
+        kind, _, item = kind.partition(":")
+        if kind == "int":
+            pool = [0, 1, -1, 2, 10, -10, 100] + sorted(self.constants["int"])
+            return rng.choice(pool) if rng.random() < 0.6 else rng.randint(-1000, 1000)
+        if kind == "float":
+            pool = [0.0, 1.0, -1.0, 0.5, 2.25, 1e6] + sorted(float(v) for v in self.constants["int"] | self.constants["float"])
+            return rng.choice(pool) if rng.random() < 0.6 else round(rng.uniform(-1000, 1000), 3)
+        if kind == "str":
+            pool = ["", "a", "abc", " padded ", "MiXeD", "123"] + sorted(self.constants["str"])
+            if self.constants["str"] and rng.random() < 0.5:
+                return rng.choice(sorted(self.constants["str"]))
+            return rng.choice(pool) if rng.random() < 0.7 else "".join(rng.choice("abcxyz_ ") for _ in range(rng.randint(1, 8)))
+        if kind == "bool":
+            return rng.random() < 0.5
+        if kind in ("list", "tuple", "set"):
+            values = [self._value(item or "int") for _ in range(rng.choice([0, 1, 2, 3, 5, 8]))]
+            return {"list": list, "tuple": tuple, "set": set}[kind](values)
+        if kind == "dict":
+            return {self._value("str"): self._value("int") for _ in range(rng.randint(0, 4))}
+        return self._value("int")
+
+    def _boundaries(self, kind, limit=6):
+        """A few edge values per kind, tried in combination before random sampling starts."""
+        optional = kind.startswith("?")
+        kind, _, item = kind.lstrip("?").partition(":")
+        ints = sorted({0, 1, -1} | self.constants["int"], key=abs)
+        if kind == "int":
+            pool = ints
+        elif kind == "float":
+            pool = sorted({0.0, 1.0, -1.0} | {float(v) for v in self.constants["int"] | self.constants["float"]}, key=abs)
+        elif kind == "str":
+            pool = sorted(self.constants["str"]) + ["", "a"]
+        elif kind == "bool":
+            pool = [True, False]
+        elif kind in ("list", "tuple", "set"):
+            items = self._boundaries(item or "int", 3)
+            pool = [{"list": list, "tuple": tuple, "set": set}[kind](v) for v in ([], items[:1], items)]
+        elif kind == "dict":
+            pool = [{}, {"a": 1}]
+        else:
+            pool = ints
+        return pool[:limit] + ([None] if optional else [])
+
+    def cases(self, count, observed=()):
+        """Up to `count` distinct (args, kwargs) cases, observed call sites first."""
+        args = self.func.args
+        positional = args.posonlyargs + args.args
+        if positional and positional[0].arg in ("self", "cls"):
+            return []
+        required = len(positional) - len(args.defaults)
+        kinds = [self._kind(a.annotation, a.arg) for a in positional]
+
+        cases, seen = [], set()
+
+        def add(case):
+            key = repr(case)
+            if key not in seen:
+                seen.add(key)
+                cases.append(case)
+
+        for case in observed:
+            add(case)
+        # Edge values in combination first (capped at half the budget), then random draws
+        corners = list(itertools.product(*(self._boundaries(kind) for kind in kinds)))
+        self.rng.shuffle(corners)
+        for combo in corners[:max(1, count // 2)]:
+            add((combo, {}))
+        attempts = 0
+        while len(cases) < count and attempts < count * 5:
+            attempts += 1
+            # Sometimes leave defaulted parameters out so the defaults get exercised too
+            n_args = len(positional) if self.rng.random() < 0.8 else required
+            add((tuple(self._value(kind) for kind in kinds[:n_args]), {}))
+        return cases[:count]
+
+
+# --- Execution (runs inside worker processes) ---
+class _CaseTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _CaseTimeout()
+
+
+def canonical(value, depth=0):
+    """Order-insensitive, address-free, float-tolerant representation used to compare outcomes."""
+    if depth > 20:
+        return "..."
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "nan"
+        return float(f"{value:.10g}")
+    if isinstance(value, (int, str, bool, bytes, type(None))):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [type(value).__name__] + [canonical(v, depth + 1) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return ["set"] + sorted((canonical(v, depth + 1) for v in value), key=repr)
+    if isinstance(value, dict):
+        return ["dict"] + sorted(([canonical(k, depth + 1), canonical(v, depth + 1)] for k, v in value.items()), key=repr)
+    if isinstance(value, types.GeneratorType) or type(value).__name__ in ("map", "filter", "zip", "range"):
+        return ["iter"] + [canonical(v, depth + 1) for v, _ in zip(value, range(1000))]
+    if isinstance(value, (types.FunctionType, types.ModuleType, type)):
+        return f"<{type(value).__name__} {getattr(value, '__name__', '?')}>"
+    if hasattr(value, "__dict__"):
+        return [type(value).__name__, canonical(vars(value), depth + 1)]
+    return _ADDRESS.sub("", repr(value))
+
+
+def _module_state(namespace):
+    """Module-level data (not functions, classes or modules), so changed global side effects show up."""
+    return {k: canonical(v) for k, v in namespace.items()
+            if not k.startswith("__") and not isinstance(v, (types.FunctionType, types.ModuleType, type))}
+
+
+def _no_input(*args, **kwargs):
+    raise RuntimeError("input() is not available during differential testing")
+
+
+def execute_cases(code, module_name, func_name, cases, search_path=None, timeout=2.0):
+    """
+    Runs func_name on every case, each in a freshly executed copy of the module so one case's
+    global side effects can't leak into the next. Returns one outcome dict per case.
+    """
+    if search_path and search_path not in sys.path:
+        sys.path.insert(0, search_path)
+    compiled = compile(code, f"<{module_name}>", "exec")
+    builtins.input = _no_input
+    use_alarm = hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+
+    outcomes = []
+    for args, kwargs in cases:
+        namespace = {"__name__": module_name, "__builtins__": builtins}
+        stdout = io.StringIO()
+        outcome = {}
+        try:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            with contextlib.redirect_stdout(io.StringIO()):
+                exec(compiled, namespace)
+            func = namespace.get(func_name)
+            if not callable(func):
+                outcome = {"kind": "missing"}
+            else:
+                with contextlib.redirect_stdout(stdout):
+                    result = func(*args, **kwargs)
+                outcome = {"kind": "return", "value": canonical(result)}
+        except _CaseTimeout:
+            outcome = {"kind": "timeout"}
+        except RecursionError:
+            outcome = {"kind": "raise", "value": "RecursionError"}
+        except BaseException as e:
+            outcome = {"kind": "raise", "value": type(e).__name__}
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        outcome["stdout"] = stdout.getvalue()
+        outcome["args"] = canonical([args, kwargs])
+        outcome["globals"] = _module_state(namespace) if outcome["kind"] != "timeout" else None
+        outcomes.append(outcome)
+    return outcomes
+
+
+# --- Engine ---
+class DifferentialTester:
+    """
+    Differential testing of a refactor without an LLM: both versions of the module are
+    executed in isolated worker processes on the same generated inputs (observed call sites
+    first, then property-based samples), and return values, raised exception types,
+    printed output, argument mutation and module-level state are compared case by case.
+
+    Verdicts: 'equivalent' (every function was exercised, nothing differed and nothing
+    outside the top-level functions changed),
+    'different' (at least one case diverged) or 'inconclusive' (nothing could be
+    exercised meaningfully, e.g. all generated inputs crash the original; callers should
+    fall back to generated unit tests).
+    """
+
+    def __init__(self, max_cases=60, seed=0, timeout=2.0, workers=2, min_valid=3):
+        self.max_cases = max_cases
+        self.seed = seed
+        self.timeout = timeout
+        self.workers = workers
+        self.min_valid = min_valid
+
+    @staticmethod
+    def _functions(code):
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return None
+        return {node.name: node for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+
+    @staticmethod
+    def _untested_code(code):
+        """Top-level statements no generated case calls directly: classes, assignments, loops, ..."""
+        skip = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Import, ast.ImportFrom)
+        return [ast.dump(node) for node in ast.parse(code).body if not isinstance(node, skip)]
+
+    def run(self, original_code, refactored_code, call_site_sources=(), search_path=None, module_name="reaper_target"):
+        original_funcs = self._functions(original_code)
+        refactored_funcs = self._functions(refactored_code)
+        report = {"verdict": "inconclusive", "cases": 0, "functions": [], "mismatches": [], "skipped": []}
+        if original_funcs is None or refactored_funcs is None:
+            report["skipped"].append("module does not parse")
+            return report
+        # Only top-level functions get called; a change anywhere else (a method, a class
+        # attribute, module-level code) would go untested, so it can never be 'equivalent'
+        untested_change = self._untested_code(original_code) != self._untested_code(refactored_code)
+        if untested_change:
+            report["skipped"].append("code outside top-level functions changed (classes or module-level statements)")
+
+        observed = {}
+        for source in (original_code, *call_site_sources):
+            for name, sites in collect_call_sites(source, set(original_funcs)).items():
+                observed.setdefault(name, []).extend(sites)
+
+        plan = {}
+        for name, node in original_funcs.items():
+            if isinstance(node, ast.AsyncFunctionDef):
+                report["skipped"].append(f"{name}: async")
+                continue
+            if name not in refactored_funcs:
+                if name.startswith("_"):
+                    report["skipped"].append(f"{name}: private helper removed")
+                else:
+                    report["mismatches"].append({"function": name, "case": None, "reason": "public function removed"})
+                continue
+            cases = InputGenerator(node, self.seed).cases(self.max_cases, observed.get(name, ()))
+            if cases:
+                plan[name] = cases
+            else:
+                report["skipped"].append(f"{name}: no callable signature")
+
+        # Both versions of every function run concurrently, each in its own worker process
+        with ProcessPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            futures = {(name, version): pool.submit(execute_cases, code, module_name, name, cases, search_path,
+                                                    self.timeout)
+                       for name, cases in plan.items()
+                       for version, code in (("original", original_code), ("refactored", refactored_code))}
+            outcomes = {key: future.result() for key, future in futures.items()}
+
+        exercised = 0
+        for name, cases in plan.items():
+            before, after = outcomes[(name, "original")], outcomes[(name, "refactored")]
+            valid = 0
+            for case, old, new in zip(cases, before, after):
+                if old["kind"] == "timeout":
+                    continue
+                report["cases"] += 1
+                valid += old["kind"] == "return"
+                if new.get("globals") and old.get("globals") is not None:
+                    # New module-level constants introduced by the refactor are fine; changed old ones are not
+                    new = {**new, "globals": {k: new["globals"].get(k, _MISSING) for k in old["globals"]}}
+                if old != new:
+                    reason = next(k for k in ("kind", "value", "stdout", "args", "globals") if old.get(k) != new.get(k))
+                    report["mismatches"].append({"function": name, "case": repr(case)[:200], "reason": reason,
+                                                 "original": repr(old.get(reason))[:200],
+                                                 "refactored": repr(new.get(reason))[:200]})
+            report["functions"].append({"function": name, "cases": len(cases), "valid": valid})
+            if valid >= min(self.min_valid, len(cases)):
+                exercised += 1
+            else:
+                report["skipped"].append(f"{name}: only {valid} inputs ran cleanly on the original")
+
+        if report["mismatches"]:
+            report["verdict"] = "different"
+        elif plan and exercised == len(plan) and len(plan) == len(original_funcs) and not untested_change:
+            report["verdict"] = "equivalent"
+        return report
+
+    @staticmethod
+    def summary(report):
+        """Test-runner style text. Only an 'equivalent' verdict contains the word 'passed'."""
+        functions = ", ".join(f"{f['function']} ({f['valid']}/{f['cases']})" for f in report["functions"]) or "none"
+        if report["verdict"] == "equivalent":
+            head = f"DIFFERENTIAL TESTS PASSED: {report['cases']} cases passed, outputs identical."
+        elif report["verdict"] == "different":
+            head = f"DIFFERENTIAL TESTS FAILED: {len(report['mismatches'])} of {report['cases']} cases diverge."
+        else:
+            head = "DIFFERENTIAL TESTS INCONCLUSIVE."
+        lines = [head, f"Functions (clean inputs/cases): {functions}"]
+        for m in report["mismatches"][:10]:
+            lines.append(f"- {m['function']}{m['case'] or ''}: {m['reason']} differs"
+                         + (f" (original {m['original']}, refactored {m['refactored']})" if "original" in m else ""))
+        lines.extend(f"- skipped {s}" for s in report["skipped"])
+        return "\n".join(lines)
+
+
+def differential_test(original_path, refactored_code, dependents=(), **options):
+    """Convenience wrapper: compares a file on disk with its refactored source."""
+    with open(original_path, 'r', encoding='utf-8') as f:
+        original_code = f.read()
+    sources = []
+    for dep in dependents:
+        try:
+            with open(dep, 'r', encoding='utf-8') as f:
+                sources.append(f.read())
+        except OSError:
+            continue
+    return DifferentialTester(**options).run(original_code, refactored_code, sources,
+                                             search_path=os.path.dirname(os.path.abspath(original_path)))
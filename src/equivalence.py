@@ -0,0 +1,130 @@
+"""
+Static equivalence pre-check for refactors.
+
+Compares the original and refactored module without running anything, in increasing order
+of normalisation:
+
+  identical   same AST (only formatting/comments changed)
+  normalized  same AST once docstrings and annotations are stripped and function locals
+              are alpha-renamed (ReaperTools.ast_fingerprint's normalisation); locals shared
+              with nested scopes, and names declared global, keep their names
+  bytecode    same compiled bytecode of the normalised modules, recursively per function
+              (catches what the compiler folds away, e.g. `x = 60 * 60` vs `x = 3600`)
+
+Stripping is only trusted when the code can't observe it: modules that read annotations
+(dataclasses, NamedTuple, pydantic, singledispatch, ...) or docstrings (doctest, __doc__),
+or that introspect local names (locals(), eval), only ever count as 'identical'. A refactor
+that does not compile (e.g. a `nonlocal` without a binding) is never equivalent.
+"""
+import ast
+import symtable
+
+from tools import _FingerprintNormalizer
+
+ANNOTATION_SENSITIVE = {"dataclass", "dataclasses", "NamedTuple", "TypedDict", "BaseModel", "pydantic",
+                        "singledispatch", "singledispatchmethod", "get_type_hints", "__annotations__",
+                        "attr", "attrs", "define", "Annotated", "Protocol", "runtime_checkable"}
+DOCSTRING_SENSITIVE = {"__doc__", "doctest", "getdoc"}
+LOCALS_SENSITIVE = {"locals", "vars", "eval", "exec"}
+
+
+def _identifiers(tree):
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+        elif isinstance(node, ast.Attribute):
+            names.add(node.attr)
+        elif isinstance(node, ast.alias):
+            names.update(node.name.split("."))
+            if node.asname:
+                names.add(node.asname)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names.update(node.module.split("."))
+    return names
+
+
+def _scoped_names(source):
+    """
+    Names that cross a function scope boundary: free variables of nested functions (and so
+    the cell variables of the scopes they close over) and names declared global. Renaming
+    one of them in a single scope would change which binding the code refers to.
+    """
+    names = set()
+    tables = [symtable.symtable(source, "<module>", "exec")]
+    while tables:
+        table = tables.pop()
+        if table.get_type() == "function":
+            names.update(s.get_name() for s in table.get_symbols() if s.is_free() or s.is_declared_global())
+        tables.extend(table.get_children())
+    return names
+
+
+def _normalized(tree, rename_locals, keep=frozenset()):
+    tree = _FingerprintNormalizer(rename_locals, keep=keep).visit(tree)
+    return ast.fix_missing_locations(tree)
+
+
+def same_code(a, b):
+    """Recursive code-object comparison that ignores line numbers, positions and file names."""
+    for attr in ("co_code", "co_names", "co_varnames", "co_freevars", "co_cellvars", "co_flags", "co_argcount",
+                 "co_posonlyargcount", "co_kwonlyargcount", "co_name", "co_exceptiontable"):
+        if getattr(a, attr, None) != getattr(b, attr, None):
+            return False
+    if len(a.co_consts) != len(b.co_consts):
+        return False
+    for x, y in zip(a.co_consts, b.co_consts):
+        if hasattr(x, "co_code") and hasattr(y, "co_code"):
+            if not same_code(x, y):
+                return False
+        elif type(x) is not type(y) or x != y:  # 1 == 1.0 == True, but they are different constants
+            return False
+    return True
+
+
+def precheck(original, refactored, bytecode=True):
+    """
+    Returns {"verdict": "equivalent" | "different" | "unparseable", "level", "reason"}.
+    'different' only means "not provably the same": the change still needs testing.
+    """
+    try:
+        before, after = ast.parse(original), ast.parse(refactored)
+    except (SyntaxError, ValueError) as e:
+        return {"verdict": "unparseable", "level": None, "reason": f"Does not parse: {e}"}
+
+    if ast.dump(before) == ast.dump(after):
+        return {"verdict": "equivalent", "level": "identical", "reason": "Only formatting or comments changed."}
+
+    try:
+        compile(refactored, "<refactored>", "exec", dont_inherit=True)
+    except (SyntaxError, ValueError) as e:
+        return {"verdict": "unparseable", "level": None, "reason": f"Does not compile: {e}"}
+
+    names = _identifiers(before) | _identifiers(after)
+    blockers = sorted(names & (ANNOTATION_SENSITIVE | DOCSTRING_SENSITIVE))
+    if blockers:
+        return {"verdict": "different", "level": None,
+                "reason": f"Code reads annotations/docstrings at runtime ({', '.join(blockers)}); needs testing."}
+    rename_locals = not (names & LOCALS_SENSITIVE)
+    try:
+        keep = frozenset(_scoped_names(original) | _scoped_names(refactored))
+    except SyntaxError:
+        # The original itself does not compile: nothing about it can be proven
+        return {"verdict": "different", "level": None, "reason": "Original does not compile; needs testing."}
+
+    norm_before, norm_after = _normalized(before, rename_locals, keep), _normalized(after, rename_locals, keep)
+    if ast.dump(norm_before, annotate_fields=False) == ast.dump(norm_after, annotate_fields=False):
+        return {"verdict": "equivalent", "level": "normalized",
+                "reason": "Only docstrings, type hints, formatting or local variable names changed."}
+
+    if bytecode:
+        try:
+            code_before = compile(norm_before, "<original>", "exec")
+            code_after = compile(norm_after, "<refactored>", "exec")
+        except (SyntaxError, ValueError, TypeError):
+            code_before = code_after = None
+        if code_before is not None and same_code(code_before, code_after):
+            return {"verdict": "equivalent", "level": "bytecode",
+                    "reason": "Compiles to the same bytecode once docstrings and type hints are stripped."}
+
+    return {"verdict": "different", "level": None, "reason": "Behavioural change possible; needs testing."}
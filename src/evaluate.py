@@ -0,0 +1,244 @@
+"""
+Refactor-quality evaluation.
+
+    python src/evaluate.py --corpus target_code --models gemini-2.5-pro gemini-2.5-flash --workers 4
+    python src/evaluate.py --corpus temp_repo --limit 50 --strategies default minimal --output eval.csv
+    python src/evaluate.py --corpus target_code --fake          # harness dry run, no API calls
+    python src/evaluate.py --corpus target_code --models auto gemini-2.5-pro   # model router vs. pinned model
+
+Runs the pipeline over a corpus for every (model, prompt strategy) combination and writes one
+tidy row per target and combination: before/after cyclomatic complexity, maintainability index
+and LOC, whether the tests passed, LLM tokens and cost, and wall-clock time. Rows are appended
+to a CSV so runs with different models or prompts can be compared in one table.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from router import PRICES  # USD per 1M tokens (input, output); override with --price MODEL IN OUT
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Surgeon system prompts to compare ('default' keeps the role from agents.get_surgeon_agent)
+SURGEON_STRATEGIES = {
+    "default": None,
+    "minimal": "You are a careful Python maintainer. Make the smallest change that lowers cyclomatic complexity "
+               "(guard clauses, lookup tables, extracted helpers). Keep names, signatures and behaviour identical.",
+    "typed": "You are a Senior Python Architect. Rewrite the code with full type hints and docstrings, splitting "
+             "long functions into small pure helpers. Behaviour and public signatures must not change.",
+}
+
+FIELDS = [
+    "run_id", "model", "strategy", "target", "status", "tests_passed",
+    "cc_before", "cc_after", "cc_delta", "cc_max_before", "cc_max_after",
+    "mi_before", "mi_after", "mi_delta", "loc_before", "loc_after", "loc_delta",
+    "ref_cc", "ref_mi", "ref_loc", "llm_calls", "tokens_in", "tokens_out", "cost_usd", "seconds", "error",
+]
+
+
+def code_metrics(code):
+    """Total/max cyclomatic complexity, maintainability index and LOC (radon)."""
+    from radon.complexity import cc_visit
+    from radon.metrics import mi_visit
+    from radon.raw import analyze
+
+    try:
+        blocks = cc_visit(code)
+        return {"cc": sum(b.complexity for b in blocks), "cc_max": max((b.complexity for b in blocks), default=0),
+                "mi": round(mi_visit(code, multi=True), 2), "loc": analyze(code).sloc}
+    except (SyntaxError, ValueError):
+        return {"cc": None, "cc_max": None, "mi": None, "loc": None}
+
+
+def load_corpus(path, limit=None):
+    """
+    [{'target', 'reference'}] for every source file under path (tests and generated tests skipped).
+    messy_X.py / clean_X.py pairs are evaluated as target + human reference.
+    """
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d != "__pycache__")
+        files.extend(os.path.join(root, n) for n in sorted(names)
+                     if n.endswith(".py") and not n.startswith("test_") and not n.endswith("_test.py"))
+    references = {f for f in files if os.path.basename(f).startswith("clean_")}
+    corpus = []
+    for f in files:
+        if f in references:
+            continue
+        name = os.path.basename(f)
+        reference = os.path.join(os.path.dirname(f), "clean_" + name[len("messy_"):]) if name.startswith("messy_") else None
+        corpus.append({"target": f, "reference": reference if reference in references else None})
+    return corpus[:limit] if limit else corpus
+
+
+def evaluate_one(job):
+    """Runs one (target, model, strategy) in an isolated workspace. Executed in a worker process."""
+    sys.path.insert(0, SRC_DIR)
+    from coverage_gate import CoverageGate
+    from memory import MemoryBank, CheckpointJournal
+    from pipeline import ReaperPipeline
+    from research import get_research_backend
+    from router import ModelRouter
+    from telemetry import Tracer, set_tracer
+
+    target, reference, model, strategy, run_id = (job[k] for k in ("target", "reference", "model", "strategy", "run_id"))
+    with open(target, "r", encoding="utf-8") as f:
+        code_before = f.read()
+    row = {"run_id": run_id, "model": model, "strategy": strategy, "target": target, "error": ""}
+
+    # Copy the target into its own workspace so parallel runs never see each other's staged files
+    workspace = tempfile.mkdtemp(prefix="reaper_eval_")
+    try:
+        work_dir = os.path.join(workspace, os.path.basename(os.path.dirname(os.path.abspath(target))) or "src")
+        os.makedirs(work_dir)
+        work_target = os.path.join(work_dir, os.path.basename(target))
+        shutil.copyfile(target, work_target)
+
+        trace_path = os.path.join(workspace, "trace.jsonl")
+        tracer = Tracer(trace_path, None, run_id=run_id)
+        set_tracer(tracer)  # agents trace their llm_call spans through the process-wide tracer
+        router = False
+        if model == "auto":
+            # No factories: the pipeline's built-in agents follow the router's choice per target
+            factories = {}
+            router = ModelRouter(db_path=os.path.join(workspace, "routes.db"), prices=job["prices"])
+        elif model == "fake":
+            from benchmark import FakeLLM
+            factories = {"surgeon": lambda: FakeLLM("surgeon"), "executioner": lambda: FakeLLM("executioner")}
+        else:
+            from agents import Agent, get_surgeon_agent, get_executioner_agent
+            role = SURGEON_STRATEGIES[strategy]
+            factories = {"surgeon": (lambda: Agent("The Surgeon", role, model_name=model)) if role
+                         else (lambda: get_surgeon_agent(model)),
+                         "executioner": lambda: get_executioner_agent(model)}
+        pipeline = ReaperPipeline(
+            memory=MemoryBank(os.path.join(workspace, "memory.db"), legacy_path=os.path.join(workspace, "none.json")),
+            journal=CheckpointJournal(os.path.join(workspace, "journal.jsonl")),
+            tracer=tracer, agent_factories=factories, router=router,
+            # The research cache stays in the workspace too, so runs never write to the cwd
+            research=get_research_backend(db_path=os.path.join(workspace, "knowledge.db")),
+            coverage_gate=CoverageGate(threshold=float(os.getenv("CODEREAPER_COVERAGE_THRESHOLD", "0.7"))),
+        )
+        started = time.perf_counter()
+        try:
+            result = pipeline.run(work_target, label=os.path.basename(target))
+        except Exception as e:
+            result = {"status": f"Error: {e}", "code_after": "", "tests_passed": False}
+            row["error"] = str(e)[:200]
+        row["seconds"] = round(time.perf_counter() - started, 3)
+        pipeline.memory.close()
+        if router:
+            router.close()
+
+        calls = tokens_in = tokens_out = 0
+        cost = 0.0
+        with open(trace_path, "r", encoding="utf-8") as f:
+            for line in f:
+                event = json.loads(line)
+                if event["stage"] == "llm_call":
+                    calls += 1
+                    tokens_in += event.get("tokens_in") or 0
+                    tokens_out += event.get("tokens_out") or 0
+                    # Priced per call: a routed run mixes models
+                    price_in, price_out = job["prices"].get(event.get("model") or model, (0.0, 0.0))
+                    cost += ((event.get("tokens_in") or 0) * price_in + (event.get("tokens_out") or 0) * price_out) / 1e6
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    before = code_metrics(code_before)
+    after = code_metrics(result["code_after"]) if result.get("code_after") else dict.fromkeys(before)
+    ref = code_metrics(open(reference, encoding="utf-8").read()) if reference else dict.fromkeys(before)
+
+    def delta(key):
+        return round(after[key] - before[key], 2) if None not in (after[key], before[key]) else None
+
+    row.update({
+        "status": result["status"], "tests_passed": bool(result.get("tests_passed")),
+        "cc_before": before["cc"], "cc_after": after["cc"], "cc_delta": delta("cc"),
+        "cc_max_before": before["cc_max"], "cc_max_after": after["cc_max"],
+        "mi_before": before["mi"], "mi_after": after["mi"], "mi_delta": delta("mi"),
+        "loc_before": before["loc"], "loc_after": after["loc"], "loc_delta": delta("loc"),
+        "ref_cc": ref["cc"], "ref_mi": ref["mi"], "ref_loc": ref["loc"],
+        "llm_calls": calls, "tokens_in": tokens_in, "tokens_out": tokens_out,
+        "cost_usd": round(cost, 6),
+    })
+    return row
+
+
+def summarize(rows):
+    """One line per (model, strategy): pass rate, mean deltas, cost and time."""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row["model"], row["strategy"]), []).append(row)
+
+    def mean(values):
+        values = [v for v in values if v is not None]
+        return round(sum(values) / len(values), 3) if values else None
+
+    return [{
+        "model": model, "strategy": strategy, "targets": len(group),
+        "pass_rate": round(sum(r["tests_passed"] for r in group) / len(group), 3),
+        "mean_cc_delta": mean(r["cc_delta"] for r in group),
+        "mean_mi_delta": mean(r["mi_delta"] for r in group),
+        "mean_loc_delta": mean(r["loc_delta"] for r in group),
+        "cost_usd": round(sum(r["cost_usd"] for r in group), 4),
+        "mean_seconds": mean(r["seconds"] for r in group),
+    } for (model, strategy), group in sorted(groups.items())]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure refactor quality over a corpus")
+    parser.add_argument("--corpus", default="target_code", help="Directory of files to refactor")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--models", nargs="+", default=["gemini-2.5-pro"],
+                        help="Model names, or 'auto' to let the model router pick per target")
+    parser.add_argument("--strategies", nargs="+", default=["default"], choices=sorted(SURGEON_STRATEGIES))
+    parser.add_argument("--fake", action="store_true", help="Use the deterministic fake LLM (model 'fake')")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--price", nargs=3, action="append", metavar=("MODEL", "IN", "OUT"),
+                        help="USD per 1M input/output tokens (repeatable)")
+    parser.add_argument("--output", default="codereaper_eval.csv", help="Tidy CSV; rows are appended")
+    args = parser.parse_args(argv)
+    if "auto" in args.models and set(args.strategies) - {"default"}:
+        parser.error("'auto' routes the built-in agents, so it only supports --strategies default")
+
+    prices = dict(PRICES)
+    for model, price_in, price_out in args.price or []:
+        prices[model] = (float(price_in), float(price_out))
+    models = ["fake"] if args.fake else args.models
+    run_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+    corpus = load_corpus(args.corpus, args.limit)
+    jobs = [{**entry, "model": model, "strategy": strategy, "run_id": run_id, "prices": prices}
+            for entry in corpus for model in models for strategy in args.strategies]
+    print(f"Evaluating {len(corpus)} targets x {len(models)} models x {len(args.strategies)} strategies "
+          f"({len(jobs)} runs, {args.workers} workers)")
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        rows = list(pool.map(evaluate_one, jobs))
+
+    is_new = not os.path.exists(args.output) or os.path.getsize(args.output) == 0
+    with open(args.output, "a", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        if is_new:
+            writer.writeheader()
+        writer.writerows(rows)
+
+    summary = summarize(rows)
+    columns = list(summary[0]) if summary else []
+    widths = {c: max([len(c)] + [len(str(r[c])) for r in summary]) for c in columns}
+    print("  ".join(c.upper().ljust(widths[c]) for c in columns))
+    for row in summary:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+    print(f"{len(rows)} rows appended to {args.output} (run {run_id})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
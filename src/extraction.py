@@ -0,0 +1,217 @@
+"""
+Code extraction from LLM responses.
+
+Models wrap code in markdown fences, add prose before or after it, or sometimes return
+several blocks (a helper, the refactor and an example). extract_code() merges the blocks
+that define code and picks the candidate with the most parseable Python instead of blindly
+stripping fences, and reports responses that hold no Python at all, so they can be retried
+without a pointless syntax/guardian round. StreamingExtractor does the same on streamed
+chunks, parsing each fenced block as soon as it closes while the rest keeps streaming.
+"""
+import ast
+import re
+import textwrap
+
+_FENCE = re.compile(r"^[ \t]*(`{3,}|~{3,})[ \t]*([\w+.-]*)")
+_PYTHON_LANGS = {"", "python", "python3", "py", "pycon", "py3"}
+# Lines that only Python code starts with; prose rarely does
+_CODE_START = re.compile(r"^\s*(def |async def |class |import |from \S+ import |@\w|if __name__|\"\"\"|'''|#!|"
+                         r"[A-Za-z_][\w.]*\s*(=|\+=|-=|\(|:\s*\w+\s*=))")
+AGENT_ERROR_PREFIX = "Agent Error:"
+
+
+def _parse_size(code):
+    """Number of AST nodes if `code` parses, else -1 (empty code counts as unparseable)."""
+    if not code.strip():
+        return -1
+    try:
+        return sum(1 for _ in ast.walk(ast.parse(code)))
+    except (SyntaxError, ValueError):
+        return -1
+
+
+def _defined_names(code):
+    """Names of the top-level functions and classes in `code` (empty if it doesn't parse)."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return set()
+    return {node.name for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))}
+
+
+def _defines_something(code):
+    return bool(_defined_names(code))
+
+
+def merge_blocks(blocks):
+    """
+    Joins the defining blocks of one answer (e.g. a helper, then the code that uses it) into
+    one module, in order. A block whose definitions are all redefined later is an earlier
+    draft of the same code and is dropped.
+    """
+    names = [_defined_names(block) for block in blocks]
+    kept = [block for i, block in enumerate(blocks)
+            if not names[i] <= set().union(*names[i + 1:])]
+    return "\n\n\n".join(kept)
+
+
+def fenced_blocks(text):
+    """[(lang, code, closed)] for every fenced block; an unterminated last block runs to the end."""
+    blocks, current = [], None
+    for line in text.splitlines():
+        match = _FENCE.match(line)
+        if current is None:
+            if match:
+                current = {"fence": match.group(1), "lang": match.group(2).lower(), "lines": []}
+        elif match and match.group(1)[0] == current["fence"][0] and len(match.group(1)) >= len(current["fence"]) \
+                and not match.group(2):
+            blocks.append((current["lang"], "\n".join(current["lines"]), True))
+            current = None
+        else:
+            current["lines"].append(line)
+    if current is not None:
+        blocks.append((current["lang"], "\n".join(current["lines"]), False))
+    return blocks
+
+
+def trim_prose(text):
+    """`text` without leading/trailing lines that don't look like code (for unfenced answers)."""
+    lines = text.splitlines()
+    start = next((i for i, line in enumerate(lines) if _CODE_START.match(line)), None)
+    if start is None:
+        return ""
+    end = len(lines)
+    # Walk back over trailing prose: non-indented lines that no longer parse as part of the module
+    while end > start + 1 and _parse_size("\n".join(lines[start:end])) < 0:
+        end -= 1
+    return "\n".join(lines[start:end])
+
+
+def looks_like_code(text):
+    """True if a fence or at least one Python-looking line appears in `text`."""
+    return "```" in text or "~~~" in text or any(_CODE_START.match(line) for line in text.splitlines())
+
+
+def extract_code(text):
+    """
+    Returns (code, problem). `code` is the parseable candidate that defines a function or
+    class, else the one with the most Python (fenced python/untagged blocks and all their
+    definitions merged, then the response itself with prose trimmed);
+    `problem` is None when it parses, else a short reason suitable as retry feedback.
+    """
+    if text is None or not text.strip():
+        return "", "Empty response from the model."
+    if text.startswith(AGENT_ERROR_PREFIX):
+        return "", text.strip()
+
+    candidates = [code for lang, code, _ in fenced_blocks(text) if lang in _PYTHON_LANGS]
+    defining = [block for block in (textwrap.dedent(c).strip() for c in candidates) if _defines_something(block)]
+    if len(defining) > 1:
+        # First, so it also wins a tie with a draft that a later block replaced
+        candidates.insert(0, merge_blocks(defining))
+    # Unfenced text only counts if some line looks like code ('Done.' parses, but isn't a refactor)
+    candidates += [c for c in (text, trim_prose(text)) if any(_CODE_START.match(line) for line in c.splitlines())]
+    # A block that defines a function or class beats a bigger usage snippet (as in StreamingExtractor)
+    best, best_rank = None, (False, -1)
+    for candidate in candidates:
+        candidate = textwrap.dedent(candidate).strip()
+        size = _parse_size(candidate)
+        rank = (size >= 0 and _defines_something(candidate), size)
+        if size >= 0 and rank > best_rank:
+            best, best_rank = candidate, rank
+    if best is not None:
+        return best, None
+
+    if not looks_like_code(text):
+        first_line = text.strip().splitlines()[0][:120]
+        return "", f"Response contains no Python code (starts with: '{first_line}'). Output ONLY raw Python code."
+    # Code-like but broken: hand back the most plausible candidate so the syntax error can be reported
+    blocks = [code for lang, code, _ in fenced_blocks(text) if lang in _PYTHON_LANGS]
+    fallback = textwrap.dedent(max(blocks, key=len) if blocks else trim_prose(text) or text).strip()
+    try:
+        ast.parse(fallback)
+    except SyntaxError as e:
+        return fallback, f"Syntax Error: {e}"
+    return fallback, "Response could not be parsed as Python."
+
+
+class StreamingExtractor:
+    """
+    Incremental extract_code(). feed() each streamed chunk; every fenced Python block is
+    parsed as soon as it closes, and blocks that define a function or class are kept and
+    merged like extract_code() does, since a later block may hold the main code. feed()
+    only returns True (stop reading) once `prose_limit` characters arrived without anything
+    that looks like code. Only completed lines are scanned, so each chunk costs time
+    proportional to its size.
+    """
+
+    def __init__(self, prose_limit=1500):
+        self.prose_limit = prose_limit
+        self.text = ""
+        self.blocks = []         # closed fenced blocks that parse and define something
+        self.rejected = False
+        self._pending = ""       # incomplete last line
+        self._block = None       # open fence: {"fence", "lang", "lines"}
+        self._saw_code = False
+
+    def feed(self, chunk):
+        self.text += chunk
+        lines = (self._pending + chunk).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self._line(line)
+        if not self._saw_code and self._block is None and len(self.text) >= self.prose_limit:
+            self.rejected = True
+            return True
+        return False
+
+    def _line(self, line):
+        match = _FENCE.match(line)
+        if self._block is None:
+            if match:
+                self._saw_code = True
+                self._block = {"fence": match.group(1), "lang": match.group(2).lower(), "lines": []}
+            elif _CODE_START.match(line):
+                self._saw_code = True
+            return
+        if match and match.group(1)[0] == self._block["fence"][0] and not match.group(2):
+            block, self._block = self._block, None
+            code = textwrap.dedent("\n".join(block["lines"])).strip()
+            # Only blocks that define something count: a usage snippet isn't part of the refactor
+            if block["lang"] in _PYTHON_LANGS and _defines_something(code):
+                self.blocks.append(code)
+            return
+        self._block["lines"].append(line)
+
+    def result(self):
+        """(code, problem) like extract_code(), from what has been received so far."""
+        if self._pending:
+            # The stream ended without a final newline (often right after a closing fence)
+            self._line(self._pending)
+            self._pending = ""
+        if self.blocks and self._block is None:
+            code = merge_blocks(self.blocks)
+            if _parse_size(code) >= 0:
+                return code, None
+        if self.rejected:
+            first_line = self.text.strip().splitlines()[0][:120] if self.text.strip() else ""
+            return "", f"Response contains no Python code (starts with: '{first_line}'). Output ONLY raw Python code."
+        return extract_code(self.text)
+
+
+def request_code(agent, prompt):
+    """
+    Sends `prompt` and returns (code, problem, raw_response). Agents that can stream
+    (agents.Agent) have each block checked as it arrives and stop reading early only on
+    a response with no code at all; others are parsed whole.
+    """
+    if getattr(agent, "supports_streaming", False):
+        extractor = StreamingExtractor()
+        raw = agent.send_message(prompt, on_chunk=extractor.feed)
+        if raw.startswith(AGENT_ERROR_PREFIX):
+            return "", raw.strip(), raw
+        code, problem = extractor.result()
+        return code, problem, raw
+    raw = agent.send_message(prompt)
+    code, problem = extract_code(raw)
+    return code, problem, raw
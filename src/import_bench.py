@@ -0,0 +1,123 @@
+"""
+Import-time benchmark for CodeReaper entry points.
+
+    python src/import_bench.py [--repeat 5] [--budget-ms 200] [--output import_times.json]
+
+Each module is imported in a fresh interpreter with `python -X importtime`, and the
+cumulative cost of the module itself plus its heaviest dependencies is recorded. The
+analysis-only entry points (cli, tools, repo_tools, memory, clones) must stay under the
+budget; run this after touching imports so a stray top-level `import google.generativeai`
+shows up as a regression instead of a slow CLI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Entry point -> whether it has to meet the cold-start budget
+ENTRY_POINTS = {
+    "cli": True,
+    "tools": True,
+    "repo_tools": True,
+    "repo_index": True,
+    "parsing": True,
+    "memory": True,
+    "clones": True,
+    "telemetry": True,
+    "jobs": True,
+    "pipeline": False,  # pulls in the full pipeline, but still must not load the LLM SDK
+    "agents": False,
+}
+
+# Modules that must never be imported just by importing an entry point
+HEAVY_MODULES = ("google.generativeai", "radon", "googlesearch", "git", "streamlit", "pandas")
+
+
+def parse_importtime(stderr):
+    """Returns {module: (self_us, cumulative_us)} from `-X importtime` output."""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            timings[name.strip()] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return timings
+
+
+def measure(module, python=sys.executable):
+    """Imports `module` in a fresh interpreter; returns cumulative import ms, wall ms and the timing table."""
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    timings = parse_importtime(proc.stderr)
+    return timings.get(module, (0, 0))[1] / 1000, wall_ms, timings
+
+
+def run(modules, repeat=5, top=5):
+    """Best-of-`repeat` measurement per module (the minimum is the least noisy estimate)."""
+    rows = []
+    for module in modules:
+        runs = [measure(module) for _ in range(repeat)]
+        import_ms, wall_ms, timings = min(runs, key=lambda r: r[0])
+        # Heaviest third-party / stdlib imports pulled in by this module (top-level packages only)
+        heaviest = sorted(((name, cum) for name, (_, cum) in timings.items()
+                           if "." not in name and name != module), key=lambda item: -item[1])[:top]
+        rows.append({
+            "module": module,
+            "import_ms": round(import_ms, 2),
+            "wall_ms": round(min(r[1] for r in runs), 2),
+            "heavy_loaded": sorted(h for h in HEAVY_MODULES if h in timings),
+            "heaviest": [{"module": name, "ms": round(cum / 1000, 2)} for name, cum in heaviest],
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time per CodeReaper entry point")
+    parser.add_argument("--module", action="append", help="Only measure these modules (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=200.0, help="Cold-start budget for analysis-only modules")
+    parser.add_argument("--output", default=None, help="Also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    modules = args.module or list(ENTRY_POINTS)
+    rows = run(modules, args.repeat)
+
+    failures = []
+    for row in rows:
+        budgeted = ENTRY_POINTS.get(row["module"], True)
+        over = budgeted and (row["wall_ms"] > args.budget_ms or row["heavy_loaded"])
+        if row["module"] == "pipeline" and "google.generativeai" in row["heavy_loaded"]:
+            over = True
+        row["within_budget"] = not over
+        if over:
+            failures.append(row["module"])
+        print(f"{row['module']:<12} import {row['import_ms']:>8.2f} ms   cold start {row['wall_ms']:>8.2f} ms"
+              f"   {'OK' if not over else 'OVER BUDGET'}"
+              + (f"   heavy: {', '.join(row['heavy_loaded'])}" if row["heavy_loaded"] else ""))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"python": sys.version.split()[0], "budget_ms": args.budget_ms, "timestamp": time.time(),
+                       "results": rows}, f, indent=2)
+
+    if failures:
+        print(f"Over budget: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
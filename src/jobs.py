@@ -0,0 +1,232 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+class JobQueue:
+    """
+    Local SQLite-backed job queue shared by the dashboard and the worker processes.
+    The dashboard enqueues refactor jobs and polls their progress events; workers claim
+    jobs atomically (BEGIN IMMEDIATE), so several workers, users and batches can share one
+    deployment without stepping on each other.
+    """
+
+    def __init__(self, db_path="codereaper_jobs.db"):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, batch_id TEXT, target TEXT, label TEXT, resume INTEGER, "
+                "status TEXT, worker TEXT, created REAL, started REAL, finished REAL, result TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, job_id INTEGER, timestamp REAL, payload TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_job ON job_events (job_id, id)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps the queue safe across threads and processes
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # --- Producer side (dashboard / CLI) ---
+    def enqueue(self, target, label="", batch_id=None, resume=False):
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (batch_id, target, label, resume, status, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (batch_id, target, label, int(resume), time.time()),
+            )
+            return cur.lastrowid
+
+    def enqueue_batch(self, targets, resume=True):
+        """targets: [(label, path)]. Returns the batch id."""
+        batch_id = uuid.uuid4().hex[:12]
+        for label, path in targets:
+            self.enqueue(path, label, batch_id=batch_id, resume=resume)
+        return batch_id
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def batch(self, batch_id):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs WHERE batch_id = ? ORDER BY id", (batch_id,)).fetchall()
+        return [self._job(r) for r in rows]
+
+    def events(self, job_id, after_id=0):
+        """Progress events newer than after_id, so pollers only fetch what they haven't seen."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, payload FROM job_events WHERE job_id = ? AND id > ? ORDER BY id", (job_id, after_id)
+            ).fetchall()
+        return [{"id": r["id"], **json.loads(r["payload"])} for r in rows]
+
+    def counts(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    # --- Consumer side (workers) ---
+    def claim(self, worker_id):
+        """Atomically moves the oldest queued job to 'running'. Returns the job or None."""
+        with self._connect() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started = ? WHERE id = ?",
+                    (worker_id, time.time(), row["id"]),
+                )
+                conn.execute("COMMIT")
+                return self._job(row)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def add_event(self, job_id, event):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO job_events (job_id, timestamp, payload) VALUES (?, ?, ?)",
+                (job_id, time.time(), json.dumps(event, default=str)),
+            )
+
+    def finish(self, job_id, status, result=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, result = ? WHERE id = ?",
+                (status, time.time(), json.dumps(result or {}, default=str), job_id),
+            )
+
+    def requeue_stale(self, max_runtime=3600):
+        """Puts 'running' jobs whose worker died (no finish within max_runtime) back in the queue."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND started < ?",
+                (time.time() - max_runtime,),
+            )
+            return cur.rowcount
+
+    def requeue_worker(self, worker_id):
+        """
+        Puts the 'running' jobs of a stopped worker back in the queue right away. Pool workers'
+        ids extend their pool's id (see worker_name), so a pool id requeues the whole pool.
+        """
+        prefix = worker_id + ":"
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL "
+                "WHERE status = 'running' AND (worker = ? OR substr(worker, 1, ?) = ?)",
+                (worker_id, len(prefix), prefix),
+            )
+            return cur.rowcount
+
+    @staticmethod
+    def _job(row):
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job.get("result") else None
+        return job
+
+
+def worker_name(pid=None, pool_id=None):
+    """Id recorded on the jobs a worker claims: 'host:pid', or 'host:pool_pid:pid' inside a pool."""
+    name = f"{socket.gethostname()}:{pid or os.getpid()}"
+    return f"{pool_id}:{name.rsplit(':', 1)[1]}" if pool_id else name
+
+
+def worker_loop(db_path="codereaper_jobs.db", poll_interval=1.0, max_jobs=None, pool_id=None):
+    """
+    Claims and runs jobs until max_jobs is reached (forever by default). A pool worker also
+    stops once its pool process is gone, instead of running on as an orphan.
+    """
+    # Imported here so the queue itself stays importable without the LLM/analysis stack
+    from memory import CheckpointJournal
+    from pipeline import ReaperPipeline
+
+    queue = JobQueue(db_path)
+    worker_id = worker_name(pool_id=pool_id)
+    parent = os.getppid()
+    pipeline = ReaperPipeline()
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        if pool_id and os.getppid() != parent:
+            break
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        # Other workers append to the journal too; replay it so resume sees their progress
+        pipeline.journal = CheckpointJournal(pipeline.journal.path)
+        try:
+            result = pipeline.run(job["target"], job["label"] or "Single Target", resume=bool(job["resume"]),
+                                  on_event=lambda event: queue.add_event(job["id"], event))
+            queue.finish(job["id"], "done" if result["status"] == "Success" else "failed", result)
+        except Exception as e:
+            queue.add_event(job["id"], {"stage": "worker", "kind": "error", "message": f"Worker crashed: {e}", "data": None})
+            queue.finish(job["id"], "failed", {"status": f"Error: {e}"})
+        done += 1
+
+
+def start_workers(count=2, db_path="codereaper_jobs.db"):
+    """Spawns `count` detached worker processes; returns their multiprocessing handles."""
+    # Spawned, not forked: a fresh interpreter doesn't inherit the pool's SIGTERM handler,
+    # so terminate() stops a worker at any point, even while it is still starting up
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for _ in range(count):
+        p = context.Process(target=worker_loop, args=(db_path,),
+                            kwargs={"pool_id": worker_name()}, daemon=True)
+        p.start()
+        processes.append(p)
+    return processes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CodeReaper background workers")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--db", default="codereaper_jobs.db")
+    args = parser.parse_args()
+
+    queue = JobQueue(args.db)
+    queue.requeue_stale()
+    # terminate() from the dashboard goes through the cleanup below, like Ctrl+C. The handler only
+    # sets a flag: an exception raised from it can land somewhere that swallows it.
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    print(f"Starting {args.workers} CodeReaper workers on {args.db} (Ctrl+C to stop)")
+    handles = []
+    try:
+        handles = start_workers(args.workers, args.db)
+        while not stopping.is_set() and any(handle.is_alive() for handle in handles):
+            stopping.wait(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for handle in handles:
+            handle.terminate()
+        for handle in handles:
+            handle.join()
+        # Jobs the workers were in the middle of go straight back to the queue
+        requeued = queue.requeue_worker(worker_name())
+        if requeued:
+            print(f"Requeued {requeued} interrupted job(s)")
@@ -7,17 +7,38 @@ from colorama import Fore, Style, init
 from tools import ReaperTools, GlobalScopeGuardian
 from repo_tools import RepoManager, DependencyGraph
 from agents import get_inquisitor_agent, get_surgeon_agent, get_executioner_agent
+from extraction import request_code
+from prompts import PromptAssembler
+from equivalence import precheck
 from memory import MemoryBank
+from clones import CloneDetector
+from telemetry import get_tracer
 
 # Initialize Environment
 init(autoreset=True)
 logging.basicConfig(
     level=logging.INFO, 
     format='%(asctime)s - %(levelname)s - %(message)s', 
-    filename='codereaper_research.csv'
+    filename='codereaper_research.log'
 )
 
 memory = MemoryBank()
+journal = memory.journal
+tracer = get_tracer()
+
+REFACTOR_TEMPLATE = """
+You are a Senior Architect. Refactor this code to reduce complexity and improve readability.
+
+{constraints}
+{memory}
+Original Code:
+{code}
+
+CRITICAL INSTRUCTIONS:
+1. Output ONLY raw Python code. NO markdown blocks.
+2. Use Type Hints.
+3. Do NOT lose functionality.
+"""
 
 def print_step(agent, action):
     print(f"\n{Fore.CYAN}┌── 🤖 {agent.upper()} ──────────────────────────────────┐")
@@ -37,7 +58,8 @@ def main():
     
     # 2. BUILD THE BRAIN (Dependency Graph)
     print(f"{Fore.MAGENTA}🕸️ Constructing AST Dependency Graph (Novelty Layer)...{Style.RESET_ALL}")
-    graph = DependencyGraph(repo_path)
+    with tracer.span("graph_build", target=repo_path):
+        graph = DependencyGraph(repo_path)
     logging.info("Graph Construction Complete.")
     
     # 3. FIND TARGETS (Inquisitor)
@@ -50,27 +72,39 @@ def main():
     scan_limit = 50
     candidates_found = 0
     
-    for i, file_path in enumerate(all_files):
-        if i >= scan_limit: break
-        if candidates_found >= 3: break
+    with tracer.span("complexity_scan", target=repo_path) as scan_span:
+        for i, file_path in enumerate(all_files):
+            if i >= scan_limit: break
+            if candidates_found >= 3: break
         
-        try:
-            # Skip tiny files or inits
-            if os.path.getsize(file_path) < 500 or "__init__" in file_path: continue
+            try:
+                # Skip tiny files or inits
+                if os.path.getsize(file_path) < 500 or "__init__" in file_path: continue
             
-            report = ReaperTools.analyze_complexity(file_path)
-            # FORCE DEMO TARGET: Binary Search is perfect for demos (Clear Logic, Easy Tests)
-            if "binary_search" in file_path:
-                 priority_queue.insert(0, file_path) # Put at TOP of list
-                 print(f"  Found PRIME Target: {os.path.basename(file_path)}")
-                 candidates_found += 1
+                report = ReaperTools.analyze_complexity(file_path)
+                # FORCE DEMO TARGET: Binary Search is perfect for demos (Clear Logic, Easy Tests)
+                if "binary_search" in file_path:
+                     priority_queue.insert(0, file_path) # Put at TOP of list
+                     print(f"  Found PRIME Target: {os.path.basename(file_path)}")
+                     candidates_found += 1
             
-            # Keep the old check as backup
-            elif "permutation" in file_path:
-                 priority_queue.append(file_path)
+                # Keep the old check as backup
+                elif "permutation" in file_path:
+                     priority_queue.append(file_path)
                  
-        except Exception as e:
-            continue
+            except Exception as e:
+                continue
+        scan_span["candidates"] = len(priority_queue)
+
+    # Clone detection: refactor one representative per cluster, clones reuse it via Outcome Memory
+    with tracer.span("clone_detect", target=repo_path):
+        detector = CloneDetector()
+        for file_path in priority_queue:
+            detector.add_file(file_path)
+        primary, deferred = detector.schedule(priority_queue)
+    if deferred:
+        print(f"{Fore.MAGENTA}🧬 {len(deferred)} candidates are clones of other targets; deferring them for fan-out.{Style.RESET_ALL}")
+    priority_queue = primary + deferred
 
     print(f"{Fore.RED}🎯 Targets Acquired: {len(priority_queue)} candidates.{Style.RESET_ALL}")
     
@@ -78,53 +112,106 @@ def main():
         print("No targets found. Try increasing scan_limit.")
         return
 
+    # Crash-safe resume: skip targets a previous run already finished
+    pending = journal.pending(priority_queue)
+    if not pending:
+        print(f"{Fore.GREEN}✔ All targets already completed (see {journal.path}).{Style.RESET_ALL}")
+        return
+
     # 4. EXECUTE SURGERY (Process only the first target for the Demo)
-    target_file = priority_queue[0] 
+    target_file = pending[0] 
+    tracer.set_target(target_file)
+    checkpoint = journal.get(target_file) or {"stage": None, "data": {}}
+    if checkpoint["stage"] in journal.TERMINAL_STAGES:
+        # Retrying a failed target: only the original code carries over (the failed refactor is on disk)
+        checkpoint = {"stage": None, "data": {"code_before": checkpoint["data"].get("code_before")}}
+    saved = checkpoint["data"]
     print(f"\n{Fore.CYAN}--- INITIATING SEMANTIC REFACTOR ON: {target_file} ---{Style.RESET_ALL}")
+    if checkpoint["stage"] is not None:
+        print(f"{Fore.YELLOW}⏯️ Resuming from checkpoint stage '{checkpoint['stage']}'{Style.RESET_ALL}")
 
     # --- NOVELTY 1: DEPENDENCY SHIELD ---
-    constraints = graph.generate_constraints(target_file)
+    with tracer.span("constraint_build", target=target_file):
+        constraints = graph.generate_constraints(target_file)
     print(f"{Fore.MAGENTA}🛡️ ACTIVATING DEPENDENCY SHIELD:\n{constraints}{Style.RESET_ALL}")
     
     surgeon = get_surgeon_agent()
     executioner = get_executioner_agent()
+    # Retries and self-healing share one bounded history per target
+    surgeon.begin(target_file)
+    executioner.begin(target_file)
     
-    code_content = ReaperTools.read_file(target_file)
+    # The refactor is written to disk, so the original must come from the journal on resume
+    code_content = saved.get("code_before") or ReaperTools.read_file(target_file)
+    if checkpoint["stage"] is None:
+        journal.record(target_file, "started", {"code_before": code_content})
+    
+    # Only the learned rules relevant to this target go into the prompt
+    with tracer.span("memory_retrieval", target=target_file):
+        context = memory.get_context_block(code=code_content)
     
     # --- REFACTORING LOOP (With Scope Guardian) ---
+    assembler = PromptAssembler()
     max_retries = 3
     current_try = 0
-    new_code = ""
-    refactor_success = False
+    new_code = saved.get("new_code", "")
+    refactor_success = "new_code" in saved
+    
+    # Outcome Memory: structurally identical code that was already verified skips the Surgeon
+    reuse = None
+    if not refactor_success:
+        with tracer.span("cache_lookup", target=target_file, cache="outcome_memory") as lookup:
+            reuse = memory.find_refactor(code_content)
+            lookup["hit"] = reuse is not None
+    if reuse:
+        # Reused (and fanned-out) code passes the same scope check as fresh Surgeon output
+        with tracer.span("guardian_check", target=target_file, reused=True) as guard_span:
+            is_safe, safety_msg = GlobalScopeGuardian.verify_refactor(code_content, reuse["final_code"], target_file)
+            guard_span["passed"] = is_safe
+        if not is_safe:
+            print(f"{Fore.RED}🛡️ Reused refactor rejected ({safety_msg}); calling the Surgeon instead.{Style.RESET_ALL}")
+            reuse = None
+    if reuse:
+        print(f"{Fore.GREEN}♻️ Reusing verified refactor of {os.path.basename(reuse['target'])} ({reuse['match']} AST match).{Style.RESET_ALL}")
+        new_code = reuse["final_code"]
+        refactor_success = True
 
-    while current_try < max_retries:
+    while not refactor_success and current_try < max_retries:
         print(f"{Fore.YELLOW}Attempt {current_try+1} to generate safe code...{Style.RESET_ALL}")
+        if current_try > 0:
+            tracer.event("retry", target=target_file, attempt=current_try + 1, reason=error_feedback[:200])
         
-        prompt = f"""
-        You are a Senior Architect. Refactor this code to reduce complexity and improve readability.
-        
-        {constraints}
-        
-        Original Code:
-        {code_content}
-        
-        CRITICAL INSTRUCTIONS:
-        1. Output ONLY raw Python code. NO markdown blocks.
-        2. Use Type Hints.
-        3. Do NOT lose functionality.
-        """
+        with tracer.span("prompt_build", target=target_file, attempt=current_try + 1) as prompt_span:
+            prompt, budget = assembler.build(REFACTOR_TEMPLATE, {
+                "code": code_content, "constraints": constraints, "memory": context,
+            })
+            prompt_span["tokens"] = budget["tokens"]
+            if current_try == 0:
+                for line in PromptAssembler.describe(budget):
+                    print(f"{Fore.YELLOW}✂️ Prompt budget: {line}{Style.RESET_ALL}")
         
-        # If this is a retry, inject the error message into context
-        if current_try > 0:
-            prompt += f"\n\nPREVIOUS ATTEMPT REJECTED. FIX THIS ERROR: {error_feedback}"
+            # If this is a retry, inject the error message into context
+            if current_try > 0:
+                prompt += f"\n\nPREVIOUS ATTEMPT REJECTED. FIX THIS ERROR: {error_feedback}"
+        if budget["over_budget"]:
+            print(f"{Fore.RED}🛑 Target too large for one prompt ({budget['max_tokens']} tokens). Skipping.{Style.RESET_ALL}")
+            journal.record(target_file, "failed", {"reason": "prompt over budget"})
+            return
 
-        response = surgeon.send_message(prompt)
-        new_code = response.replace("```python", "").replace("```", "").strip()
+        new_code, problem, _ = request_code(surgeon, prompt)
         
         # --- VALIDATION LAYER ---
+
+        # Check 0: the answer has to contain Python at all (prose/refusals are retried right away)
+        if problem:
+            print(f"{Fore.RED}❌ Unusable response: {problem}{Style.RESET_ALL}")
+            error_feedback = problem
+            current_try += 1
+            continue
         
         # Check 1: Syntax
-        valid_syntax, msg = ReaperTools.validate_syntax(new_code)
+        with tracer.span("syntax_check", target=target_file, attempt=current_try + 1):
+            valid_syntax, msg = ReaperTools.validate_syntax(new_code)
         if not valid_syntax:
             print(f"{Fore.RED}❌ Syntax Error: {msg}{Style.RESET_ALL}")
             error_feedback = f"Syntax Error: {msg}"
@@ -132,7 +219,9 @@ def main():
             continue
 
         # Check 2: NOVELTY - SCOPE GUARDIAN (Edge Case II Protection)
-        is_safe, safety_msg = GlobalScopeGuardian.verify_refactor(code_content, new_code)
+        with tracer.span("guardian_check", target=target_file, attempt=current_try + 1) as guard_span:
+            is_safe, safety_msg = GlobalScopeGuardian.verify_refactor(code_content, new_code, target_file)
+            guard_span["passed"] = is_safe
         if not is_safe:
             print(f"{Fore.RED}🛡️ SCOPE GUARDIAN TRIGGERED: {safety_msg}{Style.RESET_ALL}")
             error_feedback = f"CRITICAL SAFETY VIOLATION: {safety_msg}. You must pass these variables as arguments."
@@ -145,11 +234,24 @@ def main():
 
     if not refactor_success:
         print(f"{Fore.RED}🛑 FATAL: Could not generate safe code after {max_retries} attempts.{Style.RESET_ALL}")
+        journal.record(target_file, "failed", {"reason": "unsafe refactor"})
         return
 
     # Commit to disk
     ReaperTools.write_file(target_file, new_code)
+    journal.record(target_file, "refactored", {"new_code": new_code})
     print(f"{Fore.GREEN}✔ Code passed Safety Protocols. Applied to disk.{Style.RESET_ALL}")
+
+    # Formatting / docstring / type-hint-only refactors are provably equivalent: no tests to write or run
+    with tracer.span("equivalence_precheck", target=target_file) as pre_span:
+        pre = precheck(code_content, new_code)
+        pre_span.update(verdict=pre["verdict"], level=pre["level"])
+    if pre["verdict"] == "equivalent":
+        print(f"{Fore.GREEN}⚡ Equivalence pre-check passed ({pre['level']}): {pre['reason']} Executioner skipped.{Style.RESET_ALL}")
+        logging.info(f"SUCCESS (equivalent): {target_file}")
+        journal.record(target_file, "complete", {"new_code": new_code})
+        memory.record_refactor(target_file, code_content, new_code, None, pre["reason"])
+        return
     
     # --- STAGE 5: REGRESSION TESTING (Executioner) ---
     print_step("Executioner", "Generating Regression Tests...")
@@ -163,7 +265,8 @@ def main():
     {new_code}
     """
     
-    test_code = executioner.send_message(test_prompt).replace("```python", "").replace("```", "").strip()
+    with tracer.span("test_generation", target=target_file):
+        test_code, _, _ = request_code(executioner, test_prompt)
     
     # Save test file next to target
     test_file_path = target_file.replace(".py", "_reaper_test.py")
@@ -172,7 +275,8 @@ def main():
     
     # Run Tests
     print_step("Executioner", "Running Validation...")
-    results = ReaperTools.run_tests(test_file_path)
+    with tracer.span("test_run", target=target_file):
+        results = ReaperTools.run_tests(test_file_path)
     
     if "passed" in results:
         print(f"{Fore.GREEN}🎉 SUCCESS: Refactor verified clean.{Style.RESET_ALL}")
@@ -194,7 +298,8 @@ def main():
     {new_code}
     """
     
-    test_code = executioner.send_message(test_prompt).replace("```python", "").replace("```", "").strip()
+    with tracer.span("test_generation", target=target_file):
+        test_code, _, _ = request_code(executioner, test_prompt)
     test_file_path = target_file.replace(".py", "_reaper_test.py")
     ReaperTools.write_file(test_file_path, test_code)
     print(f"{Fore.GREEN}✔ Tests saved to {os.path.basename(test_file_path)}{Style.RESET_ALL}")
@@ -205,7 +310,9 @@ def main():
     
     while test_attempts < max_test_retries:
         print_step("Executioner", f"Running Validation (Attempt {test_attempts+1})...")
-        results = ReaperTools.run_tests(test_file_path)
+        with tracer.span("test_run", target=target_file, attempt=test_attempts + 1) as run_span:
+            results = ReaperTools.run_tests(test_file_path)
+            run_span["passed"] = "passed" in results and "failed" not in results
         
         if "passed" in results and "failed" not in results:
             print(f"{Fore.GREEN}🎉 SUCCESS: Refactor verified clean.{Style.RESET_ALL}")
@@ -213,11 +320,12 @@ def main():
             break
         else:
             print(f"{Fore.RED}❌ Tests Failed. Triggering Self-Healing...{Style.RESET_ALL}")
+            tracer.event("retry", target=target_file, attempt=test_attempts + 2, reason="tests failed")
             # Feed error back to Surgeon
             error_feedback = f"Tests failed:\n{results}\nFix the code to pass these tests."
             
             prompt = f"Fix this code based on test failure:\n{error_feedback}\n\nCode:\n{new_code}\n\nReturn ONLY raw python."
-            new_code = surgeon.send_message(prompt).replace("```python", "").replace("```", "").strip()
+            new_code, _, _ = request_code(surgeon, prompt)
             
             # Validate Syntax/Scope again before saving
             is_valid, _ = ReaperTools.validate_syntax(new_code)
@@ -229,6 +337,10 @@ def main():
 
     if test_attempts >= max_test_retries:
         print(f"{Fore.RED}🛑 Manual Review Required.{Style.RESET_ALL}")
+        journal.record(target_file, "failed", {"reason": "tests failed", "new_code": new_code})
+    else:
+        journal.record(target_file, "complete", {"new_code": new_code})
+        memory.record_refactor(target_file, code_content, new_code, test_file_path, results)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,10 +5,11 @@ from colorama import Fore, Style, init
 from tools import ReaperTools
 from repo_tools import RepoManager, DependencyGraph
 from agents import get_inquisitor_agent, get_surgeon_agent, get_executioner_agent
+from extraction import request_code
 from memory import MemoryBank
 
 init(autoreset=True)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', filename='codereaper_research.csv')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', filename='codereaper_research.log')
 
 memory = MemoryBank()
 
@@ -93,7 +94,7 @@ def main():
     """
     
     print_step("Surgeon", "Generating optimized code...")
-    new_code = surgeon.send_message(prompt).replace("```python", "").replace("```", "").strip()
+    new_code, _, _ = request_code(surgeon, prompt)
     
     # Validate Syntax before saving
     valid, msg = ReaperTools.validate_syntax(new_code)
@@ -114,7 +115,7 @@ def main():
     Code:
     {new_code}
     """
-    test_code = executioner.send_message(test_prompt).replace("```python", "").replace("```", "").strip()
+    test_code, _, _ = request_code(executioner, test_prompt)
     
     # Save test file next to target
     test_file_path = target_file.replace(".py", "_reaper_test.py")
@@ -1,42 +1,382 @@
+import ast
+import atexit
 import json
 import os
+import sqlite3
+import threading
 import time
 
+from retrieval import BM25Index, estimate_tokens
+from tools import ReaperTools
+from clones import fan_out
+
+try:
+    import fcntl  # POSIX only: serialises journal appends across processes
+except ImportError:
+    fcntl = None
+
 class MemoryBank:
-    def __init__(self, db_path="codereaper_memory.json"):
+    """
+    Persistent store for learned preferences and session history.
+    Backed by SQLite in WAL mode so several pipeline workers and the Streamlit app
+    can share one database: writes are single transactions (atomic), dedupe is a
+    PRIMARY KEY plus an in-process set, and new rules are flushed in batches.
+    Prompts only receive the top_k entries most relevant to the current target,
+    capped at token_budget (see get_context_block).
+    """
+    def __init__(self, db_path="codereaper_memory.db", flush_every=20, legacy_path="codereaper_memory.json",
+                 top_k=8, token_budget=400):
         self.db_path = db_path
-        self.memory = self._load_memory()
+        self.flush_every = flush_every
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self._index = BM25Index()
+        self._last_rule_rowid = 0
+        self._last_history_id = 0
+        self._lock = threading.Lock()
+        self._pending = []
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS preferences (rule TEXT PRIMARY KEY, created REAL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_history "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp REAL, payload TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS refactor_outcomes "
+                "(exact_hash TEXT, fingerprint TEXT, target TEXT, original_code TEXT, final_code TEXT, "
+                "test_file TEXT, test_results TEXT, timestamp REAL, alpha_hash TEXT)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(refactor_outcomes)")}
+            if "alpha_hash" not in columns:
+                self._conn.execute("ALTER TABLE refactor_outcomes ADD COLUMN alpha_hash TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outcome_exact ON refactor_outcomes (exact_hash)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outcome_fp ON refactor_outcomes (fingerprint)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outcome_alpha ON refactor_outcomes (alpha_hash)")
+            # Per-function outcomes: a module whose functions were each refactored elsewhere reuses them
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS function_outcomes "
+                "(fingerprint TEXT, name TEXT, target TEXT, original_code TEXT, final_code TEXT, timestamp REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_function_fp ON function_outcomes (fingerprint)")
+        self._known = set(self._load_preferences())
+        self._import_legacy(legacy_path)
+        self.journal = CheckpointJournal()
+        atexit.register(self.flush)
+
+    def _load_preferences(self):
+        rows = self._conn.execute("SELECT rule FROM preferences ORDER BY rowid").fetchall()
+        return [r[0] for r in rows]
+
+    def _import_legacy(self, legacy_path):
+        """One-off migration of rules from the old JSON store."""
+        if not legacy_path or not os.path.exists(legacy_path):
+            return
+        try:
+            with open(legacy_path, 'r') as f:
+                legacy = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        for rule in legacy.get("preferences", []):
+            self.add_preference(rule)
+        self.flush()
 
-    def _load_memory(self):
-        if os.path.exists(self.db_path):
-            with open(self.db_path, 'r') as f:
-                return json.load(f)
-        return {"preferences": [], "session_history": []}
+    @property
+    def memory(self):
+        """Read-only snapshot in the legacy {'preferences', 'session_history'} shape."""
+        self.flush()
+        with self._lock:
+            history = self._conn.execute("SELECT payload FROM session_history ORDER BY id").fetchall()
+            return {"preferences": self._load_preferences(), "session_history": [json.loads(h[0]) for h in history]}
+
+    def flush(self):
+        """Writes all buffered rules in one transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO preferences (rule, created) VALUES (?, ?)", batch)
 
     def save_memory(self):
-        with open(self.db_path, 'w') as f:
-            json.dump(self.memory, indent=2)
+        self.flush()
 
     def add_preference(self, rule):
         """Learns a new coding preference (e.g., 'Use Snake Case')."""
-        if rule not in self.memory["preferences"]:
-            self.memory["preferences"].append(rule)
-            self.save_memory()
+        with self._lock:
+            if rule in self._known:
+                return
+            self._known.add(rule)
+            self._pending.append((rule, time.time()))
+            should_flush = len(self._pending) >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def _sync_index(self):
+        """Appends rules and session outcomes written since the last sync (by any worker) to the index."""
+        with self._lock:
+            rules = self._conn.execute(
+                "SELECT rowid, rule FROM preferences WHERE rowid > ? ORDER BY rowid", (self._last_rule_rowid,)
+            ).fetchall()
+            history = self._conn.execute(
+                "SELECT id, payload FROM session_history WHERE id > ? ORDER BY id", (self._last_history_id,)
+            ).fetchall()
+        for rowid, rule in rules:
+            self._known.add(rule)
+            self._index.add(rule, {"kind": "rule", "text": rule, "order": rowid})
+            self._last_rule_rowid = rowid
+        for row_id, payload in history:
+            summary = json.loads(payload).get("summary")
+            if summary:
+                self._index.add(summary, {"kind": "outcome", "text": summary, "order": row_id})
+            self._last_history_id = row_id
+
+    def get_context_block(self, code=None, top_k=None, token_budget=None):
+        """
+        Returns a string of learned rules to inject into the Agent's prompt.
+        With `code`, entries are BM25-ranked against the target's identifiers and only
+        matching ones are kept; without it the most recent entries are used.
+        """
+        top_k = top_k or self.top_k
+        token_budget = token_budget or self.token_budget
+        self.flush()
+        self._sync_index()
+        if code:
+            entries = [payload for score, payload in self._index.search(code, top_k)]
+        else:
+            entries = sorted(self._index.docs, key=lambda d: (d["kind"] == "rule", d["order"]))[-top_k:][::-1]
+
+        rules, outcomes, used = [], [], 0
+        for entry in entries:
+            cost = estimate_tokens(entry["text"])
+            if used + cost > token_budget:
+                continue
+            used += cost
+            (rules if entry["kind"] == "rule" else outcomes).append(entry["text"])
 
-    def get_context_block(self):
-        """Returns a string of learned rules to inject into the Agent's prompt."""
-        if not self.memory["preferences"]:
-            return ""
-        rules = "\n- ".join(self.memory["preferences"])
-        return f"\nCRITICAL MEMORY (Follow these learned rules):\n- {rules}\n"
+        block = ""
+        if rules:
+            block += "\nCRITICAL MEMORY (Follow these learned rules):\n- " + "\n- ".join(rules) + "\n"
+        if outcomes:
+            block += "\nRELEVANT PAST REFACTORS:\n- " + "\n- ".join(outcomes) + "\n"
+        return block
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    # --- Refactor Outcome Memory (Reuse validated fixes) ---
+    def record_refactor(self, target, original_code, final_code, test_file, test_results):
+        """Stores a verified refactor so structurally identical code can reuse it without an LLM call."""
+        exact_hash = ReaperTools.ast_fingerprint(original_code, rename_locals=False)
+        if exact_hash is None:
+            return
+        fingerprint = ReaperTools.ast_fingerprint(original_code)
+        alpha_hash, _ = ReaperTools.alpha_fingerprint(original_code)
+        functions = sorted(ReaperTools.function_fingerprints(original_code))
+        summary = f"{os.path.basename(target)}: refactored {', '.join(functions) or 'module'} and tests passed."
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO refactor_outcomes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (exact_hash, fingerprint, target, original_code, final_code, test_file, test_results, now, alpha_hash),
+            )
+            self._conn.executemany(
+                "INSERT INTO function_outcomes VALUES (?, ?, ?, ?, ?, ?)",
+                [(fp, name, target, before, after, now)
+                 for name, (fp, before, after) in _function_outcomes(original_code, final_code).items()],
+            )
+            payload = {"target": target, "fingerprint": fingerprint, "functions": functions,
+                       "test_file": test_file, "summary": summary}
+            self._conn.execute(
+                "INSERT INTO session_history (timestamp, payload) VALUES (?, ?)", (now, json.dumps(payload))
+            )
+
+    def find_refactor(self, original_code):
+        """
+        Looks up a previously verified refactor of the same code.
+        Tries the exact normalised AST first, then the locals-renamed fingerprint, then a
+        fully alpha-renamed clone (whose stored result is renamed to this code's identifiers).
+        Returns {'target', 'final_code', 'test_file', 'test_results', 'match'} or None.
+        """
+        lookups = (("exact", "exact_hash", ReaperTools.ast_fingerprint(original_code, rename_locals=False)),
+                   ("structural", "fingerprint", ReaperTools.ast_fingerprint(original_code)))
+        for match, column, value in lookups:
+            if value is None:
+                return None
+            with self._lock:
+                row = self._conn.execute(
+                    f"SELECT target, final_code, test_file, test_results FROM refactor_outcomes "
+                    f"WHERE {column} = ? ORDER BY timestamp DESC LIMIT 1", (value,)
+                ).fetchone()
+            if row:
+                return {"target": row[0], "final_code": row[1], "test_file": row[2],
+                        "test_results": row[3], "match": match}
+
+        alpha_hash, _ = ReaperTools.alpha_fingerprint(original_code)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT target, final_code, test_file, test_results, original_code FROM refactor_outcomes "
+                "WHERE alpha_hash = ? ORDER BY timestamp DESC LIMIT 1", (alpha_hash,)
+            ).fetchone()
+        if row:
+            adapted = fan_out(row[4], row[1], original_code)
+            if adapted is not None:
+                return {"target": row[0], "final_code": adapted, "test_file": row[2],
+                        "test_results": row[3], "match": "alpha-clone"}
+        return self._find_per_function(original_code)
+
+    def _find_per_function(self, original_code):
+        """
+        Rebuilds the module from per-function outcomes when EVERY top-level function has a
+        verified refactor on record (possibly from different files). Module-level code is kept.
+        """
+        functions = _top_level_functions(original_code)
+        if not functions:
+            return None
+        replacements, sources = [], set()
+        for name, (start, end, source) in functions.items():
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT target, final_code FROM function_outcomes WHERE fingerprint = ? "
+                    "ORDER BY timestamp DESC LIMIT 1", (ReaperTools.ast_fingerprint(source),)
+                ).fetchone()
+            if row is None:
+                return None
+            sources.add(row[0])
+            replacements.append((start, end, row[1]))
+        lines = original_code.splitlines(keepends=True)
+        for start, end, final in sorted(replacements, reverse=True):
+            lines[start:end] = [final.rstrip("\n") + "\n"]
+        return {"target": ", ".join(sorted(os.path.basename(t) for t in sources)), "final_code": "".join(lines), "test_file": None,
+                "test_results": None, "match": "per-function"}
 
     # --- Session Management (Pause/Resume) ---
     def save_checkpoint(self, stage, data):
-        with open("checkpoint.json", "w") as f:
-            json.dump({"timestamp": time.time(), "stage": stage, "data": data}, f)
-    
+        target = data.get("file", "session") if isinstance(data, dict) else "session"
+        self.journal.record(target, stage, data)
+
     def load_checkpoint(self):
-        if os.path.exists("checkpoint.json"):
-            with open("checkpoint.json", "r") as f:
-                return json.load(f)
-        return None
\ No newline at end of file
+        """Returns the most recent checkpoint event, or None on a fresh run."""
+        return self.journal.last_event
+
+
+def _top_level_functions(code):
+    """{name: (first line index, end line index, source)} of the module's top-level functions."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return {}
+    lines = code.splitlines(keepends=True)
+    functions = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1
+            functions[node.name] = (start, node.end_lineno, "".join(lines[start:node.end_lineno]))
+    return functions
+
+
+def _function_outcomes(original_code, final_code):
+    """
+    {name: (fingerprint, original source, final source)} for functions that can be reused on
+    their own: only when the refactor left everything but function bodies alone (no new
+    imports, helpers or module state the function could depend on).
+    """
+    def rest(code):
+        tree = ast.parse(code)
+        return [ast.dump(n) for n in tree.body if not isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+
+    before, after = _top_level_functions(original_code), _top_level_functions(final_code)
+    if not before or set(before) != set(after) or rest(original_code) != rest(final_code):
+        return {}
+    return {name: (ReaperTools.ast_fingerprint(source), source, after[name][2])
+            for name, (_, _, source) in before.items()}
+
+
+class CheckpointJournal:
+    """
+    Append-only JSONL journal of per-target stage transitions.
+    Every event is appended with O_APPEND under an exclusive flock (POSIX) and fsync'd, so
+    processes sharing the journal (jobs.py workers, `cli.py refactor --workers`) never
+    interleave inside a line, and a killed process loses at most the line it was writing. Replaying the journal rebuilds the latest stage (and
+    the accumulated stage data) for every target of the batch.
+    """
+    TERMINAL_STAGES = ("complete", "failed")
+
+    def __init__(self, path="checkpoint_journal.jsonl"):
+        self.path = path
+        self.targets = {}
+        self.last_event = None
+        self._needs_newline = False
+        self._replay()
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        # A crash mid-write leaves a torn last line; it is skipped here and
+        # terminated before the next append so it can't corrupt the next event.
+        self._needs_newline = bool(content) and not content.endswith("\n")
+        for line in content.splitlines():
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self._apply(event)
+
+    def _apply(self, event):
+        state = self.targets.setdefault(event["target"], {"stage": None, "data": {}})
+        state["stage"] = event["stage"]
+        state["timestamp"] = event["timestamp"]
+        if event["stage"] == "started":
+            # A fresh start must not inherit the previous run's Surgeon output or test file
+            state["data"] = {}
+        state["data"].update(event.get("data") or {})
+        self.last_event = event
+
+    def record(self, target, stage, data=None):
+        """Appends one stage transition for `target` and syncs it to disk."""
+        event = {"timestamp": time.time(), "target": target, "stage": stage, "data": data or {}}
+        line = json.dumps(event) + "\n"
+        if self._needs_newline:
+            line = "\n" + line
+            self._needs_newline = False
+        payload = line.encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                # A signal can cut a large write short; the lock keeps the rest of the line contiguous
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            # One write per event: O_APPEND places it after every other writer's complete line
+            written = os.write(fd, payload)
+            while written < len(payload):
+                written += os.write(fd, payload[written:])
+            os.fsync(fd)
+        finally:
+            os.close(fd)  # also releases the lock
+        self._apply(event)
+
+    def get(self, target):
+        """Returns {'stage', 'data', 'timestamp'} for a target, or None if never started."""
+        return self.targets.get(target)
+
+    def is_complete(self, target):
+        """True once the target finished successfully; failed targets are retried on the next run."""
+        state = self.get(target)
+        # Older journals marked a run whose tests failed as 'complete' with tests_passed False
+        return state is not None and state["stage"] == "complete" and state["data"].get("tests_passed", True)
+
+    def pending(self, targets):
+        """Filters a batch down to the targets a restarted run still has to process."""
+        return [t for t in targets if not self.is_complete(t)]
+
+    def clear(self):
+        """Starts a fresh batch by discarding the journal."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.targets = {}
+        self.last_event = None
+        self._needs_newline = False
\ No newline at end of file
@@ -0,0 +1,495 @@
+"""
+Parser backends for the static analyses (dependency graph, Scope Guardian, complexity).
+
+Every backend turns a file into the same summary:
+
+    {"path", "error", "imports": [module, ...], "functions": [{"name", "lineno", "complexity"}],
+     "loads": {names read}, "stores": {names assigned or bound as arguments},
+     "defined": {function/class names}, "args": {argument names}}
+
+AstBackend uses Python's `ast` (and radon for complexity, as before). TreeSitterBackend uses
+tree-sitter (optional: `pip install tree-sitter tree-sitter-python`) and keeps the last tree
+of every path, so re-parsing a file after the Surgeon's edit only re-parses the changed
+region. Cython `.pyx`/`.pxd` files go through a line-preserving shim that rewrites
+cdef/cpdef/cimport syntax into plain Python first; `.pyi` stubs are Python already.
+
+    CODEREAPER_PARSER=ast|tree-sitter|auto    (default: ast; auto = tree-sitter if installed)
+"""
+import ast
+import builtins
+import os
+import re
+import threading
+
+SOURCE_EXTENSIONS = (".py", ".pyx", ".pxd", ".pyi")
+CYTHON_EXTENSIONS = (".pyx", ".pxd")
+_BUILTIN_NAMES = frozenset(dir(builtins))
+
+
+def is_source_file(path):
+    return path.endswith(SOURCE_EXTENSIONS)
+
+
+def module_name(path):
+    """'pkg/lib.pyx' -> 'lib' (the name an import statement would use)."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def module_names(path, root):
+    """
+    Every dotted name an absolute import can reach `path` by, one per directory between it
+    and `root` that could be on sys.path: 'root/src/pkg/lib.py' -> ['lib', 'pkg.lib',
+    'src.pkg.lib']; a package's '__init__' file takes its directory's names.
+    """
+    relative = os.path.relpath(os.path.splitext(os.path.abspath(path))[0], os.path.abspath(root))
+    parts = relative.split(os.sep)
+    if parts[-1] == "__init__":
+        parts.pop()
+    return [".".join(parts[i:]) for i in range(len(parts) - 1, -1, -1)]
+
+
+# --- Cython shim -------------------------------------------------------------
+_C_TYPE = r"(?:(?:unsigned|signed|long|short|const|struct|readonly|public|inline|api)\s+)*[A-Za-z_][\w.]*(?:\[[^\]]*\])?\s*\**"
+_CDEF_FUNC = re.compile(r"^(\s*)(?:cp?def\s+(?:" + _C_TYPE + r"\s+)?|def\s+)\**\s*(\w+)\s*\((.*)\)\s*([^:]*):(.*)$")
+_CDEF_CLASS = re.compile(r"^(\s*)cdef\s+(?:(?:public|api|readonly)\s+)*class\s+(.*)$")
+_CDEF_BLOCK = re.compile(r"^(\s*)(?:cdef\s+(?:extern|struct|union|enum|cppclass|packed)\b|ctypedef\b|cdef\s*:)")
+_CDEF_VAR = re.compile(r"^(\s*)cdef\s+(?:" + _C_TYPE + r"\s+)+?(\**\s*\w+\s*(?:[=,\[].*)?)$")
+_TYPED_ARG = re.compile(r"^\s*(?:" + _C_TYPE + r"\s+)+\**\s*(\w+)(\s*=.*)?\s*$")
+_CAST = re.compile(r"<\s*[A-Za-z_][\w.]*\s*\**\s*\??>\s*(?=[\w(\[])")
+_INCLUDE = re.compile(r"^(\s*)include\s+['\"]")
+_DEF_CONST = re.compile(r"^(\s*)DEF\s+")
+
+
+def _pad(line, original):
+    return line + " " * max(len(original) - len(line), 0)
+
+
+def _split_top(text):
+    """Splits on commas outside brackets: 'a, f(1, 2)' -> ['a', ' f(1, 2)']."""
+    parts, depth, current = [], 0, ""
+    for ch in text:
+        if ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    parts.append(current)
+    return parts
+
+
+def _strip_arg_types(args):
+    cleaned = []
+    for part in _split_top(args):
+        # `int n=0` -> `n=0`; untyped arguments (`self`, `x=1`, `*args`) stay as they are
+        match = _TYPED_ARG.match(part)
+        cleaned.append(match.group(1) + (match.group(2) or "") if match else part.strip())
+    return ", ".join(p for p in cleaned if p)
+
+
+def cython_to_python(source):
+    """
+    Rewrites Cython-only syntax into Python so the Python parsers can read .pyx/.pxd files.
+    Line numbers are preserved (every input line maps to exactly one output line); a C-level
+    block (extern, struct, ctypedef, ...) becomes a single `pass` followed by blank lines.
+    """
+    out = []
+    block_indent = None
+    for line in source.splitlines():
+        stripped = line.strip()
+        indent = len(line) - len(line.lstrip())
+        if block_indent is not None:
+            if stripped and indent <= block_indent:
+                block_indent = None
+            else:
+                out.append("")
+                continue
+        match = _CDEF_BLOCK.match(line)
+        if match:
+            block_indent = len(match.group(1)) if stripped.endswith(":") else None
+            out.append(match.group(1) + "pass")
+            continue
+        match = _CDEF_FUNC.match(line)
+        if match:
+            lead, name, args, _, rest = match.groups()
+            out.append(_pad(f"{lead}def {name}({_strip_arg_types(args)}):{rest}", line))
+            continue
+        match = _CDEF_CLASS.match(line)
+        if match:
+            out.append(_pad(f"{match.group(1)}class {match.group(2)}", line))
+            continue
+        match = _CDEF_VAR.match(line)
+        if match:
+            lead, decl = match.groups()
+            # `cdef int i = 0, j` -> `i = 0`; bare declarations become `pass`
+            assigned = [d.strip().lstrip("*").strip() for d in _split_top(decl) if "=" in d]
+            out.append(_pad(lead + ("; ".join(assigned) if assigned else "pass"), line))
+            continue
+        if _INCLUDE.match(line):
+            out.append(_pad(_INCLUDE.match(line).group(1) + "pass", line))
+            continue
+        line = _DEF_CONST.sub(lambda m: m.group(1), line)
+        line = re.sub(r"\bcimport\b", "import", line)
+        out.append(_CAST.sub("", line))
+    return "\n".join(out) + ("\n" if source.endswith("\n") else "")
+
+
+def python_source(path, source):
+    """The Python text the backends parse for `path` (Cython files go through the shim)."""
+    return cython_to_python(source) if path and path.endswith(CYTHON_EXTENSIONS) else source
+
+
+# --- Backends ------------------------------------------------------------------
+class ParserBackend:
+    """
+    Interface: parse(path, source, complexity=False) -> summary (see module docstring).
+    `path` keys per-file state and picks the dialect; `complexity` fills summary["functions"].
+    """
+    name = "base"
+
+    def parse(self, path, source, complexity=False):
+        raise NotImplementedError
+
+    def forget(self, path):
+        """Drops any per-path state (e.g. a cached tree)."""
+
+
+class AstBackend(ParserBackend):
+    name = "ast"
+
+    def parse(self, path, source, complexity=False):
+        summary = {"path": path, "error": None, "imports": [], "functions": [],
+                   "loads": set(), "stores": set(), "defined": set(), "args": set()}
+        try:
+            tree = ast.parse(python_source(path, source))
+        except (SyntaxError, ValueError) as e:
+            summary["error"] = str(e)
+            return summary
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name):
+                if isinstance(node.ctx, ast.Load):
+                    summary["loads"].add(node.id)
+                elif isinstance(node.ctx, ast.Store):
+                    summary["stores"].add(node.id)
+            elif isinstance(node, ast.arg):
+                summary["stores"].add(node.arg)
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                summary["stores"].add(node.name)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                summary["defined"].add(node.name)
+            elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+                summary["stores"].add(node.name)
+            elif isinstance(node, ast.Import):
+                summary["imports"].extend(n.name for n in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                # Relative imports keep their dots ('..lib'); 'from . import lib' names the module itself
+                prefix = "." * node.level
+                if node.module:
+                    summary["imports"].append(prefix + node.module)
+                elif prefix:
+                    summary["imports"].extend(prefix + n.name for n in node.names)
+            if isinstance(node, ast.FunctionDef):
+                summary["args"].update(arg.arg for arg in node.args.args)
+        if complexity:
+            summary["functions"] = self._functions(path, source)
+        return summary
+
+    @staticmethod
+    def _functions(path, source):
+        try:
+            from radon.visitors import ComplexityVisitor
+        except ImportError:
+            return []
+        try:
+            visitor = ComplexityVisitor.from_code(python_source(path, source))
+        except Exception:
+            return []
+        return [{"name": f.name, "lineno": f.lineno, "complexity": f.complexity} for f in visitor.functions]
+
+
+# Node types that add a decision point (radon-style McCabe count)
+_DECISIONS = {"if_statement", "elif_clause", "for_statement", "while_statement", "except_clause",
+              "conditional_expression", "for_in_clause", "if_clause", "assert_statement",
+              "boolean_operator"}
+_BINDING_PARENTS = {"assignment": "left", "augmented_assignment": "left", "for_statement": "left",
+                    "for_in_clause": "left", "named_expression": "name", "as_pattern": "alias"}
+_PATTERNS = {"pattern_list", "tuple_pattern", "list_pattern", "list_splat_pattern", "tuple", "list",
+             "parenthesized_expression", "as_pattern_target", "expression_list"}
+_PARAMETER_TYPES = {"typed_parameter", "default_parameter", "typed_default_parameter",
+                    "list_splat_pattern", "dictionary_splat_pattern"}
+
+
+def _common_prefix(a, b):
+    """Length of the common prefix of two byte strings (binary search over C-level slice compares)."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class TreeSitterBackend(ParserBackend):
+    """
+    Incremental tree-sitter parsing. The previous tree of each path is kept; a new source
+    for the same path is diffed against the old one (common prefix/suffix) and parsed with
+    the edited old tree, so only the changed region is re-parsed.
+    """
+    name = "tree-sitter"
+
+    def __init__(self):
+        import tree_sitter
+        import tree_sitter_python
+
+        language = tree_sitter.Language(tree_sitter_python.language())
+        try:
+            self._parser = tree_sitter.Parser(language)
+        except TypeError:  # py-tree-sitter < 0.22
+            self._parser = tree_sitter.Parser()
+            self._parser.set_language(language)
+        self._trees = {}  # path -> (source bytes, tree)
+        self._lock = threading.Lock()
+        self.parses = 0
+        self.incremental_parses = 0
+
+    @staticmethod
+    def _point(data, offset):
+        row = data.count(b"\n", 0, offset)
+        return (row, offset - (data.rfind(b"\n", 0, offset) + 1))
+
+    def _parse_bytes(self, path, data):
+        with self._lock:
+            self.parses += 1
+            previous = self._trees.get(path) if path else None
+            if previous is None or previous[0] == data:
+                tree = previous[1] if previous else self._parser.parse(data)
+            else:
+                old, old_tree = previous
+                start = _common_prefix(old, data)
+                tail = _common_prefix(old[start:][::-1], data[start:][::-1])
+                old_end, new_end = len(old) - tail, len(data) - tail
+                old_tree.edit(start_byte=start, old_end_byte=old_end, new_end_byte=new_end,
+                              start_point=self._point(old, start), old_end_point=self._point(old, old_end),
+                              new_end_point=self._point(data, new_end))
+                tree = self._parser.parse(data, old_tree)
+                self.incremental_parses += 1
+            if path:
+                self._trees[path] = (data, tree)
+        return tree
+
+    def forget(self, path):
+        with self._lock:
+            self._trees.pop(path, None)
+
+    def parse(self, path, source, complexity=False):
+        tree = self._parse_bytes(path, python_source(path, source).encode("utf-8"))
+        root = tree.root_node
+        summary = {"path": path, "error": "syntax error" if root.has_error else None, "imports": [],
+                   "functions": [], "loads": set(), "stores": set(), "defined": set(), "args": set()}
+        self._walk(root, summary)
+        if complexity:
+            summary["functions"] = [{"name": self._text(node.child_by_field_name("name")),
+                                     "lineno": node.start_point[0] + 1,
+                                     "complexity": 1 + self._decisions(node.child_by_field_name("body"))}
+                                    for node in self._module_functions(root)]
+        return summary
+
+    @staticmethod
+    def _module_functions(root):
+        """Functions outside any class or function, in source order (radon's `functions`)."""
+        found, stack = [], [root]
+        while stack:
+            node = stack.pop()
+            if node.type == "function_definition":
+                found.append(node)
+            elif node.type != "class_definition":
+                stack.extend(reversed(node.children))
+        return found
+
+    @staticmethod
+    def _text(node):
+        return node.text.decode("utf-8") if node is not None else ""
+
+    def _decisions(self, node):
+        if node is None:
+            return 0
+        count = 0
+        stack = list(node.children)
+        while stack:
+            current = stack.pop()
+            if current.type in ("function_definition", "class_definition"):
+                continue  # nested functions/classes don't add to the enclosing function (lambdas do)
+            if current.type == "if_clause" and current.parent is not None and current.parent.type == "case_clause":
+                pass  # radon doesn't count case guards
+            elif current.type in _DECISIONS:
+                count += 1
+                if current.type == "assert_statement":
+                    continue  # radon doesn't look inside asserts
+            elif current.type == "case_clause":
+                # radon: every case but an irrefutable one (`case _:` or a bare capture without a guard)
+                pattern = next((c for c in current.named_children if c.type == "case_pattern"), None)
+                irrefutable = pattern is not None and (self._text(pattern) == "_" or (
+                    pattern.named_child_count == 1 and pattern.named_children[0].type == "dotted_name"
+                    and re.fullmatch(r"\w+", self._text(pattern)))) \
+                    and not any(c.type == "if_clause" for c in current.children)
+                count += not irrefutable
+            elif current.type == "else_clause" and current.parent is not None \
+                    and current.parent.type in ("for_statement", "while_statement", "try_statement"):
+                count += 1
+            stack.extend(current.children)
+        return count
+
+    def _bind(self, node, summary):
+        """Marks the identifiers a binding target introduces; attribute/subscript targets are reads."""
+        if node is None:
+            return
+        if node.type == "identifier":
+            summary["stores"].add(self._text(node))
+        elif node.type in _PATTERNS:
+            for child in node.named_children:
+                self._bind(child, summary)
+        else:
+            self._walk(node, summary)
+
+    def _walk(self, root, summary):
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            kind = node.type
+            if kind == "identifier":
+                summary["loads"].add(self._text(node))
+                continue
+            if kind == "future_import_statement":
+                summary["imports"].append("__future__")
+                continue
+            if kind in ("import_statement", "import_from_statement"):
+                if kind == "import_from_statement":
+                    module = node.child_by_field_name("module_name")
+                    if module is not None and module.type == "relative_import" and \
+                            not any(c.type == "dotted_name" for c in module.children):
+                        # Bare 'from . import lib': the imported names are the modules, as in the ast backend
+                        for name in node.children_by_field_name("name"):
+                            target = name.child_by_field_name("name") if name.type == "aliased_import" else name
+                            summary["imports"].append(self._text(module) + self._text(target))
+                    elif module is not None:
+                        # Relative imports keep their dots: '..lib'
+                        summary["imports"].append(self._text(module))
+                else:
+                    for name in node.children_by_field_name("name"):
+                        target = name.child_by_field_name("name") if name.type == "aliased_import" else name
+                        summary["imports"].append(self._text(target))
+                continue
+            if kind in ("global_statement", "nonlocal_statement"):
+                continue
+            if kind == "delete_statement":
+                # `del x` neither reads nor binds x (ast's Del context); `del x.y` still reads x
+                for target in node.named_children:
+                    parts = target.named_children if target.type == "expression_list" else [target]
+                    stack.extend(part for part in parts if part.type != "identifier")
+                continue
+            if kind == "dotted_name":
+                # Match patterns: a bare name captures (`case x:`), a dotted one reads its first part
+                parts = [c for c in node.named_children if c.type == "identifier"]
+                if len(parts) == 1 and node.parent is not None and node.parent.type in ("case_pattern",
+                                                                                        "keyword_pattern"):
+                    if self._text(parts[0]) != "_":
+                        summary["stores"].add(self._text(parts[0]))
+                elif parts:
+                    summary["loads"].add(self._text(parts[0]))
+                continue
+            if kind == "attribute":
+                stack.append(node.child_by_field_name("object"))
+                continue
+            if kind == "keyword_pattern":
+                stack.extend(node.named_children[1:])  # `N(id=x)`: `id` is an attribute name
+                continue
+            if kind == "keyword_argument":
+                stack.append(node.child_by_field_name("value"))
+                continue
+            if kind in ("function_definition", "class_definition"):
+                summary["defined"].add(self._text(node.child_by_field_name("name")))
+                for field in ("parameters", "superclasses", "return_type", "type_parameters"):
+                    child = node.child_by_field_name(field)
+                    if child is not None:
+                        stack.append(child)
+                stack.append(node.child_by_field_name("body"))
+                continue
+            if kind in ("parameters", "lambda_parameters"):
+                # summary["args"] mirrors ast's FunctionDef.args.args: plain positional-or-keyword
+                # parameters of non-async functions (no lambdas, positional-only or keyword-only ones)
+                positional = kind == "parameters" and node.parent is not None \
+                    and not any(c.type == "async" for c in node.parent.children)
+                names = []
+                for param in node.named_children:
+                    if param.type == "positional_separator":
+                        names = []
+                        continue
+                    splat = param.type in ("list_splat_pattern", "dictionary_splat_pattern") or any(
+                        c.type in ("list_splat_pattern", "dictionary_splat_pattern") for c in param.children)
+                    if splat or param.type == "keyword_separator":
+                        positional = False
+                    if param.type == "identifier":
+                        name = self._text(param)
+                    elif param.type in _PARAMETER_TYPES:
+                        inner = param.child_by_field_name("name") or next(
+                            (c for c in param.named_children if c.type == "identifier"), None)
+                        if inner is None:  # `*args: int` keeps its name inside the splat pattern
+                            inner = next((c for c in param.named_children[0].named_children), None)
+                        name = self._text(inner)
+                        for field in ("type", "value"):
+                            child = param.child_by_field_name(field)
+                            if child is not None:
+                                stack.append(child)
+                    else:
+                        continue
+                    summary["stores"].add(name)
+                    if positional:
+                        names.append(name)
+                summary["args"].update(names)
+                continue
+            field = _BINDING_PARENTS.get(kind)
+            if field:
+                target = node.child_by_field_name(field)
+                if target is None and kind == "as_pattern":
+                    target = node.named_children[-1]  # `case X() as y` has no alias field
+                self._bind(target, summary)
+                stack.extend(c for c in node.children if c != target)
+                continue
+            stack.extend(node.children)
+
+
+_default_backend = None
+_default_request = None  # the name it was requested under ('auto' resolves to another backend's name)
+_backend_lock = threading.Lock()
+
+
+def get_parser(name=None):
+    """Process-wide parser backend, selected by name or CODEREAPER_PARSER (see module docstring)."""
+    global _default_backend, _default_request
+    name = name or os.getenv("CODEREAPER_PARSER", "ast")
+    with _backend_lock:
+        if _default_backend is not None and name in (_default_backend.name, _default_request):
+            return _default_backend
+        if name == "auto":
+            try:
+                backend = TreeSitterBackend()
+            except ImportError:
+                backend = AstBackend()
+        elif name == "tree-sitter":
+            backend = TreeSitterBackend()
+        elif name == "ast":
+            backend = AstBackend()
+        else:
+            raise ValueError(f"Unknown parser backend: {name}")
+        _default_backend, _default_request = backend, name
+        return backend
+
+
+def global_usage(summary):
+    """Names the code reads but never binds (the Scope Guardian's notion of 'globals')."""
+    return summary["loads"] - summary["stores"] - summary["defined"] - _BUILTIN_NAMES
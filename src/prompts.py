@@ -0,0 +1,121 @@
+"""
+Token-budgeted prompt assembly.
+
+The Surgeon's prompt is a template plus four variable sections (the target code, Dependency
+Shield constraints, Memory Bank rules and research results). Each section is held to its own
+budget first; if the whole prompt still exceeds the total, sections are cut further in
+reverse priority order (research, then memory, then constraints). The code is never cut
+silently: a target whose code alone does not fit is reported as over budget so the caller
+can skip it. Everything that was dropped is listed in the report. Tokens are counted with
+retrieval.count_tokens: tiktoken when it is installed, a local estimate otherwise.
+"""
+import os
+
+from retrieval import count_tokens
+
+# Most important first; cut in reverse order
+PRIORITY = ("code", "constraints", "memory", "research")
+
+# Per-section token budgets and the unit a section is cut in (whole rules, whole results, ...)
+SECTION_RULES = {
+    "code": {"budget": 16000, "separator": None},
+    "constraints": {"budget": 1000, "separator": "\n"},
+    "memory": {"budget": 1200, "separator": "\n"},
+    "research": {"budget": 800, "separator": "\n---\n"},
+}
+
+SURGEON_TEMPLATE = """
+Refactor this code.
+Context from Search: {research}
+Constraints: {constraints}
+{memory}
+Original Code:
+{code}
+
+CRITICAL: Output ONLY raw Python code.
+"""
+
+
+def fit(text, budget, separator, counter=count_tokens):
+    """
+    Longest prefix of `text` made of whole `separator`-delimited units that fits `budget`.
+    Returns (kept_text, dropped_units); a single unit larger than the budget is dropped whole.
+    """
+    if counter(text) <= budget:
+        return text, []
+    units = text.split(separator) if separator else [text]
+    kept, used = [], 0
+    sep_cost = counter(separator) if separator else 0
+    for i, unit in enumerate(units):
+        cost = counter(unit) + (sep_cost if kept else 0)
+        if used + cost > budget:
+            return (separator or "").join(kept), [u for u in units[i:] if u.strip()]
+        kept.append(unit)
+        used += cost
+    return (separator or "").join(kept), []
+
+
+class PromptAssembler:
+    """
+    build(template, sections) -> (prompt, report). `max_tokens` bounds the whole prompt
+    (CODEREAPER_PROMPT_TOKENS, default 24000); `budgets` overrides per-section budgets.
+    """
+
+    def __init__(self, max_tokens=None, budgets=None, counter=count_tokens):
+        self.max_tokens = max_tokens or int(os.getenv("CODEREAPER_PROMPT_TOKENS", "24000"))
+        self.rules = {name: dict(rule) for name, rule in SECTION_RULES.items()}
+        for name, budget in (budgets or {}).items():
+            self.rules.setdefault(name, {"separator": "\n"})["budget"] = budget
+        self.counter = counter
+
+    def build(self, template, sections):
+        count = self.counter
+        fixed = count(template.format(**{name: "" for name in sections}))
+        report = {"max_tokens": self.max_tokens, "fixed_tokens": fixed, "over_budget": False, "sections": {}}
+        texts = {}
+        for name, text in sections.items():
+            text = text or ""
+            rule = self.rules.get(name, {"budget": self.max_tokens, "separator": "\n"})
+            if name == "code":
+                kept, dropped = text, []
+                if count(text) > rule["budget"]:
+                    report["over_budget"] = True
+            else:
+                kept, dropped = fit(text, rule["budget"], rule["separator"], count)
+            texts[name] = kept
+            report["sections"][name] = {"tokens": count(kept), "original_tokens": count(text), "dropped": dropped}
+
+        # Still too large: shrink the least important sections first
+        order = [n for n in reversed(PRIORITY) if n in texts] + [n for n in texts if n not in PRIORITY]
+        excess = fixed + sum(s["tokens"] for s in report["sections"].values()) - self.max_tokens
+        for name in order:
+            if excess <= 0:
+                break
+            if name == "code":
+                report["over_budget"] = True
+                break
+            section = report["sections"][name]
+            separator = self.rules.get(name, {}).get("separator", "\n")
+            kept, dropped = fit(texts[name], max(section["tokens"] - excess, 0), separator, count)
+            excess -= section["tokens"] - count(kept)
+            texts[name] = kept
+            section["tokens"] = count(kept)
+            section["dropped"] = dropped + section["dropped"]
+
+        prompt = template.format(**texts)
+        report["tokens"] = count(prompt)
+        return prompt, report
+
+    @staticmethod
+    def describe(report):
+        """One line per trimmed section, e.g. "research: kept 310/1250 tokens, dropped 3 item(s)"."""
+        lines = []
+        for name, section in report["sections"].items():
+            if section["tokens"] < section["original_tokens"]:
+                lines.append(f"{name}: kept {section['tokens']}/{section['original_tokens']} tokens, "
+                             f"dropped {len(section['dropped'])} item(s)")
+        if report["over_budget"]:
+            code = report["sections"].get("code", {})
+            lines.append(f"code: {code.get('original_tokens')} tokens does not fit the prompt budget "
+                         f"({report['max_tokens']} total)")
+        return lines
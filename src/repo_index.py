@@ -0,0 +1,254 @@
+"""
+Persistent repository index and its columnar export.
+
+    python src/cli.py export --repo PATH [--out codereaper_index] [--export-format parquet|arrow]
+
+The index (SQLite) keeps, per source file, its imports and per-function complexity, keyed
+by mtime and size: a run only re-parses files that changed since the last one, and only
+re-resolves the import edges of those files (all edges when files were added or removed).
+The export writes three tables for pandas / DuckDB / Polars:
+
+    files.parquet      path, module, extension, is_test, functions, max_complexity,
+                       total_complexity, critical, imports, dependents, error
+    functions.parquet  path, name, lineno, complexity, grade
+    edges.parquet      importer, target          (importer imports target)
+
+Rows are streamed from SQLite in record batches, so memory stays bounded by the batch
+size rather than the repository size, and the export is skipped when nothing changed
+since the last one. pyarrow is needed for the export only (`pip install pyarrow`).
+"""
+import json
+import os
+import sqlite3
+import time
+
+from parsing import get_parser, is_source_file, module_name, module_names
+from repo_tools import is_test_file, resolve_import
+
+CRITICAL_COMPLEXITY = 10
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+# Bumped when what is stored per file changes (2: relative imports keep their leading dots)
+INDEX_FORMAT = "2"
+
+
+class RepoIndex:
+    """update(repo_path) refreshes the index; export(out_dir) writes the columnar tables."""
+
+    def __init__(self, db_path="codereaper_index.db", parser=None):
+        self.db_path = db_path
+        self.parser = parser or get_parser()
+        self._conn = sqlite3.connect(db_path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, module TEXT, mtime_ns INTEGER, "
+                "size INTEGER, imports TEXT, error TEXT, seen INTEGER)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS functions (path TEXT, name TEXT, lineno INTEGER, complexity INTEGER)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS functions_path ON functions (path)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS edges (importer TEXT, target TEXT)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS edges_importer ON edges (importer)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS edges_target ON edges (target)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def _walk(self, repo_path):
+        for root, dirs, names in os.walk(repo_path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d != "__pycache__")
+            for name in sorted(names):
+                if is_source_file(name):
+                    yield os.path.join(root, name)
+
+    def _scan(self, path):
+        """(imports, functions, error) for one file; the parser's per-path state is dropped right away."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                summary = self.parser.parse(path, f.read(), complexity=True)
+        except (OSError, UnicodeDecodeError) as e:
+            return [], [], str(e)
+        finally:
+            self.parser.forget(path)
+        return summary["imports"], summary["functions"], summary["error"]
+
+    def update(self, repo_path, on_progress=None):
+        """
+        Re-parses new and changed files, drops deleted ones and refreshes the affected edges.
+        Returns {"files", "parsed", "unchanged", "removed", "edges", "seconds"}.
+        """
+        started = time.perf_counter()
+        repo_path = os.path.abspath(repo_path)
+        if self._meta("repo") not in (None, repo_path) or self._meta("format") != INDEX_FORMAT:
+            # One index per repository, in the current format: anything else starts from scratch
+            with self._conn:
+                for table in ("files", "functions", "edges", "meta"):
+                    self._conn.execute(f"DELETE FROM {table}")
+        run = int(self._meta("run", 0)) + 1
+        stats = {"files": 0, "parsed": 0, "unchanged": 0, "removed": 0}
+        changed = []
+
+        with self._conn:
+            for path in self._walk(repo_path):
+                stats["files"] += 1
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                row = self._conn.execute("SELECT mtime_ns, size FROM files WHERE path = ?", (path,)).fetchone()
+                if row == (st.st_mtime_ns, st.st_size):
+                    self._conn.execute("UPDATE files SET seen = ? WHERE path = ?", (run, path))
+                    stats["unchanged"] += 1
+                    continue
+                imports, functions, error = self._scan(path)
+                self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   (path, module_name(path), st.st_mtime_ns, st.st_size, json.dumps(imports),
+                                    error, run))
+                self._conn.execute("DELETE FROM functions WHERE path = ?", (path,))
+                self._conn.executemany("INSERT INTO functions VALUES (?, ?, ?, ?)",
+                                       [(path, f["name"], f.get("lineno"), f["complexity"]) for f in functions])
+                changed.append((path, row is None))
+                stats["parsed"] += 1
+                if on_progress:
+                    on_progress(stats)
+
+            removed = [p for (p,) in self._conn.execute("SELECT path FROM files WHERE seen != ?", (run,))]
+            stats["removed"] = len(removed)
+            for path in removed:
+                for table, column in (("files", "path"), ("functions", "path"), ("edges", "importer"),
+                                      ("edges", "target")):
+                    self._conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (path,))
+
+            # Edges only move when a file changed; adding or removing a file can re-target anyone's imports
+            if removed or any(is_new for _, is_new in changed):
+                self._conn.execute("DELETE FROM edges")
+                self._resolve(repo_path, self._conn.execute("SELECT path, imports FROM files"))
+            elif changed:
+                for path, _ in changed:
+                    self._conn.execute("DELETE FROM edges WHERE importer = ?", (path,))
+                self._resolve(repo_path, [
+                    self._conn.execute("SELECT path, imports FROM files WHERE path = ?", (path,)).fetchone()
+                    for path, _ in changed])
+
+            if changed or removed:
+                self._set_meta("version", int(self._meta("version", 0)) + 1)
+            self._set_meta("repo", repo_path)
+            self._set_meta("format", INDEX_FORMAT)
+            self._set_meta("run", run)
+        stats["edges"] = self._conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        return stats
+
+    def _resolve(self, repo_path, rows):
+        modules = {}
+        for (path,) in self._conn.execute("SELECT path FROM files"):
+            for name in module_names(path, repo_path):
+                modules.setdefault(name, []).append(path)
+        insert = self._conn.cursor()
+        for path, imports in rows:
+            targets = []
+            for imported_name in json.loads(imports):
+                for target in resolve_import(modules, imported_name, path):
+                    if target != path and target not in targets:
+                        targets.append(target)
+            insert.executemany("INSERT INTO edges VALUES (?, ?)", [(path, target) for target in targets])
+
+    # --- Columnar export ---
+    def _tables(self, root):
+        def rel(path):
+            return os.path.relpath(path, root)
+
+        files = (
+            "SELECT f.path, f.module, f.error, json_array_length(f.imports), "
+            "COUNT(fn.name), COALESCE(MAX(fn.complexity), 0), COALESCE(SUM(fn.complexity), 0), "
+            "COALESCE(SUM(fn.complexity > ?), 0), "
+            "(SELECT COUNT(*) FROM edges e WHERE e.target = f.path) "
+            "FROM files f LEFT JOIN functions fn ON fn.path = f.path GROUP BY f.path ORDER BY f.path",
+            (CRITICAL_COMPLEXITY,),
+            lambda r: {"path": rel(r[0]), "module": r[1], "extension": os.path.splitext(r[0])[1],
+                       "is_test": is_test_file(r[0]), "functions": r[4], "max_complexity": r[5],
+                       "total_complexity": r[6], "critical": r[7], "imports": r[3], "dependents": r[8],
+                       "error": r[2]},
+        )
+        functions = (
+            "SELECT path, name, lineno, complexity FROM functions ORDER BY path, lineno", (),
+            lambda r: {"path": rel(r[0]), "name": r[1], "lineno": r[2], "complexity": r[3],
+                       "grade": "CRITICAL" if r[3] > CRITICAL_COMPLEXITY else "ACCEPTABLE"},
+        )
+        edges = (
+            "SELECT importer, target FROM edges ORDER BY importer, target", (),
+            lambda r: {"importer": rel(r[0]), "target": rel(r[1])},
+        )
+        return {"files": files, "functions": functions, "edges": edges}
+
+    @staticmethod
+    def _schemas():
+        import pyarrow as pa
+
+        return {
+            "files": pa.schema([("path", pa.string()), ("module", pa.string()), ("extension", pa.string()),
+                                ("is_test", pa.bool_()), ("functions", pa.int32()), ("max_complexity", pa.int32()),
+                                ("total_complexity", pa.int64()), ("critical", pa.int32()), ("imports", pa.int32()),
+                                ("dependents", pa.int32()), ("error", pa.string())]),
+            "functions": pa.schema([("path", pa.string()), ("name", pa.string()), ("lineno", pa.int32()),
+                                    ("complexity", pa.int32()), ("grade", pa.string())]),
+            "edges": pa.schema([("importer", pa.string()), ("target", pa.string())]),
+        }
+
+    def export(self, out_dir, fmt="parquet", batch_size=50000, force=False):
+        """
+        Writes files/functions/edges tables to out_dir in record batches of `batch_size` rows.
+        Returns {table: rows}, or None when the index has not changed since the last export.
+        """
+        import pyarrow as pa
+
+        stamp = f"{self._meta('version', 0)}:{fmt}:{os.path.abspath(out_dir)}"
+        suffix = EXPORT_FORMATS[fmt]
+        outputs = {name: os.path.join(out_dir, name + suffix) for name in ("files", "functions", "edges")}
+        if not force and self._meta("exported") == stamp and all(map(os.path.exists, outputs.values())):
+            return None
+
+        os.makedirs(out_dir, exist_ok=True)
+        schemas = self._schemas()
+        root = self._meta("repo") or os.getcwd()
+        counts = {}
+        for name, (query, params, to_row) in self._tables(root).items():
+            tmp_path = outputs[name] + ".tmp"
+            writer = self._writer(tmp_path, schemas[name], fmt)
+            counts[name] = 0
+            try:
+                cursor = self._conn.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    writer.write_batch(pa.RecordBatch.from_pylist([to_row(r) for r in rows], schema=schemas[name]))
+                    counts[name] += len(rows)
+                writer.close()
+            except BaseException:
+                writer.close()
+                os.remove(tmp_path)
+                raise
+            # Readers never see a half-written table
+            os.replace(tmp_path, outputs[name])
+        with self._conn:
+            self._set_meta("exported", stamp)
+        return counts
+
+    @staticmethod
+    def _writer(path, schema, fmt):
+        import pyarrow as pa
+
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(path, schema, compression="zstd")
+        return pa.ipc.new_file(path, schema)
+
+    def close(self):
+        self._conn.close()
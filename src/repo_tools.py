@@ -1,9 +1,10 @@
 import os
-import ast
-import git
+import json
 import shutil
 import logging
 
+from parsing import get_parser, is_source_file, module_names
+
 class RepoManager:
     def __init__(self, repo_url, local_dir="temp_repo"):
         self.repo_url = repo_url
@@ -11,6 +12,7 @@ class RepoManager:
         self.repo = None
 
     def clone_repo(self):
+        import git  # GitPython is only needed when we actually clone
         if os.path.exists(self.local_dir):
             try:
                 shutil.rmtree(self.local_dir)
@@ -33,60 +35,277 @@ class RepoManager:
                     py_files.append(os.path.join(root, file))
         return py_files
 
+def is_test_file(path):
+    name = os.path.basename(path)
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def load_coverage_map(path):
+    """
+    Loads a {source_path: [test_path, ...]} map. Accepts a JSON file with that shape, or a
+    coverage.py data file recorded with dynamic contexts (`coverage run --context=test`
+    or pytest-cov's `--cov-context=test`), in which case the `coverage` package is needed.
+    """
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        return {os.path.abspath(src): [os.path.abspath(t) for t in tests] for src, tests in raw.items()}
+
+    from coverage import CoverageData
+
+    data = CoverageData(basename=path)
+    data.read()
+    root = os.path.dirname(os.path.abspath(path))
+    coverage_map = {}
+    for source in data.measured_files():
+        tests = set()
+        for contexts in data.contexts_by_lineno(source).values():
+            for context in contexts:
+                # Contexts look like 'tests/test_x.py::TestY::test_z|run'
+                test_file = context.split("::", 1)[0]
+                if test_file.endswith(".py"):
+                    tests.add(os.path.abspath(os.path.join(root, test_file)))
+        if tests:
+            coverage_map[os.path.abspath(source)] = sorted(tests)
+    return coverage_map
+
+
+def _popcount(bits):
+    return bits.bit_count() if hasattr(bits, "bit_count") else bin(bits).count("1")  # int.bit_count: 3.10+
+
+
+def resolve_import(modules, imported_name, importer=None):
+    """
+    Files an import statement refers to, given {dotted name: [paths]} (see parsing.module_names).
+    Only the full dotted name resolves, so 'os.path' reaches an os/path.py but never a stray
+    path.py. A relative import ('.lib', '..pkg.mod') resolves against the directory of
+    `importer`, and only to a module that exists there.
+    """
+    if not imported_name.startswith("."):
+        return modules.get(imported_name, [])
+    if importer is None:
+        return []
+    relative = imported_name.lstrip(".")
+    base = os.path.dirname(os.path.abspath(importer))
+    for _ in range(len(imported_name) - len(relative) - 1):
+        base = os.path.dirname(base)
+    stem = os.path.join(base, *relative.split(".")) if relative else base
+    # stem.py, stem.pyx, ... or the package stem/__init__.*
+    return [path for path in modules.get(os.path.basename(stem), [])
+            if os.path.splitext(path)[0] in (stem, os.path.join(stem, "__init__"))]
+
+
 class DependencyGraph:
-    def __init__(self, repo_path):
+    def __init__(self, repo_path, parser=None):
         self.repo_path = repo_path
         # map: {'filename.py': ['importer1.py', 'importer2.py']}
         self.adjacency_list = {} 
+        # Parser backend (see parsing.py); tree-sitter re-parses edited files incrementally
+        self.parser = parser or get_parser()
+        self._modules = {}   # dotted name -> [paths] ('lib' and 'pkg.lib' -> pkg/lib.py, lib.pyx, lib.pyi)
+        self._imports = {}   # path -> [resolved paths it imports]
+        self._impact = None  # path -> impact metrics, built on first use (see impact())
         self._build_graph()
 
     def _build_graph(self):
         """Scans imports to build the dependency graph."""
-        file_map = {}
-        # 1. Index all files
-        for root, _, files in os.walk(self.repo_path):
+        # 1. Index all files (.py, Cython .pyx/.pxd and .pyi stubs); paths are kept absolute, lookups normalise
+        sources = []
+        for root, _, files in os.walk(os.path.abspath(self.repo_path)):
             for file in files:
-                if file.endswith(".py"):
+                if is_source_file(file):
                     full_path = os.path.join(root, file)
-                    file_map[file] = full_path
+                    sources.append(full_path)
+                    for name in module_names(full_path, self.repo_path):
+                        self._modules.setdefault(name, []).append(full_path)
 
         # 2. Parse imports
-        for filename, full_path in file_map.items():
+        for full_path in sources:
             try:
                 with open(full_path, "r", encoding="utf-8") as f:
-                    tree = ast.parse(f.read())
-                
-                for node in ast.walk(tree):
-                    imported_name = None
-                    if isinstance(node, ast.Import):
-                        for n in node.names:
-                            imported_name = n.name
-                    elif isinstance(node, ast.ImportFrom):
-                        imported_name = node.module
-
-                    if imported_name:
-                        # Simple heuristic for demo: check if module name matches a filename
-                        # (Real production code would need full python path resolution)
-                        potential_match = f"{imported_name}.py"
-                        target_path = file_map.get(potential_match)
-                        
-                        if target_path:
-                            if target_path not in self.adjacency_list:
-                                self.adjacency_list[target_path] = []
-                            if full_path not in self.adjacency_list[target_path]:
-                                self.adjacency_list[target_path].append(full_path)
+                    self._index(full_path, f.read())
             except Exception:
                 continue
 
+    def _index(self, full_path, source):
+        summary = self.parser.parse(full_path, source)
+        if summary["error"] and not summary["imports"]:
+            return
+        resolved = []
+        for imported_name in summary["imports"]:
+            for target_path in resolve_import(self._modules, imported_name, full_path):
+                if target_path == full_path or target_path in resolved:
+                    continue
+                resolved.append(target_path)
+                if target_path not in self.adjacency_list:
+                    self.adjacency_list[target_path] = []
+                if full_path not in self.adjacency_list[target_path]:
+                    self.adjacency_list[target_path].append(full_path)
+        self._imports[full_path] = resolved
+
+    def update_file(self, full_path, source=None):
+        """
+        Re-indexes one file after it was edited (e.g. by the Surgeon) instead of rebuilding
+        the whole graph. With the tree-sitter backend only the changed region is re-parsed.
+        """
+        full_path = os.path.abspath(full_path)
+        if source is None:
+            with open(full_path, "r", encoding="utf-8") as f:
+                source = f.read()
+        for target_path in self._imports.pop(full_path, []):
+            importers = self.adjacency_list.get(target_path, [])
+            if full_path in importers:
+                importers.remove(full_path)
+        for name in module_names(full_path, self.repo_path):
+            paths = self._modules.setdefault(name, [])
+            if full_path not in paths:
+                paths.append(full_path)
+        self._index(full_path, source)
+        self._impact = None
+
     def get_dependents(self, file_path):
-        """Returns list of files that import the given file."""
-        return self.adjacency_list.get(file_path, [])
+        """Returns list of files that import the given file (relative or absolute path)."""
+        return self.adjacency_list.get(os.path.abspath(file_path), [])
+
+    def get_transitive_dependents(self, file_path):
+        """Every file that imports the given file directly or through other files (BFS over reverse edges)."""
+        file_path = os.path.abspath(file_path)
+        seen, queue = set(), list(self.get_dependents(file_path))
+        while queue:
+            dep = queue.pop()
+            if dep in seen or dep == file_path:
+                continue
+            seen.add(dep)
+            queue.extend(self.adjacency_list.get(dep, []))
+        return sorted(seen)
+
+    def _strongly_connected(self, nodes):
+        """Tarjan's SCCs over importer edges (iterative). Emitted dependents-first: every SCC after those it reaches."""
+        index, low, on_stack, stack, sccs = {}, {}, set(), [], []
+        counter = 0
+        importers_of = lambda node: self.adjacency_list.get(node, [])  # nodes are graph keys already
+        for root in nodes:
+            if root in index:
+                continue
+            work = [(root, iter(importers_of(root)))]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                child = next(children, None)
+                if child is not None:
+                    if child not in index:
+                        index[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(importers_of(child))))
+                    elif child in on_stack:
+                        low[node] = min(low[node], index[child])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    sccs.append(component)
+        return sccs
+
+    def _build_impact(self):
+        """
+        Per-file impact metrics, computed once: Tarjan SCCs condense import cycles, then a DP
+        over the condensed DAG (in topological order each way) yields, per component, its
+        reachable dependents and dependencies as bitsets plus the longest importer chain.
+        Cost is O(V + E) for the graph walks plus O(V/64) word operations per edge for the
+        bitset unions; a component's bitset is freed as soon as its last user has read it.
+        """
+        nodes = sorted(set(p for paths in self._modules.values() for p in paths) | set(self.adjacency_list))
+        sccs = self._strongly_connected(nodes)
+        component = {node: c for c, members in enumerate(sccs) for node in members}
+        # Condensed edges: target component -> importer components
+        importers = [set() for _ in sccs]
+        imported = [set() for _ in sccs]
+        for c, members in enumerate(sccs):
+            for node in members:
+                for dep in self.adjacency_list.get(node, []):
+                    if component[dep] != c:
+                        importers[c].add(component[dep])
+                        imported[component[dep]].add(c)
+
+        # Bit positions follow Tarjan's order, so a component's members are contiguous bits
+        first, position = [], 0
+        for members in sccs:
+            first.append(position)
+            position += len(members)
+
+        def reach(order, successors, predecessors):
+            # successors are finished before `c` in `order`; a bitset is dropped once all its readers are done
+            counts, pending, sets, depth = [0] * len(sccs), [len(p) for p in predecessors], {}, [0] * len(sccs)
+            for c in order:
+                acc = 0
+                for member in range(len(sccs[c])):
+                    acc |= 1 << (first[c] + member)
+                for s in successors[c]:
+                    acc |= sets[s]
+                    depth[c] = max(depth[c], depth[s] + 1)
+                    pending[s] -= 1
+                    if not pending[s]:
+                        del sets[s]
+                counts[c] = _popcount(acc) - 1  # minus the file itself
+                if pending[c]:
+                    sets[c] = acc
+            return counts, depth
+
+        # Tarjan emits importers before what they import, so its order is the dependents-first DP order
+        up, depth = reach(range(len(sccs)), importers, imported)
+        down, _ = reach(reversed(range(len(sccs))), imported, importers)
+        scale = max(len(nodes) - 1, 1) ** 2 / 4
+        self._impact = {}
+        for node in nodes:
+            c = component[node]
+            self._impact[node] = {
+                "dependents": len(self.adjacency_list.get(node, [])),
+                "reachable": up[c],        # files that import this one directly or transitively
+                "dependencies": down[c],   # files this one imports directly or transitively
+                "depth": depth[c],         # longest chain of importers above it (cycles count once)
+                "cycle": len(sccs[c]),     # size of the import cycle it sits in (1 = none)
+                # Through-traffic: how many dependency paths run through the file, scaled to 0..1
+                "centrality": round(min(up[c] * down[c] / scale, 1.0), 4),
+            }
+
+    def impact(self, file_path):
+        """Impact metrics of one file (O(1) after the first call; see _build_impact)."""
+        if self._impact is None:
+            self._build_impact()
+        return self._impact.get(os.path.abspath(file_path), {"dependents": 0, "reachable": 0, "dependencies": 0, "depth": 0,
+                                            "cycle": 1, "centrality": 0.0})
+
+    def affected_tests(self, file_path, coverage_map=None):
+        """
+        Existing test files that exercise file_path: tests that import it (transitively,
+        via the reverse import edges) plus, if given, tests a coverage map recorded as
+        executing it ({source_path: [test_path, ...]}, see load_coverage_map).
+        """
+        tests = {dep for dep in self.get_transitive_dependents(file_path) if is_test_file(dep)}
+        if coverage_map:
+            tests.update(coverage_map.get(os.path.abspath(file_path), []))
+        return sorted(tests)
 
     def generate_constraints(self, target_file):
         """
         THE RESEARCH NOVELTY:
         Generates a text block explaining what NOT to break.
         """
+        target_file = os.path.abspath(target_file)
         dependents = self.get_dependents(target_file)
         if not dependents:
             return "No external dependencies found. You have full freedom to refactor."
@@ -98,6 +317,14 @@ class DependencyGraph:
         # For this Hackathon/Capstone, we list the files to simulate "Graph Awareness".
         for dep in dependents:
             constraint_msg.append(f"- Imported by: {os.path.basename(dep)}")
+
+        impact = self.impact(target_file)
+        if impact["reachable"] > len(dependents):
+            constraint_msg.append(f"Any interface change ripples to {impact['reachable']} files transitively "
+                                  f"(up to {impact['depth']} import levels deep).")
+        if impact["cycle"] > 1:
+            constraint_msg.append(f"This file is part of an import cycle of {impact['cycle']} files: "
+                                  "DO NOT add imports or move code between modules.")
         
         constraint_msg.append("DO NOT change public function names or class names.")
         constraint_msg.append("DO NOT change argument order in public functions.")
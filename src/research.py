@@ -0,0 +1,301 @@
+import ast
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from retrieval import BM25Index
+
+# Curated refactoring guides, PEP summaries and internal style docs shipped with the repo
+KNOWLEDGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge")
+DOC_EXTENSIONS = (".md", ".rst", ".txt")
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$|^(.+)\n[=\-~]{3,}\s*$", re.MULTILINE)
+_FTS_TERM = re.compile(r"[A-Za-z0-9_]+")
+
+
+_BRANCHES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.comprehension,
+             ast.Assert)
+_LOOPS = (ast.For, ast.AsyncFor, ast.While)
+_NESTING = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try)
+_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])")
+
+
+def _complexity(func):
+    """Cyclomatic complexity estimate: 1 + branches (each extra and/or operand counts too)."""
+    score = 1
+    for node in ast.walk(func):
+        if isinstance(node, _BRANCHES):
+            score += 1
+        elif isinstance(node, ast.BoolOp):
+            score += len(node.values) - 1
+    return score
+
+
+def _max_depth(node, kinds, depth=0):
+    deepest = depth
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        deepest = max(deepest, _max_depth(child, kinds, depth + isinstance(child, kinds)))
+    return deepest
+
+
+def _constructs(tree, functions):
+    """Topic words for the refactoring-relevant constructs the code uses."""
+    topics = []
+    if any(isinstance(n, ast.Call) and isinstance(n.func, ast.Name) and n.func.id == f.name
+           for f in functions for n in ast.walk(f)):
+        topics.append("recursion")
+    module_vars = {t.id for n in tree.body if isinstance(n, (ast.Assign, ast.AnnAssign, ast.AugAssign))
+                   for t in (n.targets if isinstance(n, ast.Assign) else [n.target]) if isinstance(t, ast.Name)}
+    if any(isinstance(n, (ast.Global, ast.Nonlocal)) or (isinstance(n, ast.Name) and n.id in module_vars)
+           for f in functions for n in ast.walk(f)):
+        topics.append("global variables")
+    if any(_max_depth(f, _LOOPS) >= 2 for f in functions):
+        topics.append("nested loops")
+    if any(_max_depth(f, _NESTING) >= 3 for f in functions):
+        topics.append("deep nesting guard clauses")
+    if any(isinstance(n, ast.ExceptHandler) and n.type is None for n in ast.walk(tree)):
+        topics.append("bare except exception handling")
+    if any(len(f.args.args) + len(f.args.kwonlyargs) > 5 for f in functions):
+        topics.append("too many parameters")
+    if any((f.end_lineno or f.lineno) - f.lineno > 50 for f in functions):
+        topics.append("long function extract method")
+    return topics
+
+
+def build_query(code, hotspots=3, hotspot_complexity=5):
+    """
+    The Researcher's query for a target, built from its features: the constructs it uses
+    (recursion, globals, nested loops, ...) and the names of its most complex functions,
+    split into words ('process_data' -> 'process data'). Unparseable code gets a generic query.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return "python clean code refactoring guide"
+    functions = [n for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    terms = _constructs(tree, functions)
+    ranked = sorted(functions, key=_complexity, reverse=True)
+    complex_functions = [f for f in ranked[:hotspots] if _complexity(f) > hotspot_complexity]
+    if complex_functions:
+        terms.append("reduce cyclomatic complexity")
+    for func in complex_functions or ranked[:1]:
+        terms.append(" ".join(w.lower() for w in _WORD.findall(func.name)))
+    words = []
+    for word in " ".join(["python refactoring"] + terms).split():
+        if word not in words:
+            words.append(word)
+    return " ".join(words)
+
+
+def split_sections(text, default_title):
+    """Splits a markdown/rst document into [(title, body)] at its headings."""
+    sections, title, start = [], default_title, 0
+    for match in _HEADING.finditer(text):
+        body = text[start:match.start()].strip()
+        if body:
+            sections.append((title, body))
+        title = (match.group(2) or match.group(3)).strip()
+        start = match.end()
+    body = text[start:].strip()
+    if body:
+        sections.append((title, body))
+    return sections
+
+
+def format_results(results):
+    """Same 'Title / Description / URL' layout as ReaperTools.google_search_tool."""
+    return "\n---\n".join(f"Title: {r['title']}\nDescription: {r['snippet']}\nURL: {r['source']}" for r in results)
+
+
+class SearchBackend:
+    """
+    Interface for the Researcher stage. search() returns [{'title', 'snippet', 'source'}],
+    best match first; an empty list means 'nothing found' (the pipeline falls back).
+    """
+    name = "base"
+
+    def search(self, query, top_k=3):
+        raise NotImplementedError
+
+
+class GoogleSearchBackend(SearchBackend):
+    """Live Google scrape (googlesearch-python). Slow, rate-limited and non-deterministic."""
+    name = "google"
+
+    def search(self, query, top_k=3):
+        from googlesearch import search
+        return [{"title": r.title, "snippet": r.description, "source": r.url}
+                for r in search(query, num_results=top_k, advanced=True)]
+
+
+class LocalSearchBackend(SearchBackend):
+    """
+    Offline full-text search over local documents (the bundled knowledge/ directory plus
+    any extra doc_dirs, e.g. a team's own style docs). Documents are split at headings and
+    stored in an SQLite FTS5 table; files are re-indexed only when their mtime changes.
+    Falls back to an in-memory BM25 index if this SQLite build lacks FTS5.
+    """
+    name = "local"
+
+    def __init__(self, db_path="codereaper_knowledge.db", doc_dirs=None):
+        self.db_path = db_path
+        self.doc_dirs = list(doc_dirs or [KNOWLEDGE_DIR])
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with self._conn:
+                self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS sections USING fts5"
+                                   "(title, body, source UNINDEXED, tokenize='porter unicode61')")
+            self._bm25 = None
+        except sqlite3.OperationalError:
+            self._bm25 = BM25Index()
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS indexed_files (path TEXT PRIMARY KEY, mtime REAL)")
+        self._mtimes = {}
+        self.version = None  # hash of the indexed (path, mtime) set, so caches can tell stale results apart
+        self.refresh()
+
+    def _doc_files(self):
+        for doc_dir in self.doc_dirs:
+            for root, _, names in os.walk(doc_dir):
+                for name in sorted(names):
+                    if name.endswith(DOC_EXTENSIONS):
+                        yield os.path.join(root, name)
+
+    @staticmethod
+    def _read_sections(path):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        return split_sections(text, os.path.splitext(os.path.basename(path))[0])
+
+    def refresh(self):
+        """Indexes new or modified documents and drops deleted ones. Returns the number of files touched."""
+        with self._lock:
+            current = {path: os.path.getmtime(path) for path in self._doc_files()}
+            # Content-derived version: identical doc sets share cache entries across processes
+            self.version = hashlib.sha1(json.dumps(sorted(current.items())).encode("utf-8")).hexdigest()[:12]
+            if self._bm25 is not None:
+                known = self._mtimes
+            else:
+                known = dict(self._conn.execute("SELECT path, mtime FROM indexed_files").fetchall())
+            changed = [path for path, mtime in current.items() if known.get(path) != mtime]
+            removed = set(known) - set(current)
+            if not changed and not removed:
+                return 0
+
+            if self._bm25 is not None:
+                # BM25Index is append-only, so rebuild it (only a handful of docs in this mode)
+                self._bm25 = BM25Index()
+                for path in current:
+                    for title, body in self._read_sections(path):
+                        self._bm25.add(f"{title}\n{body}", {"title": title, "snippet": body, "source": path})
+                self._mtimes = current
+            else:
+                with self._conn:
+                    for path in changed:
+                        self._conn.execute("DELETE FROM sections WHERE source = ?", (path,))
+                        self._conn.executemany("INSERT INTO sections (title, body, source) VALUES (?, ?, ?)",
+                                               [(title, body, path) for title, body in self._read_sections(path)])
+                        self._conn.execute("INSERT OR REPLACE INTO indexed_files (path, mtime) VALUES (?, ?)",
+                                           (path, current[path]))
+                    for path in removed:
+                        self._conn.execute("DELETE FROM sections WHERE source = ?", (path,))
+                        self._conn.execute("DELETE FROM indexed_files WHERE path = ?", (path,))
+            return len(changed) + len(removed)
+
+    def search(self, query, top_k=3):
+        if self._bm25 is not None:
+            return [payload for _, payload in self._bm25.search(query, top_k)]
+        terms = _FTS_TERM.findall(query)
+        if not terms:
+            return []
+        # OR the quoted terms: the query is natural language, not FTS syntax
+        match = " OR ".join(f'"{t}"' for t in terms)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title, body, source FROM sections WHERE sections MATCH ? ORDER BY bm25(sections, 5.0, 1.0) LIMIT ?",
+                (match, top_k),
+            ).fetchall()
+        return [{"title": title, "snippet": body, "source": source} for title, body, source in rows]
+
+    def close(self):
+        self._conn.close()
+
+
+class CachedSearch:
+    """
+    Per-query result cache in front of any SearchBackend, persisted in SQLite so repeated
+    runs (and other workers) reuse earlier answers. Local results are keyed by the index
+    version, so editing a knowledge doc invalidates them; remote results expire after ttl.
+    """
+
+    def __init__(self, backend, db_path="codereaper_knowledge.db", ttl=7 * 24 * 3600):
+        self.backend = backend
+        self.name = backend.name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache "
+                "(backend TEXT, version TEXT, query TEXT, top_k INTEGER, results TEXT, created REAL, "
+                "PRIMARY KEY (backend, version, query, top_k))"
+            )
+        self._memo = {}
+
+    def search(self, query, top_k=3):
+        """Returns (results, cache_hit)."""
+        key = (self.name, getattr(self.backend, "version", None) or "", query, top_k)
+        with self._lock:
+            cached = self._memo.get(key)
+            if cached is None:
+                row = self._conn.execute(
+                    "SELECT results, created FROM search_cache WHERE backend = ? AND version = ? AND query = ? AND top_k = ?",
+                    key,
+                ).fetchone()
+                if row and time.time() - row[1] < self.ttl:
+                    cached = self._memo[key] = json.loads(row[0])
+        if cached is not None:
+            self.hits += 1
+            return cached, True
+
+        self.misses += 1
+        results = self.backend.search(query, top_k)
+        with self._lock:
+            self._memo[key] = results
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?, ?)",
+                                   (*key, json.dumps(results), time.time()))
+        return results, False
+
+    def clear(self):
+        with self._lock:
+            self._memo.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM search_cache")
+
+
+def get_research_backend(name=None, db_path="codereaper_knowledge.db"):
+    """
+    Researcher backend selected by name or the CODEREAPER_RESEARCH env var ('local' by
+    default, 'google' for live search). Extra document folders can be added with
+    CODEREAPER_KNOWLEDGE_DIRS (os.pathsep-separated).
+    """
+    name = name or os.getenv("CODEREAPER_RESEARCH", "local")
+    if name == "google":
+        backend = GoogleSearchBackend()
+    elif name == "local":
+        extra = [d for d in os.getenv("CODEREAPER_KNOWLEDGE_DIRS", "").split(os.pathsep) if d]
+        backend = LocalSearchBackend(db_path, [KNOWLEDGE_DIR] + extra)
+    else:
+        raise ValueError(f"Unknown research backend: {name}")
+    return CachedSearch(backend, db_path)
@@ -0,0 +1,139 @@
+import math
+import os
+import re
+from collections import Counter
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Words that appear in almost every rule or snippet and carry no signal
+STOPWORDS = {
+    "the", "a", "an", "and", "or", "of", "to", "in", "is", "it", "for", "on", "be", "use",
+    "self", "def", "return", "if", "else", "not", "with", "as", "this", "that", "by",
+}
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_SUBWORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+
+def tokenize(text):
+    """
+    Splits prose or code into lowercase terms.
+    Identifiers are kept whole AND split on snake_case / camelCase, so
+    'calculate_total' matches rules that only mention 'total'.
+    """
+    terms = []
+    for ident in _IDENTIFIER.findall(text):
+        lowered = ident.lower()
+        parts = [p.lower() for p in _SUBWORD.findall(ident)]
+        if len(parts) > 1 and lowered not in STOPWORDS:
+            terms.append(lowered)
+        terms.extend(p for p in parts if len(p) > 1 and p not in STOPWORDS)
+    return terms
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (~4 characters per token for code and English)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+_TOKEN_PIECE = re.compile(r"[A-Za-z]+|\d+|\n+|[ \t]{2,}|[^\sA-Za-z\d]+| ")
+_encoding = None
+
+
+def _bpe_encoding():
+    """The tiktoken encoding (CODEREAPER_TOKENIZER, default cl100k_base), or None without one."""
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(os.getenv("CODEREAPER_TOKENIZER", "cl100k_base"))
+            except Exception:
+                pass  # unknown name, or the BPE file can't be downloaded: fall back to the estimate
+    return _encoding or None
+
+
+def count_tokens(text):
+    """
+    Token count for sizing prompts. With tiktoken installed this is an exact BPE count
+    (still only an approximation of Gemini's own tokenizer, which is not available offline);
+    without it, see estimate_bpe_tokens.
+    """
+    encoding = _bpe_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=())) if text else 0
+    return estimate_bpe_tokens(text)
+
+
+def estimate_bpe_tokens(text):
+    """
+    Closer local estimate of a BPE tokenizer's count than estimate_tokens:
+    a word costs one token per ~6 letters, a number one per 3 digits, each newline run or
+    indentation run one, a punctuation run one per 2 characters; single spaces merge into the
+    following word. Code (indentation, operators) is where len/4 is furthest off.
+    """
+    if not text:
+        return 0
+    total = 0
+    for piece in _TOKEN_PIECE.findall(text):
+        first = piece[0]
+        if first.isalpha():
+            total += 1 + (len(piece) - 1) // 6
+        elif first.isdigit():
+            total += (len(piece) + 2) // 3
+        elif first == "\n" or (first in " \t" and len(piece) > 1):
+            total += 1
+        elif first != " ":
+            total += (len(piece) + 1) // 2
+    return total
+
+
+class BM25Index:
+    """
+    Small in-memory Okapi BM25 index.
+    Documents are appended incrementally (postings are updated in place), and a
+    query only touches the postings of its own terms.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = []       # payloads, indexed by doc id
+        self.doc_len = []
+        self.postings = {}   # term -> {doc_id: term frequency}
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, text, payload):
+        doc_id = len(self.docs)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(counts.values())
+        self.docs.append(payload)
+        self.doc_len.append(length)
+        self.total_len += length
+        return doc_id
+
+    def search(self, query, top_k=5):
+        """Returns [(score, payload)] for the best matching documents, best first."""
+        if not self.docs:
+            return []
+        n_docs = len(self.docs)
+        avg_len = self.total_len / n_docs or 1
+        scores = {}
+        for term, qtf in Counter(tokenize(query)).items():
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                # Query term frequency is dampened so repeated identifiers don't dominate
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm * (1 + math.log(qtf))
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))[:top_k]
+        return [(score, self.docs[doc_id]) for doc_id, score in ranked]
@@ -0,0 +1,173 @@
+"""
+Per-target model routing for the LLM stages.
+
+    python src/router.py                      # latency / cost / pass rate per route so far
+
+Targets start on the cheapest tier their difficulty allows (max cyclomatic complexity and
+prompt size) and move to a larger model only after a validation failure. Every routed call
+is recorded with its latency and cost, and a target whose last run failed starts one tier
+higher next time. Run check_models.py once to restrict the tiers to the models your API
+key can actually use.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# USD per 1M tokens (input, output); published list prices
+PRICES = {
+    "gemini-2.5-pro": (1.25, 10.0),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "fake": (0.0, 0.0),
+}
+
+# Cheapest first. A tier accepts a target when both limits hold (None = no limit).
+DEFAULT_TIERS = [
+    {"name": "fast", "model": "gemini-2.5-flash-lite", "max_complexity": 5, "max_tokens": 1500},
+    {"name": "balanced", "model": "gemini-2.5-flash", "max_complexity": 10, "max_tokens": 6000},
+    {"name": "large", "model": "gemini-2.5-pro", "max_complexity": None, "max_tokens": None},
+]
+
+# Written by check_models.py: the generateContent models available to this API key
+MODELS_PATH = "codereaper_models.json"
+
+
+def max_complexity(report):
+    """Highest function complexity in a ReaperTools.analyze_complexity report (0 if unavailable)."""
+    try:
+        return max((item["complexity"] for item in json.loads(report)), default=0)
+    except (TypeError, ValueError, KeyError):
+        return 0
+
+
+def load_tiers(models_path=MODELS_PATH, tiers=DEFAULT_TIERS):
+    """The tiers whose model check_models.py found; all of them if it was never run."""
+    tiers = [dict(tier) for tier in tiers]
+    try:
+        with open(models_path, "r", encoding="utf-8") as f:
+            available = set(json.load(f))
+    except (OSError, ValueError):
+        return tiers
+    kept = [tier for tier in tiers if tier["model"] in available]
+    if kept:
+        # The largest remaining tier takes everything the removed ones would have
+        kept[-1].update(max_complexity=None, max_tokens=None)
+    return kept or tiers
+
+
+class ModelRouter:
+    """
+    Picks the model for each target. route() is cheap (one indexed SQLite lookup) and
+    record() appends one row per routed call to the `routes` table.
+    """
+
+    def __init__(self, tiers=None, db_path="codereaper_routes.db", models_path=MODELS_PATH, prices=None):
+        self.tiers = tiers or load_tiers(models_path)
+        self.prices = prices or PRICES
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS routes "
+                "(target TEXT, tier TEXT, model TEXT, attempt INTEGER, stage TEXT, passed INTEGER, "
+                "latency_ms REAL, tokens_in INTEGER, tokens_out INTEGER, cost_usd REAL, created REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS routes_target ON routes (target)")
+
+    def _tier_index(self, name):
+        return next((i for i, tier in enumerate(self.tiers) if tier["name"] == name), None)
+
+    def base_tier(self, complexity, tokens):
+        """Index of the cheapest tier whose limits the target fits."""
+        for i, tier in enumerate(self.tiers):
+            if ((tier["max_complexity"] is None or complexity <= tier["max_complexity"])
+                    and (tier["max_tokens"] is None or tokens <= tier["max_tokens"])):
+                return i
+        return len(self.tiers) - 1
+
+    def route(self, target, complexity, tokens, attempt=0):
+        """{'tier', 'index', 'model', 'attempt', 'reason'} for the given attempt (0 = first try)."""
+        index = self.base_tier(complexity, tokens)
+        reason = f"complexity {complexity}, ~{tokens} prompt tokens"
+        with self._lock:
+            last = self._conn.execute(
+                "SELECT tier, passed FROM routes WHERE target = ? ORDER BY rowid DESC LIMIT 1",
+                (os.path.abspath(target),),
+            ).fetchone()
+        previous = self._tier_index(last[0]) if last else None
+        if previous is not None:
+            if last[1]:
+                # The tier that last produced a verified refactor of this target is the one to start on
+                index, reason = previous, reason + f"; passed on {last[0]} last run"
+            elif previous + 1 > index:
+                index, reason = min(previous + 1, len(self.tiers) - 1), reason + f"; failed on {last[0]} last run"
+        if attempt:
+            reason += f"; escalated after {attempt} failed validation(s)"
+        index = min(index + attempt, len(self.tiers) - 1)
+        tier = self.tiers[index]
+        return {"tier": tier["name"], "index": index, "model": tier["model"], "attempt": attempt, "reason": reason}
+
+    def escalate(self, route):
+        """The next larger tier, or None if the route is already on the largest one."""
+        if route["index"] >= len(self.tiers) - 1:
+            return None
+        tier = self.tiers[route["index"] + 1]
+        return {"tier": tier["name"], "index": route["index"] + 1, "model": tier["model"],
+                "attempt": route["attempt"] + 1, "reason": f"escalated from {route['tier']} after a failed validation"}
+
+    def cost(self, model, tokens_in, tokens_out):
+        price_in, price_out = self.prices.get(model, (0.0, 0.0))
+        return round((tokens_in * price_in + tokens_out * price_out) / 1e6, 6)
+
+    def record(self, target, route, stage, passed, latency_ms=0.0, tokens_in=0, tokens_out=0, model=None):
+        """One row per routed call; `passed` is the verdict of the validation that followed it."""
+        model = model or route["model"]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO routes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(target), route["tier"], model, route["attempt"], stage, int(bool(passed)),
+                 round(latency_ms, 3), tokens_in, tokens_out, self.cost(model, tokens_in, tokens_out), time.time()),
+            )
+
+    def stats(self):
+        """Per (tier, model, stage): calls, pass rate, mean latency and total cost."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT tier, model, stage, COUNT(*), AVG(passed), AVG(latency_ms), SUM(cost_usd) "
+                "FROM routes GROUP BY tier, model, stage ORDER BY tier, model, stage"
+            ).fetchall()
+        return [{"tier": tier, "model": model, "stage": stage, "calls": calls, "pass_rate": round(rate, 3),
+                 "mean_latency_ms": round(latency or 0.0, 1), "cost_usd": round(cost or 0.0, 4)}
+                for tier, model, stage, calls, rate, latency, cost in rows]
+
+    def close(self):
+        self._conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show per-route latency, cost and pass rate")
+    parser.add_argument("--db", default="codereaper_routes.db")
+    args = parser.parse_args(argv)
+
+    router = ModelRouter(db_path=args.db)
+    print("Tiers: " + ", ".join(f"{t['name']}={t['model']}" for t in router.tiers))
+    rows = router.stats()
+    router.close()
+    if not rows:
+        print("No routed calls recorded yet.")
+        return 0
+    columns = list(rows[0])
+    widths = {c: max([len(c)] + [len(str(r[c])) for r in rows]) for c in columns}
+    print("  ".join(c.upper().ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
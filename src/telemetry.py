@@ -0,0 +1,274 @@
+import csv
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# Column order of the CSV trace; JSONL records carry the same keys
+TRACE_FIELDS = [
+    "run_id", "span_id", "parent_id", "stage", "target", "start", "duration_ms",
+    "status", "attempt", "model", "tokens_in", "tokens_out", "attrs",
+]
+
+
+class Tracer:
+    """
+    Span-based instrumentation for the agent pipeline.
+    Every finished span (graph_build, complexity_scan, prompt_build, llm_call, guardian_check,
+    test_generation, test_run, retry, ...) is appended as one row to a CSV with a real header
+    and as one JSON object to a JSONL file, and forwarded to any extra exporters.
+    """
+
+    def __init__(self, jsonl_path="codereaper_trace.jsonl", csv_path="codereaper_trace.csv",
+                 run_id=None, exporters=None):
+        self.jsonl_path = jsonl_path
+        self.csv_path = csv_path
+        self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        self.exporters = list(exporters or [])
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def set_target(self, target):
+        """Default target for spans opened outside any parent span on this thread (e.g. llm_call)."""
+        self._local.target = target
+
+    def current_target(self):
+        return getattr(self._local, "target", None)
+
+    @contextmanager
+    def span(self, stage, target=None, **attrs):
+        """
+        Times a block. The yielded dict can be filled in while the block runs
+        (e.g. span["tokens_in"] = 120); unknown keys end up in the 'attrs' column.
+        """
+        stack = self._stack()
+        record = {
+            "run_id": self.run_id,
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": stack[-1]["span_id"] if stack else None,
+            "stage": stage,
+            "target": target if target is not None else (stack[-1]["target"] if stack else self.current_target()),
+            "start": time.time(),
+            "status": "ok",
+        }
+        record.update(attrs)
+        stack.append(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        except Exception:
+            record["status"] = "error"
+            raise
+        finally:
+            record["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            stack.pop()
+            self._emit(record)
+
+    def event(self, stage, target=None, **attrs):
+        """Zero-duration span, e.g. for retries and cache hits."""
+        with self.span(stage, target, **attrs):
+            pass
+
+    def _emit(self, record):
+        row = {k: record.get(k) for k in TRACE_FIELDS if k != "attrs"}
+        extra = {k: v for k, v in record.items() if k not in TRACE_FIELDS}
+        row["attrs"] = json.dumps(extra, default=str) if extra else ""
+        with self._lock:
+            if self.jsonl_path:
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({**row, "attrs": extra}, default=str) + "\n")
+            if self.csv_path:
+                is_new = not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) == 0
+                with open(self.csv_path, 'a', encoding='utf-8', newline='') as f:
+                    writer = csv.DictWriter(f, fieldnames=TRACE_FIELDS)
+                    if is_new:
+                        writer.writeheader()
+                    writer.writerow(row)
+        for exporter in self.exporters:
+            try:
+                exporter.export(row, extra)
+            except Exception:
+                continue
+
+
+class OpenTelemetryExporter:
+    """
+    Optional bridge to OpenTelemetry: replays each finished span through the configured
+    OTel tracer provider (so any OTLP/Jaeger/console exporter set up by the host applies).
+    Requires `opentelemetry-api` (and an SDK for actual export).
+    """
+
+    def __init__(self, service_name="codereaper"):
+        from opentelemetry import trace
+        self._tracer = trace.get_tracer(service_name)
+
+    def export(self, row, extra):
+        start_ns = int(row["start"] * 1e9)
+        attributes = {f"codereaper.{k}": v for k, v in row.items()
+                      if k not in ("stage", "start", "attrs") and v is not None}
+        attributes.update({f"codereaper.{k}": str(v) for k, v in extra.items()})
+        span = self._tracer.start_span(row["stage"], start_time=start_ns, attributes=attributes)
+        span.end(end_time=start_ns + int(row["duration_ms"] * 1e6))
+
+
+_default_tracer = None
+
+
+def get_tracer():
+    """Process-wide tracer. Set CODEREAPER_OTEL=1 to also export spans to OpenTelemetry."""
+    global _default_tracer
+    if _default_tracer is None:
+        exporters = []
+        if os.getenv("CODEREAPER_OTEL") == "1":
+            try:
+                exporters.append(OpenTelemetryExporter())
+            except ImportError:
+                pass
+        _default_tracer = Tracer(exporters=exporters)
+    return _default_tracer
+
+
+def set_tracer(tracer):
+    """Swaps the process-wide tracer (e.g. to point a batch run at its own trace files)."""
+    global _default_tracer
+    _default_tracer = tracer
+
+
+class TraceStats:
+    """
+    Incremental aggregator over the JSONL trace for the dashboard.
+    refresh() only reads bytes appended since the previous call and folds them into
+    fixed-size aggregates (log-bucket latency histograms, per-target token totals, per-run
+    counters), so memory stays flat no matter how many events have been logged.
+    """
+    BUCKETS_PER_DOUBLING = 8  # ~9% relative error on percentiles
+    PROMPT_WINDOW = 20
+
+    def __init__(self, jsonl_path="codereaper_trace.jsonl"):
+        self.jsonl_path = jsonl_path
+        self.offset = 0
+        self.events = 0
+        self.latency = {}      # stage -> {bucket: count}
+        self.tokens = {}       # target -> {"tokens_in", "tokens_out", "llm_calls"}
+        self.runs = {}         # run_id -> {"start", "end", "targets", "retries", "llm_calls"}
+        self.cache = {}        # cache name -> {"hit", "miss"}
+        self.prompts = {}      # agent -> {"calls", "first": [tokens_in], "recent": deque, "max", "history_max"}
+
+    def _bucket(self, ms):
+        return math.floor(math.log2(max(ms, 0.001)) * self.BUCKETS_PER_DOUBLING)
+
+    def _bucket_value(self, bucket):
+        return 2 ** ((bucket + 0.5) / self.BUCKETS_PER_DOUBLING)
+
+    def refresh(self, max_bytes=64 * 1024 * 1024):
+        """Folds newly appended events in (at most max_bytes per call). Returns the number of new events."""
+        if not os.path.exists(self.jsonl_path):
+            return 0
+        if os.path.getsize(self.jsonl_path) < self.offset:
+            self.__init__(self.jsonl_path)  # trace was truncated or rotated
+        added = 0
+        with open(self.jsonl_path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read(max_bytes)
+        # Only consume complete lines; a span being written right now is picked up next time
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            try:
+                self._fold(json.loads(line))
+                added += 1
+            except (ValueError, KeyError, TypeError):
+                continue
+        self.offset += end
+        self.events += added
+        return added
+
+    def _fold(self, event):
+        stage, target, attrs = event["stage"], event.get("target"), event.get("attrs") or {}
+        hist = self.latency.setdefault(stage, {})
+        bucket = self._bucket(event.get("duration_ms") or 0)
+        hist[bucket] = hist.get(bucket, 0) + 1
+
+        run = self.runs.setdefault(event["run_id"], {"start": event["start"], "end": event["start"],
+                                                     "targets": set(), "retries": 0, "llm_calls": 0})
+        run["start"] = min(run["start"], event["start"])
+        run["end"] = max(run["end"], event["start"] + (event.get("duration_ms") or 0) / 1000)
+        if target:
+            run["targets"].add(target)
+
+        if stage == "llm_call":
+            run["llm_calls"] += 1
+            totals = self.tokens.setdefault(target or "?", {"tokens_in": 0, "tokens_out": 0, "llm_calls": 0})
+            totals["tokens_in"] += event.get("tokens_in") or 0
+            totals["tokens_out"] += event.get("tokens_out") or 0
+            totals["llm_calls"] += 1
+            # Prompt size per call: the first and the latest PROMPT_WINDOW calls are enough to see growth
+            prompt = self.prompts.setdefault(attrs.get("agent", "?"), {
+                "calls": 0, "first": [], "recent": deque(maxlen=self.PROMPT_WINDOW), "max": 0, "history_max": 0})
+            tokens_in = event.get("tokens_in") or 0
+            prompt["calls"] += 1
+            if len(prompt["first"]) < self.PROMPT_WINDOW:
+                prompt["first"].append(tokens_in)
+            prompt["recent"].append(tokens_in)
+            prompt["max"] = max(prompt["max"], tokens_in)
+            prompt["history_max"] = max(prompt["history_max"], attrs.get("history_tokens") or 0)
+        elif stage == "retry":
+            run["retries"] += 1
+        elif stage == "cache_lookup":
+            counts = self.cache.setdefault(attrs.get("cache", "default"), {"hit": 0, "miss": 0})
+            counts["hit" if attrs.get("hit") else "miss"] += 1
+
+    def percentiles(self, stage, quantiles=(50, 90, 99)):
+        hist = self.latency.get(stage, {})
+        total = sum(hist.values())
+        result = {}
+        for q in quantiles:
+            rank, seen = q / 100 * total, 0
+            for bucket in sorted(hist):
+                seen += hist[bucket]
+                if seen >= rank:
+                    result[f"p{q}"] = round(self._bucket_value(bucket), 3)
+                    break
+            else:
+                result[f"p{q}"] = None
+        return result
+
+    def stage_rows(self):
+        """One row per stage: call count plus p50/p90/p99 latency in ms."""
+        return [{"stage": stage, "count": sum(hist.values()), **self.percentiles(stage)}
+                for stage, hist in sorted(self.latency.items())]
+
+    def run_rows(self):
+        """One row per run: targets, retries, LLM calls and targets/hour."""
+        rows = []
+        for run_id, run in sorted(self.runs.items(), key=lambda item: item[1]["start"]):
+            hours = max(run["end"] - run["start"], 1e-6) / 3600
+            rows.append({"run_id": run_id, "targets": len(run["targets"]), "retries": run["retries"],
+                         "llm_calls": run["llm_calls"], "targets_per_hour": round(len(run["targets"]) / hours, 2)})
+        return rows
+
+    def token_rows(self):
+        return [{"target": target, **totals} for target, totals in sorted(self.tokens.items())]
+
+    def prompt_rows(self):
+        """One row per agent: mean prompt tokens of its first vs. latest calls (growth ~1.0 = flat)."""
+        rows = []
+        for agent, prompt in sorted(self.prompts.items()):
+            first = sum(prompt["first"]) / max(len(prompt["first"]), 1)
+            recent = sum(prompt["recent"]) / max(len(prompt["recent"]), 1)
+            rows.append({"agent": agent, "llm_calls": prompt["calls"], "first_mean_tokens_in": round(first, 1),
+                         "recent_mean_tokens_in": round(recent, 1), "max_tokens_in": prompt["max"],
+                         "max_history_tokens": prompt["history_max"], "growth": round(recent / first, 3) if first else None})
+        return rows
+
+    def cache_rows(self):
+        return [{"cache": name, **counts, "hit_rate": round(counts["hit"] / max(counts["hit"] + counts["miss"], 1), 3)}
+                for name, counts in sorted(self.cache.items())]
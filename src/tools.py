@@ -1,11 +1,18 @@
 import os
+import shutil
 import subprocess
-import radon.complexity as radon_cc
-from radon.visitors import ComplexityVisitor
+import tempfile
+import sys
 import json
 import ast
-from googlesearch import search
+import hashlib
 import builtins  # IMPORT BUILTINS TO FIX THE 'list' FALSE POSITIVE
+from contextlib import contextmanager
+
+from parsing import CYTHON_EXTENSIONS, get_parser, global_usage
+
+# radon and googlesearch are imported inside the tools that use them, so modules that only
+# need the graph, the Scope Guardian or fingerprinting don't pay for them at startup.
 
 class ReaperTools:
     @staticmethod
@@ -31,26 +38,53 @@ class ReaperTools:
         try:
             with open(filepath, 'r', encoding='utf-8') as f:
                 code = f.read()
-            v = ComplexityVisitor.from_code(code)
+            parser = get_parser()
+            if parser.name == "ast" and not filepath.endswith(CYTHON_EXTENSIONS):
+                from radon.visitors import ComplexityVisitor
+                functions = ComplexityVisitor.from_code(code).functions
+                functions = [{"name": f.name, "complexity": f.complexity} for f in functions]
+            else:
+                # Cython sources (via the parsing shim) and the tree-sitter backend
+                summary = parser.parse(filepath, code, complexity=True)
+                if summary["error"] and parser.name == "ast":
+                    raise SyntaxError(summary["error"])
+                functions = summary["functions"]
             results = []
-            for func in v.functions:
+            for func in functions:
                 results.append({
-                    "name": func.name,
-                    "complexity": func.complexity,
-                    "grade": "CRITICAL" if func.complexity > 10 else "ACCEPTABLE"
+                    "name": func["name"],
+                    "complexity": func["complexity"],
+                    "grade": "CRITICAL" if func["complexity"] > 10 else "ACCEPTABLE"
                 })
             return json.dumps(results, indent=2)
         except Exception as e:
             return f"Error analyzing complexity: {str(e)}"
 
     @staticmethod
-    def run_tests(test_filepath):
+    def detect_clones(filepaths):
+        """Clone-detection stage: groups near-duplicate functions across files (see clones.CloneDetector)."""
+        try:
+            from clones import CloneDetector
+            detector = CloneDetector()
+            for filepath in filepaths:
+                detector.add_file(filepath)
+            return json.dumps(detector.report(), indent=2)
+        except Exception as e:
+            return f"Error detecting clones: {str(e)}"
+
+    @staticmethod
+    def run_tests(test_filepath, cwd=None, env=None):
+        """Runs one pytest file (or a list of them) in a single pytest process."""
+        paths = [test_filepath] if isinstance(test_filepath, str) else list(test_filepath)
         try:
             # -v for verbose, -o to disable warnings that clutter logs
             result = subprocess.run(
-                ["pytest", test_filepath, "-v", "-o", "warning_filter=ignore"],
+                # `python -m pytest` also puts cwd on sys.path, so a repo's own tests can import its packages
+                [sys.executable, "-m", "pytest", *paths, "-v", "-o", "warning_filter=ignore"],
                 capture_output=True,
-                text=True
+                text=True,
+                cwd=cwd,
+                env=env
             )
             if result.returncode == 0:
                 return f"TESTS PASSED:\n{result.stdout}"
@@ -59,9 +93,51 @@ class ReaperTools:
         except Exception as e:
             return f"Error running tests: {str(e)}"
 
+    @staticmethod
+    def run_tests_parallel(test_filepaths, workers=4, cwd=None, env=None):
+        """
+        Runs pytest files concurrently: the files are split round-robin into at most
+        `workers` pytest processes. Returns (all_passed, [run_tests output per process]).
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        test_filepaths = list(test_filepaths)
+        if not test_filepaths:
+            return True, []
+        groups = [test_filepaths[i::workers] for i in range(min(workers, len(test_filepaths)))]
+        with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+            outputs = list(pool.map(lambda group: ReaperTools.run_tests(group, cwd, env), groups))
+        return all(out.startswith("TESTS PASSED") for out in outputs), outputs
+
+    @staticmethod
+    @contextmanager
+    def staged_file(filepath, content):
+        """
+        Stages `content` (e.g. the refactor under test) for `filepath` without touching the file:
+        yields the environment for pytest subprocesses in which importing that module loads the
+        staged code (see reaper_overlay.py). A crash mid-run, or other targets' tests running in
+        parallel, never see unverified code on disk.
+        """
+        overlay = tempfile.mkdtemp(prefix="reaper_overlay_")
+        try:
+            # The staged copy lives in a subfolder, off the import path
+            staged = os.path.join(overlay, "staged", os.path.basename(filepath))
+            os.makedirs(os.path.dirname(staged))
+            with open(staged, 'w', encoding='utf-8') as f:
+                f.write(content)
+            shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "reaper_overlay.py"), overlay)
+            env = dict(os.environ)
+            env["PYTHONPATH"] = os.pathsep.join(filter(None, [overlay, env.get("PYTHONPATH")]))
+            env["PYTEST_PLUGINS"] = ",".join(filter(None, [env.get("PYTEST_PLUGINS"), "reaper_overlay"]))
+            env["CODEREAPER_OVERLAY"] = json.dumps({os.path.realpath(filepath): staged})
+            yield env
+        finally:
+            shutil.rmtree(overlay, ignore_errors=True)
+
     @staticmethod
     def google_search_tool(query):
         try:
+            from googlesearch import search
             results = []
             for result in search(query, num_results=3, advanced=True):
                 results.append(f"Title: {result.title}\nDescription: {result.description}\nURL: {result.url}")
@@ -69,6 +145,48 @@ class ReaperTools:
         except Exception as e:
             return f"Search failed: {str(e)}"
 
+    @staticmethod
+    def ast_fingerprint(code_string, rename_locals=True):
+        """
+        Hash of the normalised AST: docstrings, annotations and formatting are ignored,
+        and (with rename_locals) function-local variables are alpha-renamed, so
+        copy-pasted functions that only differ in local names hash identically.
+        Returns None if the code does not parse.
+        """
+        try:
+            tree = _FingerprintNormalizer(rename_locals).visit(ast.parse(code_string))
+        except SyntaxError:
+            return None
+        return hashlib.sha256(ast.dump(tree, annotate_fields=False).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def alpha_fingerprint(code_string):
+        """
+        Like ast_fingerprint, but with EVERY identifier alpha-renamed (function names,
+        args, globals), so clones that only differ in naming collide.
+        Returns (hash, original_names_in_canonical_order) or (None, []).
+        """
+        normalizer = _FingerprintNormalizer(alpha=True)
+        try:
+            tree = normalizer.visit(ast.parse(code_string))
+        except SyntaxError:
+            return None, []
+        return hashlib.sha256(ast.dump(tree, annotate_fields=False).encode("utf-8")).hexdigest(), normalizer.names
+
+    @staticmethod
+    def function_fingerprints(code_string):
+        """Returns {function_name: fingerprint} for every function in the code."""
+        try:
+            tree = ast.parse(code_string)
+        except SyntaxError:
+            return {}
+        fingerprints = {}
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                normalized = _FingerprintNormalizer(rename_locals=True).visit(node)
+                fingerprints[node.name] = hashlib.sha256(ast.dump(normalized, annotate_fields=False).encode("utf-8")).hexdigest()
+        return fingerprints
+
     @staticmethod
     def validate_syntax(code_string):
         try:
@@ -77,6 +195,99 @@ class ReaperTools:
         except SyntaxError as e:
             return False, f"Syntax Error: {e}"
 
+_BUILTIN_NAMES = frozenset(dir(builtins))
+
+
+class _FingerprintNormalizer(ast.NodeTransformer):
+    """
+    Strips docstrings/annotations and renames function locals to v0, v1, ... in order of first use.
+    Bare annotations (`x: int`) and annotated class attributes are kept: they declare fields
+    (dataclasses, NamedTuple, pydantic), so dropping them would merge different classes.
+    With alpha=True every non-builtin identifier (functions, classes, args, globals) is
+    renamed to n0, n1, ... instead; `self.names` keeps the originals in canonical order.
+    """
+
+    def __init__(self, rename_locals=True, alpha=False, keep=frozenset()):
+        self.rename_locals = rename_locals
+        self.alpha = alpha
+        self.keep = keep  # locals that must keep their names (e.g. shared with a closure)
+        self.alpha_map = {}
+        self.scopes = []
+        self.blocks = []  # "class" / "function" for each enclosing definition
+
+    @property
+    def names(self):
+        return list(self.alpha_map)
+
+    def _alpha(self, name):
+        if name in _BUILTIN_NAMES:
+            return name
+        return self.alpha_map.setdefault(name, f"n{len(self.alpha_map)}")
+
+    def _strip_docstring(self, node):
+        body = node.body
+        if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                and isinstance(body[0].value.value, str):
+            node.body = body[1:] or [ast.Pass()]
+
+    def visit_Module(self, node):
+        self._strip_docstring(node)
+        return self.generic_visit(node)
+
+    def visit_ClassDef(self, node):
+        self._strip_docstring(node)
+        if self.alpha:
+            node.name = self._alpha(node.name)
+        self.blocks.append("class")
+        self.generic_visit(node)
+        self.blocks.pop()
+        return node
+
+    def visit_FunctionDef(self, node):
+        self._strip_docstring(node)
+        node.returns = None
+        if self.alpha:
+            node.name = self._alpha(node.name)
+        for arg in node.args.posonlyargs + node.args.args + node.args.kwonlyargs:
+            arg.annotation = None
+            if self.alpha:
+                arg.arg = self._alpha(arg.arg)
+        for arg in (node.args.vararg, node.args.kwarg):
+            if arg is not None:
+                arg.annotation = None
+                if self.alpha:
+                    arg.arg = self._alpha(arg.arg)
+        # Only names assigned in this function are local; args keep their names
+        # because callers may pass them by keyword.
+        local_names = {
+            n.id for n in ast.walk(node)
+            if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store)
+        } - self.keep
+        self.scopes.append({"locals": local_names, "mapping": {}})
+        self.blocks.append("function")
+        self.generic_visit(node)
+        self.blocks.pop()
+        self.scopes.pop()
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_AnnAssign(self, node):
+        if node.value is None or (self.blocks and self.blocks[-1] == "class"):
+            return self.generic_visit(node)
+        return self.visit(ast.Assign(targets=[node.target], value=node.value))
+
+    def visit_Name(self, node):
+        if self.alpha:
+            node.id = self._alpha(node.id)
+        elif self.rename_locals and self.scopes:
+            scope = self.scopes[-1]
+            if node.id in scope["locals"]:
+                mapping = scope["mapping"]
+                node.id = mapping.setdefault(node.id, f"v{len(mapping)}")
+        return node
+
+
 class GlobalScopeGuardian:
     """
     Research Module: Addresses 'Edge Case II: Scope Shadowing'.
@@ -84,51 +295,34 @@ class GlobalScopeGuardian:
     """
     
     @staticmethod
-    def get_global_usage(code_str):
-        """Returns a set of variable names that are used but not defined locally."""
+    def get_global_usage(code_str, path=None):
+        """
+        Returns a set of variable names that are used but not defined locally.
+        `path` names the file the code belongs to: it picks the dialect (.pyx goes through
+        the Cython shim) and lets the tree-sitter backend re-parse it incrementally.
+        """
         try:
-            tree = ast.parse(code_str)
-            used_names = set()
-            assigned_names = set()
-            defined_funcs_classes = set() # Track functions/classes defined at top level
-
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Name):
-                    if isinstance(node.ctx, ast.Load):
-                        used_names.add(node.id)
-                    elif isinstance(node.ctx, ast.Store):
-                        assigned_names.add(node.id)
-                elif isinstance(node, ast.arg):
-                    assigned_names.add(node.arg)
-                # FIX 1: Track function and class definitions so recursion isn't flagged
-                elif isinstance(node, ast.FunctionDef):
-                    defined_funcs_classes.add(node.name)
-                elif isinstance(node, ast.ClassDef):
-                    defined_funcs_classes.add(node.name)
-            
+            summary = get_parser().parse(path, code_str)
+            if summary["error"]:
+                return set()
             # Globals are used but not assigned locally, AND not defined as functions/classes
-            potential_globals = used_names - assigned_names - defined_funcs_classes
-            
-            # FIX 2: Robust Builtin Filter (Fixes the 'list' error)
-            builtin_names = set(dir(builtins))
-            return potential_globals - builtin_names
+            # (FIX 1: recursion isn't flagged; FIX 2: builtins such as 'list' are filtered)
+            return global_usage(summary)
         except Exception:
             return set()
 
     @staticmethod
-    def verify_refactor(original_code, new_code):
-        original_globals = GlobalScopeGuardian.get_global_usage(original_code)
-        new_globals = GlobalScopeGuardian.get_global_usage(new_code)
-        
+    def verify_refactor(original_code, new_code, path=None):
+        original_globals = GlobalScopeGuardian.get_global_usage(original_code, path)
         try:
-            new_tree = ast.parse(new_code)
-            new_args = set()
-            for node in ast.walk(new_tree):
-                if isinstance(node, ast.FunctionDef):
-                    for arg in node.args.args:
-                        new_args.add(arg.arg)
-        except:
+            # Parsed under the same path, so only the region the refactor touched is re-parsed
+            new_summary = get_parser().parse(path, new_code)
+        except Exception:
+            new_summary = {"error": "unparseable"}
+        if new_summary["error"]:
             return False, "Syntax Error in New Code"
+        new_globals = global_usage(new_summary)
+        new_args = new_summary["args"]
 
         missing_vars = []
         for var in original_globals:
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+class ScriptedAgent:
+    """Stands in for an LLM agent: answers prompts from a fixed script, in order."""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    def send_message(self, prompt):
+        self.prompts.append(prompt)
+        return self.answers.pop(0)
+
+
+@pytest.fixture
+def make_pipeline(tmp_path):
+    """Builds a ReaperPipeline whose state lives in tmp_path and whose agents follow a script."""
+    from memory import MemoryBank, CheckpointJournal
+    from pipeline import ReaperPipeline
+    from research import get_research_backend
+
+    def build(surgeon=(), executioner=(), **kwargs):
+        agents = {"surgeon": ScriptedAgent(surgeon), "executioner": ScriptedAgent(executioner)}
+        pipeline = ReaperPipeline(
+            memory=MemoryBank(str(tmp_path / "memory.db"), legacy_path=str(tmp_path / "none.json")),
+            journal=CheckpointJournal(str(tmp_path / "journal.jsonl")),
+            research=get_research_backend(db_path=str(tmp_path / "knowledge.db")),
+            agent_factories={role: (lambda agent=agent: agent) for role, agent in agents.items()},
+            **{"router": False, "coverage_gate": False, **kwargs},
+        )
+        pipeline.scripted = agents
+        return pipeline
+
+    return build
@@ -0,0 +1,38 @@
+import re
+
+from benchmark import generate_repo
+
+
+def _imported(repo):
+    counts = [0] * len(repo["modules"])
+    for path in repo["modules"]:
+        with open(path, encoding="utf-8") as f:
+            for dep in re.findall(r"^from mod_(\d+) import", f.read(), re.M):
+                counts[int(dep)] += 1
+    return counts
+
+
+def test_fan_in_follows_module_rank(tmp_path):
+    repo = generate_repo(str(tmp_path), 500, test_ratio=0)
+    fan_in = repo["fan_in"]
+    assert fan_in == _imported(repo)
+    mean = sum(fan_in) / len(fan_in)
+    # A few hubs, a long tail: the top module is imported far more than average
+    assert max(fan_in) > 20 * mean
+    assert fan_in[0] == max(fan_in)
+    assert sum(1 for n in fan_in if n == 0) > len(fan_in) // 2
+
+
+def test_imports_point_backwards_without_duplicates(tmp_path):
+    repo = generate_repo(str(tmp_path), 200, imports_per_file=3, test_ratio=0)
+    for index, path in enumerate(repo["modules"]):
+        with open(path, encoding="utf-8") as f:
+            deps = [int(d) for d in re.findall(r"^from mod_(\d+) import", f.read(), re.M)]
+        assert len(deps) == len(set(deps)) == min(3, index)
+        assert all(dep < index for dep in deps)
+
+
+def test_generation_is_deterministic(tmp_path):
+    first = generate_repo(str(tmp_path / "a"), 100, seed=7)
+    second = generate_repo(str(tmp_path / "b"), 100, seed=7)
+    assert first["fan_in"] == second["fan_in"]
@@ -0,0 +1,90 @@
+import json
+import multiprocessing
+
+from memory import CheckpointJournal
+
+CLASS_MODULE = (
+    "class Acc:\n"
+    "    def add(self, xs):\n"
+    "        total = 0\n"
+    "        for x in xs:\n"
+    "            total = total + x\n"
+    "        return total\n"
+)
+REFACTORED = "```python\nclass Acc:\n    def add(self, xs):\n        return sum(xs)\n```"
+
+
+def test_replay_restores_stage_and_data(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = CheckpointJournal(path)
+    journal.record("a.py", "started", {"code_before": "x = 1"})
+    journal.record("a.py", "refactored", {"new_code": "x = 2"})
+
+    replayed = CheckpointJournal(path).get("a.py")
+    assert replayed["stage"] == "refactored"
+    assert replayed["data"] == {"code_before": "x = 1", "new_code": "x = 2"}
+
+
+def test_restart_drops_previous_run_data(tmp_path):
+    journal = CheckpointJournal(str(tmp_path / "journal.jsonl"))
+    journal.record("a.py", "started", {"code_before": "old"})
+    journal.record("a.py", "refactored", {"new_code": "stale"})
+    journal.record("a.py", "started", {"code_before": "new"})
+    assert journal.get("a.py")["data"] == {"code_before": "new"}
+
+
+def test_failed_targets_are_retried(tmp_path):
+    journal = CheckpointJournal(str(tmp_path / "journal.jsonl"))
+    journal.record("done.py", "complete", {"tests_passed": True})
+    journal.record("broken.py", "failed", {"reason": "tests failed"})
+    journal.record("legacy.py", "complete", {"tests_passed": False})
+    assert journal.pending(["done.py", "broken.py", "legacy.py", "new.py"]) == ["broken.py", "legacy.py", "new.py"]
+
+
+def test_torn_last_line_is_skipped_and_terminated(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text(json.dumps({"timestamp": 1, "target": "a.py", "stage": "started", "data": {}}) + "\n"
+                    + '{"timestamp": 2, "target": "a.py", "sta')
+    journal = CheckpointJournal(str(path))
+    assert journal.get("a.py")["stage"] == "started"
+    journal.record("a.py", "complete", {"tests_passed": True})
+    assert CheckpointJournal(str(path)).is_complete("a.py")
+
+
+def _append_many(path, writer, payload_size, count):
+    journal = CheckpointJournal(path)
+    for i in range(count):
+        journal.record(f"{writer}.py", "refactored", {"new_code": str(i) * payload_size})
+
+
+def test_concurrent_writers_never_interleave(tmp_path):
+    # Payloads well above any stdio buffer size
+    path = str(tmp_path / "journal.jsonl")
+    writers = [multiprocessing.Process(target=_append_many, args=(path, w, 100_000, 20)) for w in range(4)]
+    for p in writers:
+        p.start()
+    for p in writers:
+        p.join()
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 80
+    assert all(json.loads(line)["stage"] == "refactored" for line in lines)
+
+
+def test_pipeline_journals_failed_tests_as_failed(tmp_path, make_pipeline):
+    target = tmp_path / "repo" / "pkg" / "mod.py"
+    target.parent.mkdir(parents=True)
+    target.write_text(CLASS_MODULE)
+    failing_test = (
+        "import sys, os\n"
+        "sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))\n"
+        "from mod import Acc\n"
+        "def test_add():\n"
+        "    assert Acc().add([1, 2]) == 4\n"
+    )
+    pipeline = make_pipeline(surgeon=[REFACTORED], executioner=[failing_test])
+
+    result = pipeline.run(str(target))
+    assert result["tests_passed"] is False
+    assert pipeline.journal.get(str(target))["stage"] == "failed"
+    assert pipeline.journal.pending([str(target)]) == [str(target)]
@@ -0,0 +1,78 @@
+import time
+
+from clones import CloneDetector, fan_out, rename_identifiers
+
+
+def near_identical(n):
+    """n functions that only differ in a constant: every one of them lands in the same LSH buckets."""
+    return "\n".join(
+        f"def f{i}(xs):\n    total = 0\n    for x in xs:\n        if x > {i}:\n            total += x * {i}\n"
+        f"    return total\n"
+        for i in range(n)
+    )
+
+
+def test_alpha_clones_cluster_and_differ_from_unrelated_code():
+    detector = CloneDetector()
+    detector.add_code(
+        "def a(xs):\n    t = 0\n    for x in xs:\n        t += x\n    return t\n\n"
+        "def b(ys):\n    s = 0\n    for y in ys:\n        s += y\n    return s\n\n"
+        "def c(path):\n    with open(path) as f:\n        return f.read().split(',')\n"
+    )
+    [cluster] = detector.report()
+    assert cluster["exact"] is True
+    assert cluster["representative"].endswith(":a:1") and cluster["clones"][0].endswith(":b:7")
+
+
+def test_bucket_compares_beyond_its_first_member():
+    detector = CloneDetector(threshold=0.6)
+    detector.add_code("def first(path):\n    with open(path) as f:\n        return [line.strip() for line in f]\n")
+    detector.add_code(near_identical(2))
+    # f0 and f1 only differ in a constant: they must cluster even if an unrelated function came first
+    assert any({"f0", "f1"} <= {m["name"] for m in [c["representative"], *c["members"]]}
+               for c in detector.clusters())
+
+
+def test_comparisons_per_insert_are_bounded():
+    detector = CloneDetector()
+    calls = []
+    similarity = detector.similarity
+    detector.similarity = lambda a, b: calls.append(1) or similarity(a, b)
+    detector.add_code(near_identical(2000))
+    assert len(detector.clusters()) == 1
+    assert len(calls) <= 2000 * detector.bands * detector.max_bucket
+
+
+def test_indexing_scales_linearly():
+    def index(n):
+        code = near_identical(n)
+        started = time.perf_counter()
+        CloneDetector().add_code(code)
+        return time.perf_counter() - started
+
+    small, large = index(1000), index(4000)
+    # Linear is 4x; a pairwise scan within buckets was 16x
+    assert large < small * 8
+
+
+def test_fan_out_keeps_keyword_arguments():
+    before = "def f(xs, key):\n    return sorted(list(xs), key=key)\n"
+    after = "def f(xs, key):\n    return sorted(xs, key=key)\n"
+    clone = "def g(ys, k):\n    return sorted(list(ys), key=k)\n"
+    assert fan_out(before, after, clone) == "def g(ys, k):\n    return sorted(ys, key=k)\n"
+
+
+def test_rename_identifiers_leaves_attributes_and_comments():
+    code = "obj.total = total  # total\n"
+    assert rename_identifiers(code, {"total": "count"}) == "obj.total = count  # total\n"
+
+
+def test_schedule_defers_files_whose_functions_all_have_representatives_elsewhere(tmp_path):
+    body = "    t = 0\n    for x in xs:\n        t += x\n    return t\n"
+    first, second = tmp_path / "a.py", tmp_path / "b.py"
+    first.write_text("def a(xs):\n" + body)
+    second.write_text("def b(xs):\n" + body)
+    detector = CloneDetector()
+    detector.add_file(str(first))
+    detector.add_file(str(second))
+    assert detector.schedule([str(second), str(first)]) == ([str(first)], [str(second)])
@@ -0,0 +1,50 @@
+import pipeline as pipeline_module
+from coverage_gate import CoverageGate, changed_lines, run_with_coverage
+
+BEFORE = "def f(x):\n    return x\n"
+AFTER = "def f(x):\n    if x:\n        return 1\n    return 0\n"
+
+
+def test_changed_lines_are_the_replaced_and_inserted_ones():
+    assert changed_lines(BEFORE, AFTER) == {2, 3, 4}
+
+
+def test_check_rejects_unexercised_changed_lines():
+    gate = CoverageGate(threshold=0.7)
+    accepted, report = gate.check(BEFORE, AFTER, {"lines": [2, 3], "branches": {"2": 1}})
+    assert not accepted
+    assert report["changed"]["missing"] == [4]
+    assert "Unexercised changed lines: 4" in CoverageGate.describe(report)
+
+    accepted, report = gate.check(BEFORE, AFTER, {"lines": [2, 3, 4], "branches": {"2": 2}})
+    assert accepted
+    assert report["changed"]["line_rate"] == 1.0
+
+
+def test_pipeline_measures_coverage_once_per_target(tmp_path, make_pipeline, monkeypatch):
+    target = tmp_path / "repo" / "pkg" / "mod.py"
+    target.parent.mkdir(parents=True)
+    target.write_text("class Acc:\n    def add(self, xs):\n        total = 0\n        for x in xs:\n"
+                      "            total = total + x\n        return total\n")
+    refactored = "```python\nclass Acc:\n    def add(self, xs):\n        return sum(xs)\n```"
+    generated_test = (
+        "import sys, os\n"
+        "sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))\n"
+        "from mod import Acc\n"
+        "def test_add():\n"
+        "    assert Acc().add([1, 2]) == 3\n"
+    )
+    runs = []
+
+    def counting_run(*args, **kwargs):
+        runs.append(args[0])
+        return run_with_coverage(*args, **kwargs)
+
+    monkeypatch.setattr(pipeline_module, "run_with_coverage", counting_run)
+    pipeline = make_pipeline(surgeon=[refactored], executioner=[generated_test],
+                             coverage_gate=CoverageGate(threshold=0.7, workers=1))
+
+    result = pipeline.run(str(target))
+    assert result["tests_passed"] is True
+    assert result["coverage"]["changed"]["line_rate"] == 1.0
+    assert len(runs) == 1
@@ -0,0 +1,51 @@
+from differential import DifferentialTester
+
+LOOP_SUM = (
+    "def total(xs: list[int]) -> int:\n"
+    "    acc = 0\n"
+    "    for x in xs:\n"
+    "        acc = acc + x\n"
+    "    return acc\n"
+)
+
+
+def run(original, refactored):
+    return DifferentialTester(max_cases=20, workers=1).run(original, refactored)
+
+
+def test_equivalent_refactor():
+    report = run(LOOP_SUM, "def total(xs: list[int]) -> int:\n    return sum(xs)\n")
+    assert report["verdict"] == "equivalent"
+    assert report["mismatches"] == []
+
+
+def test_changed_return_value_is_different():
+    report = run(LOOP_SUM, "def total(xs: list[int]) -> int:\n    return sum(xs) + 1\n")
+    assert report["verdict"] == "different"
+    assert report["mismatches"][0]["function"] == "total"
+
+
+def test_removed_public_function_is_different():
+    report = run(LOOP_SUM + "\ndef size(xs):\n    return len(xs)\n", LOOP_SUM)
+    assert report["verdict"] == "different"
+    assert report["mismatches"][0]["reason"] == "public function removed"
+
+
+def test_changed_method_is_never_equivalent():
+    # The top-level function is unchanged and passes; the method behind it is not tested
+    original = LOOP_SUM + "\nclass Acc:\n    def add(self, xs):\n        return sum(xs)\n"
+    refactored = LOOP_SUM + "\nclass Acc:\n    def add(self, xs):\n        return sum(xs) + 1\n"
+    report = run(original, refactored)
+    assert report["verdict"] == "inconclusive"
+    assert any("outside top-level functions" in s for s in report["skipped"])
+
+
+def test_added_import_alone_stays_equivalent():
+    refactored = "from functools import reduce\n\ndef total(xs: list[int]) -> int:\n" \
+                 "    return reduce(lambda a, b: a + b, xs, 0)\n"
+    assert run(LOOP_SUM, refactored)["verdict"] == "equivalent"
+
+
+def test_summary_only_says_passed_when_equivalent():
+    different = run(LOOP_SUM, "def total(xs: list[int]) -> int:\n    return 0\n")
+    assert "passed" not in DifferentialTester.summary(different).lower()
@@ -0,0 +1,46 @@
+from equivalence import precheck
+
+
+def test_renamed_local_is_normalized():
+    original = "def f(xs):\n    total = 0\n    for x in xs:\n        total += x\n    return total\n"
+    refactored = "def f(xs):\n    acc = 0\n    for x in xs:\n        acc += x\n    return acc\n"
+    assert precheck(original, refactored) == {
+        "verdict": "equivalent", "level": "normalized",
+        "reason": "Only docstrings, type hints, formatting or local variable names changed.",
+    }
+
+
+def test_renaming_a_closed_over_local_is_not_equivalent():
+    original = (
+        "def outer():\n"
+        "    total = 1\n"
+        "    def inner():\n"
+        "        return total\n"
+        "    return inner()\n"
+    )
+    # inner() still reads `total`, which no longer exists: NameError at runtime
+    refactored = original.replace("    total = 1", "    count = 1")
+    assert precheck(original, refactored)["verdict"] == "different"
+
+
+def test_renaming_a_declared_global_is_not_equivalent():
+    original = "total = 0\n\ndef bump():\n    global total\n    total = 1\n"
+    refactored = "total = 0\n\ndef bump():\n    global total\n    count = 1\n"
+    assert precheck(original, refactored)["verdict"] == "different"
+
+
+def test_nonlocal_without_binding_is_rejected():
+    original = (
+        "def counter():\n"
+        "    n = 0\n"
+        "    def step():\n"
+        "        nonlocal n\n"
+        "        n += 1\n"
+        "        return n\n"
+        "    return step\n"
+    )
+    # `nonlocal n` has no enclosing binding any more: SyntaxError on import
+    refactored = original.replace("    n = 0", "    m = 0")
+    result = precheck(original, refactored)
+    assert result["verdict"] == "unparseable"
+    assert "nonlocal" in result["reason"]
@@ -0,0 +1,77 @@
+from extraction import StreamingExtractor, extract_code, request_code
+
+HELPER_THEN_MAIN = (
+    "First a small helper:\n"
+    "```python\n"
+    "def _helper(x):\n"
+    "    return x * 2\n"
+    "```\n"
+    "And the refactored function that uses it:\n"
+    "```python\n"
+    "def process(xs):\n"
+    "    return [_helper(x) for x in xs]\n"
+    "```\n"
+    "Example:\n"
+    "```python\n"
+    "print(process([1, 2]))\n"
+    "```\n"
+)
+
+
+def stream(text, size=7):
+    extractor = StreamingExtractor()
+    stopped = False
+    for start in range(0, len(text), size):
+        if extractor.feed(text[start:start + size]):
+            stopped = True
+            break
+    return extractor, stopped
+
+
+def test_extract_code_merges_helper_and_main_block():
+    code, problem = extract_code(HELPER_THEN_MAIN)
+    assert problem is None
+    assert "def _helper" in code and "def process" in code
+    assert "print(" not in code
+
+
+def test_streaming_reads_every_block_and_merges_them():
+    extractor, stopped = stream(HELPER_THEN_MAIN)
+    assert not stopped
+    assert len(extractor.blocks) == 2
+    assert extractor.result() == extract_code(HELPER_THEN_MAIN)
+
+
+def test_redefined_block_supersedes_the_earlier_draft():
+    text = ("```python\ndef f():\n    return 1\n```\nOops, fixed:\n"
+            "```python\ndef f():\n    return 2\n```")
+    for code, problem in (extract_code(text), stream(text)[0].result()):
+        assert problem is None
+        assert code == "def f():\n    return 2"
+
+
+def test_closing_fence_without_trailing_newline():
+    extractor, _ = stream("```python\ndef f():\n    return 1\n```")
+    assert extractor.result() == ("def f():\n    return 1", None)
+
+
+def test_prose_only_response_stops_early_and_is_rejected():
+    extractor, stopped = stream("I'm sorry, I can't help with that. " * 60)
+    assert stopped
+    code, problem = extractor.result()
+    assert code == "" and "no Python code" in problem
+
+
+def test_request_code_streams_the_whole_answer():
+    class StreamingAgent:
+        supports_streaming = True
+
+        def send_message(self, prompt, on_chunk=None):
+            for start in range(0, len(HELPER_THEN_MAIN), 5):
+                if on_chunk(HELPER_THEN_MAIN[start:start + 5]):
+                    return HELPER_THEN_MAIN[:start + 5]
+            return HELPER_THEN_MAIN
+
+    code, problem, raw = request_code(StreamingAgent(), "refactor")
+    assert raw == HELPER_THEN_MAIN
+    assert problem is None and "def process" in code and "def _helper" in code
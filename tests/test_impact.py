@@ -0,0 +1,50 @@
+import os
+
+from cli import impact_score, select_targets
+from repo_tools import DependencyGraph
+
+
+def build(tmp_path, files):
+    for name, source in files.items():
+        (tmp_path / name).write_text(source)
+    graph = DependencyGraph(str(tmp_path))
+    return graph, {name: os.path.abspath(str(tmp_path / name)) for name in files}
+
+
+def brute_force_reachable(graph, path):
+    return len(graph.get_transitive_dependents(path))
+
+
+def test_cycle_is_condensed_into_one_component(tmp_path):
+    # a <-> b form a cycle; c imports a; d imports c; e is standalone
+    graph, p = build(tmp_path, {"a.py": "import b\n", "b.py": "import a\n", "c.py": "import a\n",
+                                "d.py": "import c\n", "e.py": ""})
+    a, c, d, e = (graph.impact(p[n]) for n in ("a.py", "c.py", "d.py", "e.py"))
+    assert a["cycle"] == graph.impact(p["b.py"])["cycle"] == 2
+    assert a["dependents"] == 2          # b and c
+    assert a["reachable"] == 3           # b, c, d
+    assert a["depth"] == 2               # d -> c -> {a, b}
+    assert d["dependencies"] == 3 and d["reachable"] == 0
+    assert c["cycle"] == 1 and c["reachable"] == 1 and c["dependencies"] == 2
+    assert e == {"dependents": 0, "reachable": 0, "dependencies": 0, "depth": 0, "cycle": 1, "centrality": 0.0}
+
+
+def test_reachable_matches_a_graph_walk_on_a_long_chain(tmp_path):
+    # Deep enough that a recursive Tarjan would hit the recursion limit
+    files = {f"m{i:04d}.py": f"import m{i + 1:04d}\n" for i in range(1500)}
+    files["m1500.py"] = "import m0000\n"   # closes one big cycle
+    files["top.py"] = "import m0750\n"
+    graph, p = build(tmp_path, files)
+    impact = graph.impact(p["m0000.py"])
+    assert impact["cycle"] == 1501
+    assert impact["reachable"] == brute_force_reachable(graph, p["m0000.py"]) == 1501
+    assert graph.impact(p["top.py"])["dependencies"] == 1501
+
+
+def test_impact_ranking_prefers_low_risk_targets():
+    leaf = {"file": "leaf.py", "max_complexity": 12, "reachable": 0, "cycle": 1}
+    hub = {"file": "hub.py", "max_complexity": 14, "reachable": 200, "cycle": 1}
+    cyclic = {"file": "cyclic.py", "max_complexity": 12, "reachable": 0, "cycle": 3}
+    assert impact_score(leaf) > impact_score(cyclic)
+    assert [s["file"] for s in select_targets([hub, cyclic, leaf], rank="impact")] == ["leaf.py", "cyclic.py", "hub.py"]
+    assert [s["file"] for s in select_targets([hub, cyclic, leaf])][0] == "hub.py"
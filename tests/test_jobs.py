@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import jobs
+from jobs import JobQueue, worker_name
+
+JOBS_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(jobs.__file__)), "jobs.py")
+
+
+def test_claim_records_the_worker(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    job_id = queue.enqueue("a.py")
+    job = queue.claim("host:1:2")
+    assert job["id"] == job_id
+    assert queue.get(job_id)["status"] == "running"
+    assert queue.get(job_id)["worker"] == "host:1:2"
+
+
+def test_requeue_worker_only_touches_that_pool(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    ids = [queue.enqueue(f"{n}.py") for n in "abcd"]
+    queue.claim("host:10:11")
+    queue.claim("host:10:12")
+    queue.claim("host:100:13")  # another pool whose id merely starts with the same digits
+    queue.claim("host:10")      # a standalone worker with the pool's own id
+
+    assert queue.requeue_worker("host:10") == 3
+    assert [queue.get(i)["status"] for i in ids] == ["queued", "queued", "running", "queued"]
+    assert queue.get(ids[0])["worker"] is None
+
+
+def test_worker_name_nests_under_the_pool():
+    assert worker_name(pid=42) == f"{worker_name(pid=7)[:-1]}42"
+    assert worker_name(pid=42, pool_id="host:7") == "host:7:42"
+
+
+def test_terminated_pool_requeues_its_running_jobs(tmp_path):
+    db = str(tmp_path / "jobs.db")
+    queue = JobQueue(db)
+    job_id = queue.enqueue("a.py")
+    queue.claim("placeholder")  # claimed before the pool starts, so its worker can't take it
+    pool = subprocess.Popen([sys.executable, JOBS_SCRIPT, "--db", db, "--workers", "1"],
+                            cwd=str(tmp_path), stdout=subprocess.PIPE, text=True)
+    try:
+        assert "Starting" in pool.stdout.readline()
+        # Stand-in for a job one of the pool's workers is in the middle of
+        with sqlite3.connect(db) as conn:
+            conn.execute("UPDATE jobs SET worker = ? WHERE id = ?", (worker_name(pid=pool.pid) + ":1", job_id))
+        assert queue.get(job_id)["status"] == "running"
+    finally:
+        pool.terminate()
+        pool.wait(timeout=30)
+    assert queue.get(job_id)["status"] == "queued"
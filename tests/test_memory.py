@@ -0,0 +1,81 @@
+from memory import MemoryBank
+from tools import ReaperTools
+
+ORIGINAL = (
+    "def total(xs):\n"
+    "    result = 0\n"
+    "    for x in xs:\n"
+    "        result = result + x\n"
+    "    return result\n"
+)
+REFACTORED = "def total(xs):\n    return sum(xs)\n"
+
+
+def make_bank(tmp_path):
+    return MemoryBank(str(tmp_path / "memory.db"), legacy_path=str(tmp_path / "none.json"))
+
+
+def test_dataclass_fields_change_the_fingerprint():
+    two = "from dataclasses import dataclass\n\n@dataclass\nclass P:\n    x: int\n    y: int\n"
+    one = "from dataclasses import dataclass\n\n@dataclass\nclass P:\n    x: int\n"
+    assert ReaperTools.ast_fingerprint(two, rename_locals=False) != ReaperTools.ast_fingerprint(one, rename_locals=False)
+
+
+def test_type_hints_and_docstrings_do_not_change_the_fingerprint():
+    hinted = 'def f(a: int) -> int:\n    """Doc."""\n    y: int = a\n    return y\n'
+    plain = "def f(a):\n    z = a\n    return z\n"
+    assert ReaperTools.ast_fingerprint(hinted) == ReaperTools.ast_fingerprint(plain)
+
+
+def test_exact_and_structural_reuse(tmp_path):
+    bank = make_bank(tmp_path)
+    assert bank.find_refactor(ORIGINAL) is None
+    bank.record_refactor("a.py", ORIGINAL, REFACTORED, "a_test.py", "TESTS PASSED")
+
+    assert bank.find_refactor(ORIGINAL + "\n# comment\n")["match"] == "exact"
+    renamed_local = ORIGINAL.replace("result", "acc")
+    hit = bank.find_refactor(renamed_local)
+    assert hit["match"] == "structural" and hit["final_code"] == REFACTORED
+    bank.close()
+
+
+def test_alpha_clone_reuse_renames_the_result(tmp_path):
+    bank = make_bank(tmp_path)
+    bank.record_refactor("a.py", ORIGINAL, REFACTORED, "a_test.py", "TESTS PASSED")
+    hit = bank.find_refactor(ORIGINAL.replace("total", "grand").replace("xs", "values"))
+    assert hit["match"] == "alpha-clone"
+    assert hit["final_code"] == "def grand(values):\n    return sum(values)\n"
+    bank.close()
+
+
+def test_different_dataclass_is_not_reused(tmp_path):
+    bank = make_bank(tmp_path)
+    two = "from dataclasses import dataclass\n\n@dataclass\nclass P:\n    x: int\n    y: int\n"
+    bank.record_refactor("a.py", two, two + "\n", None, "TESTS PASSED")
+    assert bank.find_refactor(two.replace("    y: int\n", "")) is None
+    bank.close()
+
+
+def test_per_function_reuse_across_files(tmp_path):
+    bank = make_bank(tmp_path)
+    other = "def double(xs):\n    out = []\n    for x in xs:\n        out.append(x * 2)\n    return out\n"
+    bank.record_refactor("a.py", "import os\n\n" + ORIGINAL, "import os\n\n" + REFACTORED, None, "TESTS PASSED")
+    bank.record_refactor("b.py", other, "def double(xs):\n    return [x * 2 for x in xs]\n", None, "TESTS PASSED")
+
+    module = "LIMIT = 3\n\n\n" + ORIGINAL + "\n\n" + other
+    hit = bank.find_refactor(module)
+    assert hit["match"] == "per-function"
+    assert hit["final_code"] == ("LIMIT = 3\n\n\n" + REFACTORED + "\n\n"
+                                 + "def double(xs):\n    return [x * 2 for x in xs]\n")
+    # One function without a verified refactor: no reuse
+    assert bank.find_refactor(module + "\n\ndef other():\n    return 1\n") is None
+    bank.close()
+
+
+def test_refactor_that_adds_an_import_is_not_reused_per_function(tmp_path):
+    bank = make_bank(tmp_path)
+    final = "import functools\n\ndef total(xs):\n    return functools.reduce(lambda a, b: a + b, xs, 0)\n"
+    bank.record_refactor("a.py", ORIGINAL, final, None, "TESTS PASSED")
+    # The function alone would need the new import, so only whole-module matches may reuse it
+    assert bank.find_refactor("LIMIT = 3\n\n" + ORIGINAL) is None
+    bank.close()
@@ -0,0 +1,61 @@
+import pytest
+
+import retrieval
+from prompts import PromptAssembler, SURGEON_TEMPLATE, fit
+
+
+@pytest.fixture
+def estimate(monkeypatch):
+    """Counts with the local estimate, whether or not tiktoken is installed."""
+    monkeypatch.setattr(retrieval, "_encoding", False)
+    return retrieval.count_tokens
+
+
+def test_count_tokens_falls_back_to_the_estimate(estimate):
+    text = "def total(xs):\n    return sum(xs)\n"
+    assert estimate(text) == retrieval.estimate_bpe_tokens(text) > 0
+    assert estimate("") == 0
+
+
+def test_count_tokens_uses_a_bpe_encoding_when_available(monkeypatch):
+    class Encoding:
+        def encode(self, text, disallowed_special=()):
+            return text.split()
+
+    monkeypatch.setattr(retrieval, "_encoding", Encoding())
+    assert retrieval.count_tokens("one two three") == 3
+    assert retrieval.count_tokens("") == 0
+
+
+def test_fit_keeps_whole_units(estimate):
+    text = "\n".join(f"rule number {i} about naming" for i in range(10))
+    kept, dropped = fit(text, estimate(text) // 2, "\n", estimate)
+    assert kept and text.startswith(kept)
+    assert len(kept.split("\n")) + len(dropped) == 10
+    assert estimate(kept) <= estimate(text) // 2
+
+
+def test_research_is_cut_before_memory_and_code_is_never_cut(estimate):
+    sections = {
+        "code": "def f(x):\n    return x\n",
+        "constraints": "Keep the signature of f.",
+        "memory": "\n".join(f"memory rule {i}" for i in range(20)),
+        "research": "\n---\n".join(f"search result {i} " + "word " * 40 for i in range(10)),
+    }
+    fixed = estimate(SURGEON_TEMPLATE.format(**{name: "" for name in sections}))
+    budget = fixed + estimate(sections["code"]) + estimate(sections["constraints"]) + estimate(sections["memory"]) + 60
+    prompt, report = PromptAssembler(max_tokens=budget, counter=estimate).build(SURGEON_TEMPLATE, sections)
+
+    assert report["tokens"] <= budget and not report["over_budget"]
+    assert sections["code"] in prompt and sections["memory"] in prompt
+    assert report["sections"]["research"]["dropped"]
+    assert report["sections"]["memory"]["dropped"] == []
+    assert any(line.startswith("research:") for line in PromptAssembler.describe(report))
+
+
+def test_code_over_budget_is_reported(estimate):
+    code = "x = 1\n" * 500
+    sections = {"code": code, "constraints": "", "memory": "", "research": ""}
+    _, report = PromptAssembler(max_tokens=100, counter=estimate).build(SURGEON_TEMPLATE, sections)
+    assert report["over_budget"]
+    assert report["sections"]["code"]["tokens"] == report["sections"]["code"]["original_tokens"]
@@ -0,0 +1,84 @@
+import os
+import time
+
+import pytest
+
+from repo_index import RepoIndex
+
+
+def write(path, source):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(source)
+    # Index freshness is keyed by mtime and size; make an edit visible even within one clock tick
+    stamp = time.time_ns() + 10_000_000
+    os.utime(path, ns=(stamp, stamp))
+
+
+@pytest.fixture
+def repo(tmp_path):
+    root = tmp_path / "repo"
+    write(root / "pkg" / "__init__.py", "")
+    write(root / "pkg" / "core.py", "def core(x):\n    if x:\n        return 1\n    return 0\n")
+    write(root / "pkg" / "util.py", "from .core import core\n")
+    write(root / "app.py", "from pkg.core import core\nimport os.path\n")
+    return root
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = RepoIndex(str(tmp_path / "index.db"))
+    yield index
+    index.close()
+
+
+def edges(index, root):
+    return sorted((os.path.relpath(a, root), os.path.relpath(b, root))
+                  for a, b in index._conn.execute("SELECT importer, target FROM edges"))
+
+
+def test_first_update_parses_everything(index, repo):
+    stats = index.update(str(repo))
+    assert (stats["files"], stats["parsed"], stats["unchanged"], stats["edges"]) == (4, 4, 0, 2)
+    assert edges(index, repo) == [("app.py", os.path.join("pkg", "core.py")),
+                                  (os.path.join("pkg", "util.py"), os.path.join("pkg", "core.py"))]
+
+
+def test_second_update_only_reparses_changed_files(index, repo):
+    index.update(str(repo))
+    write(repo / "app.py", "from pkg.util import core\n")
+    stats = index.update(str(repo))
+    assert (stats["parsed"], stats["unchanged"], stats["removed"]) == (1, 3, 0)
+    assert ("app.py", os.path.join("pkg", "util.py")) in edges(index, repo)
+    assert ("app.py", os.path.join("pkg", "core.py")) not in edges(index, repo)
+
+
+def test_removed_file_drops_its_rows_and_edges(index, repo):
+    index.update(str(repo))
+    os.remove(repo / "pkg" / "util.py")
+    stats = index.update(str(repo))
+    assert stats["removed"] == 1
+    assert edges(index, repo) == [("app.py", os.path.join("pkg", "core.py"))]
+
+
+def test_outdated_index_format_is_rebuilt(index, repo):
+    index.update(str(repo))
+    with index._conn:
+        index._set_meta("format", "1")
+    assert index.update(str(repo))["parsed"] == 4
+
+
+def test_export_writes_tables_and_skips_when_unchanged(index, repo, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    index.update(str(repo))
+    out = tmp_path / "export"
+    counts = index.export(str(out))
+    assert counts["files"] == 4 and counts["edges"] == 2
+    files = pq.read_table(str(out / "files.parquet")).to_pylist()
+    core = next(row for row in files if row["path"] == os.path.join("pkg", "core.py"))
+    assert core["dependents"] == 2 and core["is_test"] is False
+    assert (core["functions"], core["max_complexity"]) == (1, 2)
+    assert index.export(str(out)) is None
+
+    write(repo / "pkg" / "extra.py", "import pkg.core\n")
+    index.update(str(repo))
+    assert index.export(str(out))["edges"] == 3
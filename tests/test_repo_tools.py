@@ -0,0 +1,72 @@
+import os
+
+from parsing import module_names
+from repo_tools import DependencyGraph, resolve_import
+
+
+def write(root, files):
+    for rel, source in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(source)
+    return {rel: os.path.abspath(str(root / rel)) for rel in files}
+
+
+def test_module_names_cover_every_possible_root(tmp_path):
+    assert module_names(str(tmp_path / "src" / "pkg" / "lib.py"), str(tmp_path)) == ["lib", "pkg.lib", "src.pkg.lib"]
+    assert module_names(str(tmp_path / "pkg" / "__init__.py"), str(tmp_path)) == ["pkg"]
+
+
+def test_dotted_import_never_falls_back_to_its_last_component(tmp_path):
+    paths = write(tmp_path, {
+        "path.py": "X = 1\n",
+        "app.py": "import os.path\nfrom pkg.path import y\n",
+    })
+    graph = DependencyGraph(str(tmp_path))
+    assert graph.get_dependents(paths["path.py"]) == []
+
+
+def test_full_module_path_resolves_to_that_file_only(tmp_path):
+    paths = write(tmp_path, {
+        "pkg/__init__.py": "",
+        "pkg/lib.py": "def f():\n    return 1\n",
+        "other/lib.py": "def g():\n    return 2\n",
+        "tests/test_lib.py": "from pkg.lib import f\n\ndef test_f():\n    assert f() == 1\n",
+    })
+    graph = DependencyGraph(str(tmp_path))
+    assert graph.get_dependents(paths["pkg/lib.py"]) == [paths["tests/test_lib.py"]]
+    assert graph.get_dependents(paths["other/lib.py"]) == []
+    assert graph.affected_tests(paths["pkg/lib.py"]) == [paths["tests/test_lib.py"]]
+
+
+def test_relative_imports_resolve_against_the_importer(tmp_path):
+    paths = write(tmp_path, {
+        "pkg/__init__.py": "",
+        "pkg/lib.py": "",
+        "pkg/helpers.py": "",
+        "pkg/sub/__init__.py": "",
+        "pkg/sub/mod.py": "from ..lib import f\nfrom . import sibling\nfrom .missing import nothing\n",
+        "pkg/sub/sibling.py": "",
+        "pkg/user.py": "from .helpers import h\nfrom . import sub\n",
+        "lib.py": "",
+        "helpers.py": "",
+    })
+    graph = DependencyGraph(str(tmp_path))
+    assert graph._imports[paths["pkg/sub/mod.py"]] == [paths["pkg/lib.py"], paths["pkg/sub/sibling.py"]]
+    assert graph._imports[paths["pkg/user.py"]] == [paths["pkg/helpers.py"], paths["pkg/sub/__init__.py"]]
+
+
+def test_relative_import_needs_an_importer():
+    modules = {"lib": ["/repo/pkg/lib.py"]}
+    assert resolve_import(modules, ".lib") == []
+    assert resolve_import(modules, ".lib", "/repo/pkg/a.py") == ["/repo/pkg/lib.py"]
+    assert resolve_import(modules, ".lib", "/repo/other/a.py") == []
+
+
+def test_update_file_moves_the_edges(tmp_path):
+    paths = write(tmp_path, {"a.py": "", "b.py": "", "c.py": "import a\n"})
+    graph = DependencyGraph(str(tmp_path))
+    assert graph.get_dependents(paths["a.py"]) == [paths["c.py"]]
+    graph.update_file(paths["c.py"], "import b\n")
+    assert graph.get_dependents(paths["a.py"]) == []
+    assert graph.get_dependents(paths["b.py"]) == [paths["c.py"]]
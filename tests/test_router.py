@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from router import DEFAULT_TIERS, ModelRouter, load_tiers, max_complexity
+
+
+@pytest.fixture
+def router(tmp_path):
+    router = ModelRouter(tiers=[dict(t) for t in DEFAULT_TIERS], db_path=str(tmp_path / "routes.db"))
+    yield router
+    router.close()
+
+
+def test_base_tier_follows_complexity_and_prompt_size(router):
+    assert router.route("a.py", complexity=3, tokens=500)["tier"] == "fast"
+    assert router.route("a.py", complexity=8, tokens=500)["tier"] == "balanced"
+    assert router.route("a.py", complexity=3, tokens=5000)["tier"] == "balanced"
+    assert router.route("a.py", complexity=30, tokens=500)["tier"] == "large"
+
+
+def test_escalation_stops_at_the_largest_tier(router):
+    route = router.route("a.py", complexity=3, tokens=500)
+    route = router.escalate(route)
+    assert (route["tier"], route["attempt"]) == ("balanced", 1)
+    route = router.escalate(route)
+    assert route["tier"] == "large"
+    assert router.escalate(route) is None
+    assert router.route("a.py", complexity=3, tokens=500, attempt=5)["tier"] == "large"
+
+
+def test_history_moves_the_starting_tier(router):
+    fast = router.route("a.py", complexity=3, tokens=500)
+    router.record("a.py", fast, "tests", passed=False)
+    assert router.route("a.py", complexity=3, tokens=500)["tier"] == "balanced"
+
+    balanced = router.route("a.py", complexity=3, tokens=500)
+    router.record("a.py", balanced, "tests", passed=True)
+    route = router.route("a.py", complexity=3, tokens=500)
+    assert route["tier"] == "balanced" and "passed on balanced" in route["reason"]
+    # Other targets are unaffected
+    assert router.route("b.py", complexity=3, tokens=500)["tier"] == "fast"
+
+
+def test_record_prices_calls_and_stats_aggregate_them(router):
+    route = router.route("a.py", complexity=30, tokens=500)
+    router.record("a.py", route, "refactor", True, latency_ms=100, tokens_in=1_000_000, tokens_out=100_000)
+    router.record("a.py", route, "refactor", False, latency_ms=300, tokens_in=0, tokens_out=0)
+    [row] = router.stats()
+    assert row == {"tier": "large", "model": "gemini-2.5-pro", "stage": "refactor", "calls": 2,
+                   "pass_rate": 0.5, "mean_latency_ms": 200.0, "cost_usd": 2.25}
+
+
+def test_load_tiers_keeps_available_models_and_widens_the_last(tmp_path):
+    models = tmp_path / "models.json"
+    models.write_text(json.dumps(["gemini-2.5-flash-lite", "gemini-2.5-flash"]))
+    tiers = load_tiers(str(models))
+    assert [t["name"] for t in tiers] == ["fast", "balanced"]
+    assert tiers[-1]["max_complexity"] is None and tiers[-1]["max_tokens"] is None
+    assert DEFAULT_TIERS[1]["max_complexity"] == 10  # the defaults themselves are untouched
+    assert load_tiers(str(tmp_path / "missing.json")) == DEFAULT_TIERS
+
+
+def test_max_complexity_reads_the_analyzer_report():
+    assert max_complexity(json.dumps([{"complexity": 4}, {"complexity": 9}])) == 9
+    assert max_complexity("Error: could not parse") == 0